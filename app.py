@@ -6,15 +6,13 @@ from PyQt6.QtWidgets import (
     QProxyStyle, QStyle, QTabWidget, QCheckBox
 )
 from PyQt6.QtGui import QPainter, QColor, QPen, QCursor
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThreadPool
+from functools import partial
 import re
-from cli.encryptor import encrypt_file, decrypt_file
-from cli.key_vault import create_vault, add_key, get_key
-from ui.passwordDialog import PasswordDialog
-from ui.aliasDialog import AliasDialog
-from ui.aliasManagerDialog import AliasManagerDialog
 from ui.button import Button
 from ui.settings import SettingsTab
+# Dialogs, jobs and the cli package (cryptography, numpy) are imported where
+# they are first used, so the window shows without loading them.
 
 def password_strength(password: str) -> (bool, list):
     issues = []
@@ -32,6 +30,7 @@ def password_strength(password: str) -> (bool, list):
 
 
 def prompt_strong_password(parent=None, prompt="Password:"):
+    from ui.passwordDialog import PasswordDialog
     while True:
         dialog = PasswordDialog(prompt, parent)
         pwd = dialog.get_password()
@@ -78,6 +77,8 @@ class EncryptionApp(QWidget):
         super().__init__()
         self.setWindowTitle("Secure File Encryption")
         self.setGeometry(200, 200, 600, 400)
+        self.vault_session = None
+        self.pool = QThreadPool()
 
         # Create the tab widget
         self.tabs = QTabWidget()
@@ -145,6 +146,11 @@ class EncryptionApp(QWidget):
         self.decrypt_btn = Button("Decrypt File", cursor=True, clicked = self.decrypt_file_action).get_button()
         layout.addWidget(self.decrypt_btn)
 
+        # Running and finished jobs
+        self.jobs_layout = QVBoxLayout()
+        layout.addLayout(self.jobs_layout)
+        layout.addStretch()
+
         page.setLayout(layout)
         return page
 
@@ -161,9 +167,26 @@ class EncryptionApp(QWidget):
         return page
 
     # ------------------- APP LOGIC ------------------- #
+    def unlocked_vault(self):
+        """Return the open vault session, asking for the master password if it has expired."""
+        if self.vault_session is None or not self.vault_session.unlocked:
+            from cli.key_vault import VaultSession
+            master_pwd = prompt_strong_password(self, "Master password:")
+            if not master_pwd:
+                return None
+            self.vault_session = VaultSession(master_pwd, ttl=self.settings_tab.vault_ttl())
+        return self.vault_session
+
     def open_key_manager(self):
-        dialog = AliasManagerDialog(parent=self)
-        dialog.exec()
+        try:
+            session = self.unlocked_vault()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e))
+            return
+        if session:
+            from ui.aliasManagerDialog import AliasManagerDialog
+            dialog = AliasManagerDialog(parent=self, session=session)
+            dialog.exec()
 
     def browse_file(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Select File")
@@ -173,6 +196,7 @@ class EncryptionApp(QWidget):
     def create_vault(self):
         pwd = prompt_strong_password(self, "Master password (strong):")
         if pwd:
+            from cli.key_vault import create_vault
             try:
                 create_vault(pwd)
                 QMessageBox.information(self, "Vault", "Vault created successfully.")
@@ -180,48 +204,61 @@ class EncryptionApp(QWidget):
                 QMessageBox.warning(self, "Vault", "Vault already exists.")
 
     def add_key(self):
+        from ui.aliasDialog import AliasDialog
         dialog = AliasDialog(parent=self)
         alias = dialog.get_alias()
         if alias:
-            master_pwd = prompt_strong_password(self, "Master password:")
-            if master_pwd:
-                key = add_key(alias, master_pwd)
-                QMessageBox.information(
-                    self, "Key Added",
-                    f"Key '{alias}' added successfully.\nBackup: {key.decode()}"
-                )
-
-    def encrypt_file_action(self):
-        filepath = self.file_input.text()
-        alias = self.alias_input.text()
-        if not filepath or not alias:
-            QMessageBox.warning(self, "Error", "File path and key alias are required.")
-            return
-        master_pwd = prompt_strong_password(self, "Master password:")
-        if master_pwd:
             try:
-                key = get_key(alias, master_pwd)
-                out_path = encrypt_file(filepath, key,
-                                        delete_original=self.delete_checkbox.isChecked())
-                QMessageBox.information(self, "Success", f"File encrypted:\n{out_path}")
+                session = self.unlocked_vault()
+                if session:
+                    key = session.add_key(alias)
+                    QMessageBox.information(
+                        self, "Key Added",
+                        f"Key '{alias}' added successfully.\nBackup: {key.decode()}"
+                    )
             except Exception as e:
                 QMessageBox.critical(self, "Error", str(e))
 
-    def decrypt_file_action(self):
+    def start_job(self, title, func):
+        """Queue func on the job pool, with a progress row in the encryption tab."""
+        from ui.fileJob import FileJob, JobRow
+        self.pool.setMaxThreadCount(self.settings_tab.max_jobs())
+        job = FileJob(func)
+        job.signals.failed.connect(lambda message: QMessageBox.critical(self, "Error", f"{title}:\n{message}"))
+        self.jobs_layout.addWidget(JobRow(title, job))
+        self.pool.start(job)
+
+    def file_job_action(self, operation):
         filepath = self.file_input.text()
         alias = self.alias_input.text()
         if not filepath or not alias:
             QMessageBox.warning(self, "Error", "File path and key alias are required.")
             return
-        master_pwd = prompt_strong_password(self, "Master password:")
-        if master_pwd:
-            try:
-                key = get_key(alias, master_pwd)
-                out_path = decrypt_file(filepath, key,
-                                        delete_original=self.delete_checkbox.isChecked())
-                QMessageBox.information(self, "Success", f"File decrypted:\n{out_path}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", str(e))
+        try:
+            session = self.unlocked_vault()
+            if session:
+                from cli.encryptor import encrypt_file, decrypt_file
+                key = session.get_key(alias)
+                func = encrypt_file if operation == "Encrypt" else decrypt_file
+                self.start_job(f"{operation} {os.path.basename(filepath)}",
+                               partial(func, filepath, key, delete_original=self.delete_checkbox.isChecked()))
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e))
+
+    def encrypt_file_action(self):
+        self.file_job_action("Encrypt")
+
+    def decrypt_file_action(self):
+        self.file_job_action("Decrypt")
+
+    def closeEvent(self, event):
+        # Stop running jobs at their next chunk; Cancelled removes partial outputs.
+        for i in range(self.jobs_layout.count()):
+            row = self.jobs_layout.itemAt(i).widget()
+            if row is not None and row.running:
+                row.job.cancel()
+        self.pool.waitForDone()
+        super().closeEvent(event)
 
 
 def load_stylesheet(filename):
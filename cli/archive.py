@@ -0,0 +1,412 @@
+import bisect
+import hashlib
+import hmac
+import json
+import os
+import stat
+import struct
+import time
+from cryptography.fernet import InvalidToken
+from cli.batch import iter_files, matches
+from cli.compresser import get_codec, get_codec_id, numpy, DEFAULT_CODEC, ENTROPY_THRESHOLD
+from cli.encryptor import (
+    FRAME, TAG_SIZE, _atomic_output, _split_key, _seal_chunk, _open_chunk, _read_exact, _read_frame_at,
+    _max_frame_length, _ordered_map, _write_all, _write_parts,
+)
+from cli.locking import file_lock
+from cli.stats import stopwatch
+
+# ---------- Deduplicating archive ----------
+# A directory tree, and later snapshots of it, packed into one append-only file.
+# header:  magic | version | codec id | archive nonce
+# record:  type | frame, as in cli.encryptor (flags | length | iv | ciphertext | tag)
+# footer:  type | magic | manifest offset | manifest record | record count | tag
+# Files are cut into chunks where a rolling hash of the last CDC_WINDOW bytes
+# hits a boundary pattern, so an insert or edit only changes the chunks around
+# it. A chunk already in the archive is referenced rather than stored again;
+# chunks are identified by an HMAC of their plaintext, so equal chunks cannot be
+# spotted without the key. Every record is sealed like a container chunk, with
+# its record number as the chunk index and a random IV: the record numbers of
+# a torn append are used again by the next one, for different data.
+# A snapshot is the chunk records new to it, then a manifest record (JSON: the
+# file list with each file's chunk records, the chunks new in this snapshot and
+# where the previous manifest is), then a footer whose tag authenticates where
+# the manifest is. Listing decrypts manifests only. An append that dies half
+# way leaves the old footer intact; the next append cuts the torn tail off.
+ARCHIVE_MAGIC = b"SSARC"
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct(">5sBB16s")
+FOOTER_MAGIC = b"SSAFT"
+FOOTER = struct.Struct(">B5sQQQ32s")
+RECORD_CHUNK = 1
+RECORD_MANIFEST = 2
+RECORD_FOOTER = 3
+CHUNK_ID_SIZE = 16
+
+# Content-defined chunking: cut after at least CDC_MIN bytes where the hash
+# falls below 2**(32 - CDC_BITS), so chunks average CDC_MIN + 2**CDC_BITS
+# bytes, and cut at CDC_MAX regardless. Changing any of these changes where
+# files are cut, and new snapshots would stop sharing chunks with old ones.
+CDC_MIN = 16 * 1024
+CDC_MAX = 256 * 1024
+CDC_BITS = 16
+CDC_WINDOW = 64
+CDC_BLOCK = 1024 * 1024
+_CDC_BASE = 0x9E3779B1
+_CDC_MASK = 0xFFFFFFFF
+_GEAR = [int.from_bytes(hashlib.sha256(b"secureshare-cdc" + bytes([b])).digest()[:4], "big") for b in range(256)]
+_cdc_tables = None  # numpy gear table and powers of _CDC_BASE, built on first use
+
+def _numpy_tables(np):
+    global _cdc_tables
+    if _cdc_tables is None:
+        n = CDC_BLOCK + CDC_MAX
+        powers = np.full(n, _CDC_BASE, dtype=np.uint32)
+        inverses = np.full(n, pow(_CDC_BASE, -1, 1 << 32), dtype=np.uint32)
+        powers[0] = inverses[0] = 1
+        _cdc_tables = (np.array(_GEAR, dtype=np.uint32), np.cumprod(powers, dtype=np.uint32),
+                       np.cumprod(inverses, dtype=np.uint32))
+    return _cdc_tables
+
+def _cut_candidates(buf: bytes, threshold: int) -> list:
+    """
+    Returns the positions i >= CDC_WINDOW in buf where the polynomial hash of
+    buf[i - CDC_WINDOW + 1:i + 1] is below threshold (all arithmetic mod 2**32).
+    """
+    np = numpy()
+    if np is None:
+        candidates, h, gear = [], 0, _GEAR
+        drop = pow(_CDC_BASE, CDC_WINDOW, 1 << 32)
+        for i, b in enumerate(buf):
+            h = h * _CDC_BASE + gear[b]
+            if i >= CDC_WINDOW:
+                h = (h - gear[buf[i - CDC_WINDOW]] * drop) & _CDC_MASK
+                if h < threshold:
+                    candidates.append(i)
+            else:
+                h &= _CDC_MASK
+        return candidates
+    # Vectorised: with S[i] = sum(gear[buf[k]] * B**-k for k <= i), the window
+    # hash is B**i * (S[i] - S[i - CDC_WINDOW]), and uint32 arithmetic wraps.
+    gear, powers, inverses = _numpy_tables(np)
+    n = len(buf)
+    s = gear.take(np.frombuffer(buf, dtype=np.uint8))
+    s *= inverses[:n]
+    np.cumsum(s, dtype=np.uint32, out=s)
+    h = s[CDC_WINDOW:] - s[:-CDC_WINDOW]
+    h *= powers[CDC_WINDOW:n]
+    return (np.flatnonzero(h < threshold) + CDC_WINDOW).tolist()
+
+def cdc_chunks(f, min_size: int = CDC_MIN, max_size: int = CDC_MAX, bits: int = CDC_BITS):
+    """
+    Yields the content-defined chunks of file f. Cut points only depend on the
+    bytes since the previous cut, so they are the same however f is read.
+    """
+    if min_size <= CDC_WINDOW or max_size < min_size:
+        raise ValueError("Chunk sizes must satisfy CDC_WINDOW < min_size <= max_size.")
+    sw = stopwatch()
+    threshold = 1 << (32 - bits)
+    buf = b""
+    while True:
+        data = f.read(CDC_BLOCK)
+        if not data:
+            if buf:
+                yield buf
+            return
+        buf = buf + data if buf else data
+        candidates = _cut_candidates(buf, threshold)
+        start = 0
+        while True:
+            j = bisect.bisect_left(candidates, start + min_size - 1)
+            if j < len(candidates) and candidates[j] < start + max_size:
+                cut = candidates[j] + 1
+            elif len(buf) - start >= max_size:
+                cut = start + max_size
+            else:
+                break
+            if sw: sw.lap("archive.chunk", cut - start)
+            yield buf[start:cut]
+            if sw: sw.start()
+            start = cut
+        buf = buf[start:]
+
+def _chunk_id(id_key: bytes, data) -> bytes:
+    return hmac.new(id_key, data, hashlib.sha256).digest()[:CHUNK_ID_SIZE]
+
+def _footer_tag(signing_key: bytes, header: bytes, offset: int, record: int, count: int) -> bytes:
+    mac = hmac.new(signing_key, FOOTER_MAGIC + header, hashlib.sha256)
+    mac.update(struct.pack(">QQQ", offset, record, count))
+    return mac.digest()
+
+class _Archive:
+    """
+    An open archive file: its header, keys and last complete snapshot. Manifests
+    are decrypted on demand; data chunks only by read_chunk.
+    """
+    def __init__(self, f, key: bytes):
+        self.f = f
+        self.keys = _split_key(key)
+        self.id_key = hmac.new(self.keys[0], b"chunk-id", hashlib.sha256).digest()
+        f.seek(0)
+        self.header = f.read(ARCHIVE_HEADER.size)
+        if len(self.header) != ARCHIVE_HEADER.size or self.header[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            raise ValueError("Not a secureshare archive.")
+        _, version, codec_id, self.nonce = ARCHIVE_HEADER.unpack(self.header)
+        if version != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported archive version {version}.")
+        _, self.compress, self.decompress = get_codec(codec_id)
+        self.size = os.fstat(f.fileno()).st_size
+        self.index = {}  # record -> (offset, size, chunk id), filled from manifests by the caller
+        self.end, self.manifest, self.records = self._find_footer()
+
+    def _check_footer(self, raw: bytes):
+        kind, magic, offset, record, count, tag = FOOTER.unpack(raw)
+        if kind != RECORD_FOOTER or magic != FOOTER_MAGIC:
+            return None
+        if not hmac.compare_digest(tag, _footer_tag(self.keys[0], self.header, offset, record, count)):
+            raise InvalidToken("Archive footer failed authentication (wrong key or tampered archive).")
+        return (offset, record), count
+
+    def _find_footer(self) -> tuple:
+        """
+        Returns (end of the last complete snapshot, its manifest as (offset,
+        record), record count). The footer is normally the last thing in the
+        file; after an interrupted append the records are walked to find it.
+        """
+        if self.size >= ARCHIVE_HEADER.size + FOOTER.size:
+            self.f.seek(self.size - FOOTER.size)
+            found = self._check_footer(self.f.read(FOOTER.size))
+            if found:
+                return (self.size,) + found
+        end, manifest, records = ARCHIVE_HEADER.size, None, 0
+        position = ARCHIVE_HEADER.size
+        self.f.seek(position)
+        while True:
+            kind = self.f.read(1)
+            if kind == bytes([RECORD_FOOTER]):
+                raw = kind + self.f.read(FOOTER.size - 1)
+                found = len(raw) == FOOTER.size and self._check_footer(raw)
+                if not found:
+                    break
+                position += FOOTER.size
+                end, (manifest, records) = position, found
+            elif kind in (bytes([RECORD_CHUNK]), bytes([RECORD_MANIFEST])):
+                frame = self.f.read(FRAME.size)
+                if len(frame) != FRAME.size:
+                    break
+                position += 1 + FRAME.size + FRAME.unpack(frame)[1] + TAG_SIZE
+                if position > self.size:
+                    break
+                self.f.seek(position)
+            else:
+                break
+        return end, manifest, records
+
+    def _read_record(self, offset: int, record: int, max_length: int) -> bytes:
+        if offset + 1 + FRAME.size + TAG_SIZE > self.end:
+            raise InvalidToken(f"Archive record {record} is out of bounds.")
+        self.f.seek(offset)
+        if _read_exact(self.f, 1)[0] not in (RECORD_CHUNK, RECORD_MANIFEST):
+            raise InvalidToken(f"Archive record {record} is not where it should be.")
+        return _read_frame_at(self.f, offset + 1, record, max_length)
+
+    def read_manifest(self, offset: int, record: int) -> dict:
+        frame = self._read_record(offset, record, self.end - offset)
+        return json.loads(_open_chunk(self.keys, self.header, *frame, self.decompress))
+
+    def manifests(self):
+        """
+        Yields every snapshot's manifest, newest first.
+        """
+        pointer = self.manifest
+        while pointer:
+            manifest = self.read_manifest(*pointer)
+            yield manifest
+            pointer = manifest["previous"]
+
+    def chunk_index(self, manifests) -> dict:
+        """
+        Maps record number to (offset, size, chunk id) for the chunks new in manifests.
+        """
+        return {record: (offset, size, bytes.fromhex(chunk_id))
+                for manifest in manifests for record, offset, size, chunk_id in manifest["chunks"]}
+
+    def read_chunk(self, record: int) -> tuple:
+        """
+        Reads a chunk record's frame, to be opened by open_chunk.
+        """
+        return self._read_record(self.index[record][0], record, _max_frame_length(CDC_MAX))
+
+    def open_chunk(self, frame: tuple) -> bytes:
+        data = _open_chunk(self.keys, self.header, *frame, self.decompress)
+        _, size, chunk_id = self.index[frame[0]]
+        if len(data) != size or not hmac.compare_digest(_chunk_id(self.id_key, data), chunk_id):
+            raise InvalidToken(f"Archive chunk {frame[0]} does not match its manifest.")
+        return data
+
+def _open(f, key: bytes) -> _Archive:
+    archive = _Archive(f, key)
+    if archive.manifest is None:
+        raise InvalidToken("Archive holds no complete snapshot.")
+    return archive
+
+def _select(archive: _Archive, snapshot: str = None) -> tuple:
+    """
+    Returns (manifest of the named snapshot, or the newest one, and the
+    manifests up to and including it, newest first).
+    """
+    manifests = list(archive.manifests())
+    for i, manifest in enumerate(manifests):
+        if snapshot is None or manifest["name"] == snapshot:
+            return manifest, manifests[i:]
+    raise KeyError(f"No snapshot named '{snapshot}'.")
+
+def add_snapshot(archive_path: str, root: str, key: bytes, name: str = None, include: list = None,
+                 exclude: list = None, workers: int = 1, codec: str = DEFAULT_CODEC,
+                 entropy_threshold: float = ENTROPY_THRESHOLD) -> dict:
+    """
+    Adds a snapshot of the directory root to the archive, creating it (with
+    codec; "auto" is not supported here) if it does not exist. Only chunks the
+    archive does not hold yet are encrypted and written, and files whose size
+    and mtime match the previous snapshot are not read at all.
+    Returns a summary: files, bytes, chunks, new_chunks, new_bytes, stored, seconds.
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Directory not found: {root}")
+    start = time.perf_counter()
+    with file_lock(archive_path), open(archive_path, "a+b", buffering=0) as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < ARCHIVE_HEADER.size:
+            f.truncate(0)
+            _write_all(f, ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, get_codec_id(codec), os.urandom(16)))
+        archive = _Archive(f, key)
+        f.truncate(archive.end)  # drop the tail of an interrupted append
+        manifests = list(archive.manifests())
+        archive.index = archive.chunk_index(manifests)
+        ids = {chunk_id: record for record, (_, _, chunk_id) in archive.index.items()}
+        previous = {entry["path"]: entry for entry in manifests[0]["files"]} if manifests else {}
+        files, new_chunks, summary = [], [], {"chunks": 0, "new_chunks": 0, "new_bytes": 0}
+        next_record = archive.records
+
+        def items():
+            nonlocal next_record
+            for path in iter_files(root, include, exclude):
+                st = os.stat(path)
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                entry = {"path": rel, "size": 0, "mode": stat.S_IMODE(st.st_mode), "mtime": st.st_mtime_ns,
+                         "chunks": []}
+                files.append(entry)
+                old = previous.get(rel)
+                if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns:
+                    entry.update(size=old["size"], chunks=old["chunks"])
+                    continue
+                with open(path, "rb") as src:
+                    for data in cdc_chunks(src):
+                        chunk_id = _chunk_id(archive.id_key, data)
+                        record = ids.get(chunk_id)
+                        if record is None:
+                            record = ids[chunk_id] = next_record
+                            next_record += 1
+                            yield entry, record, chunk_id, data
+                        else:
+                            yield entry, record, None, data
+
+        def seal(item):
+            entry, record, chunk_id, data = item
+            parts = chunk_id and _seal_chunk(archive.keys, archive.header, archive.nonce, record, data, 0,
+                                             archive.compress, entropy_threshold, iv=os.urandom(16))
+            return entry, record, chunk_id, len(data), parts
+
+        position = archive.end
+        f.seek(position)
+        for entry, record, chunk_id, size, parts in _ordered_map(seal, items(), workers):
+            entry["chunks"].append(record)
+            entry["size"] += size
+            summary["chunks"] += 1
+            if parts:
+                new_chunks.append([record, position, size, chunk_id.hex()])
+                summary["new_chunks"] += 1
+                summary["new_bytes"] += size
+                _write_parts(f, [bytes([RECORD_CHUNK])] + list(parts))
+                position += 1 + sum(len(part) for part in parts)
+
+        total = sum(entry["size"] for entry in files)
+        manifest = {"name": name or time.strftime("%Y-%m-%dT%H:%M:%S"), "time": time.time(),
+                    "files": files, "size": total, "chunks": new_chunks, "stored": position - archive.end,
+                    "previous": archive.manifest}
+        body = json.dumps(manifest, separators=(",", ":")).encode()
+        parts = _seal_chunk(archive.keys, archive.header, archive.nonce, next_record, body, 0, archive.compress, None,
+                            iv=os.urandom(16))
+        _write_parts(f, [bytes([RECORD_MANIFEST])] + list(parts))
+        count = next_record + 1
+        tag = _footer_tag(archive.keys[0], archive.header, position, next_record, count)
+        _write_all(f, FOOTER.pack(RECORD_FOOTER, FOOTER_MAGIC, position, next_record, count, tag))
+        os.fsync(f.fileno())
+        position += 1 + sum(len(part) for part in parts) + FOOTER.size
+    summary.update(files=len(files), bytes=total, stored=position - archive.end,
+                   seconds=time.perf_counter() - start)
+    return summary
+
+def list_snapshots(archive_path: str, key: bytes) -> list:
+    """
+    Returns the archive's snapshots, oldest first, as dicts with name, time,
+    files, size (plaintext bytes), new_chunks and stored (bytes added to the archive).
+    """
+    with open(archive_path, "rb") as f:
+        archive = _open(f, key)
+        snapshots = [{"name": m["name"], "time": m["time"], "files": len(m["files"]), "size": m["size"],
+                      "new_chunks": len(m["chunks"]), "stored": m["stored"]} for m in archive.manifests()]
+    return snapshots[::-1]
+
+def list_files(archive_path: str, key: bytes, snapshot: str = None) -> list:
+    """
+    Returns the files in a snapshot (the newest by default) as dicts with path,
+    size, mode, mtime (seconds) and chunks (how many).
+    """
+    with open(archive_path, "rb") as f:
+        manifest, _ = _select(_open(f, key), snapshot)
+    return [{"path": e["path"], "size": e["size"], "mode": e["mode"], "mtime": e["mtime"] / 1e9,
+             "chunks": len(e["chunks"])} for e in manifest["files"]]
+
+def extract_snapshot(archive_path: str, key: bytes, out_dir: str, snapshot: str = None, include: list = None,
+                     exclude: list = None, workers: int = 1) -> dict:
+    """
+    Restores the files of a snapshot (the newest by default) under out_dir,
+    with their permissions and mtimes. include/exclude globs match paths in the
+    snapshot as in iter_files. Returns a summary: files, bytes, seconds.
+    """
+    start = time.perf_counter()
+    with open(archive_path, "rb") as f:
+        archive = _open(f, key)
+        manifest, manifests = _select(archive, snapshot)
+        archive.index = archive.chunk_index(manifests)
+        selected = []
+        for entry in manifest["files"]:
+            rel = os.path.normpath(entry["path"])
+            if os.path.isabs(rel) or rel.split(os.sep)[0] == os.pardir:
+                raise InvalidToken(f"Archive entry escapes the output directory: {entry['path']}")
+            target = os.path.join(out_dir, rel)
+            if matches(target, out_dir, include, exclude):
+                selected.append((entry, target))
+
+        def frames():
+            # Reads stay on this thread; only opening the chunks runs on the pool.
+            for entry, _ in selected:
+                for record in entry["chunks"]:
+                    yield archive.read_chunk(record)
+
+        chunks = _ordered_map(archive.open_chunk, frames(), workers)
+        total = 0
+        for entry, target in selected:
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            # A chunk failing authentication leaves any existing file at target as it was.
+            with _atomic_output(target) as dst:
+                for _ in entry["chunks"]:
+                    dst.write(next(chunks))
+                size = dst.tell()
+                if size != entry["size"]:
+                    raise InvalidToken(f"{entry['path']} does not match its recorded size.")
+            os.chmod(target, entry["mode"])
+            os.utime(target, ns=(entry["mtime"], entry["mtime"]))
+            total += size
+    return {"files": len(selected), "bytes": total, "seconds": time.perf_counter() - start}
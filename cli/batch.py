@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from fnmatch import fnmatch
+
+# Scratch files other writers leave next to their outputs: _atomic_output's
+# temporaries and file_lock's lock files. Never inputs in their own right.
+SCRATCH_GLOBS = [".*.tmp", "*.lock"]
+
+def matches(path: str, root: str, include: list = None, exclude: list = None) -> bool:
+    """
+    True if path, relative to root or by file name, matches one of the include
+    globs (any path if none) and none of the exclude globs.
+    """
+    rel, name = os.path.relpath(path, root), os.path.basename(path)
+    if include and not any(fnmatch(rel, p) or fnmatch(name, p) for p in include):
+        return False
+    if exclude and any(fnmatch(rel, p) or fnmatch(name, p) for p in exclude):
+        return False
+    return True
+
+def iter_files(root: str, include: list = None, exclude: list = None):
+    """
+    Walks root and yields the paths of regular files whose path relative to root
+    matches one of the include globs (all files if none) and none of the exclude globs.
+    """
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if matches(path, root, include, exclude) and os.path.isfile(path):
+                yield path
+
+def run_batch(paths, action, workers: int = 4) -> dict:
+    """
+    Calls action(path) for every path on a pool of worker threads, keeping at most
+    2 * workers calls queued. A failing file is reported on stderr and skipped.
+    Returns a summary with counts, bytes processed and throughput.
+    """
+    summary = {"files": 0, "failed": 0, "bytes": 0, "errors": []}
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def settle(done):
+        for future in done:
+            path = pending.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                summary["failed"] += 1
+                summary["errors"].append((path, str(e)))
+                print(f"Failed: {path}: {e}", file=sys.stderr)
+
+    def run(path):
+        size = os.path.getsize(path)
+        action(path)
+        with lock:
+            summary["files"] += 1
+            summary["bytes"] += size
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for path in paths:
+            pending[pool.submit(run, path)] = path
+            if len(pending) >= 2 * max(1, workers):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                settle(done)
+        settle(wait(pending)[0])
+
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = elapsed
+    summary["files_per_sec"] = summary["files"] / elapsed if elapsed else 0.0
+    summary["mb_per_sec"] = summary["bytes"] / (1024 * 1024) / elapsed if elapsed else 0.0
+    return summary
+
+def format_summary(summary: dict) -> str:
+    return (f"{summary['files']} files ({summary['bytes'] / (1024 * 1024):.1f} MB) in {summary['seconds']:.2f}s, "
+            f"{summary['failed']} failed: {summary['files_per_sec']:.1f} files/s, {summary['mb_per_sec']:.1f} MB/s")
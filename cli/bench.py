@@ -0,0 +1,479 @@
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from cli import compresser
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The suites import what they measure when they run, so that importing this
+# module (e.g. for the CLI's option defaults) does not load the crypto stack.
+
+# ---------- Synthetic corpora ----------
+# Deterministic for a given seed, generated block by block so a 1 GB corpus
+# never has to fit in memory. "text" blocks are rotations of a generated pool of
+# English-like words, "mixed" interleaves 64 KiB segments of the other three.
+CORPORA = ("random", "text", "zeros", "mixed")
+CORPUS_BLOCK = 1024 * 1024
+MIXED_SEGMENT = 64 * 1024
+GROUPS = ("encryptor", "compresser", "archive", "vault", "daemon", "startup")
+DEFAULT_SIZES = "1K,1M,16M"
+DEFAULT_VAULT_SIZES = "100,1000,10000"
+IN_MEMORY_LIMIT = 64 * 1024 * 1024  # in-memory compresser cases skip larger corpora
+MIN_TIME = 0.05  # tiny operations are looped until one timing takes this long
+DEFAULT_TOLERANCE = 0.10
+BENCH_PASSWORD = "bench-password"
+BENCH_ALIAS = "bench"
+RANGE_LENGTH = 4096
+CLI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start of a fresh interpreter. Each case must finish within the budget and
+# must not import LAZY_MODULES, which only the commands that need them load.
+STARTUP_BUDGET_MS = 150
+LAZY_MODULES = ("cryptography", "numpy", "cProfile", "ctypes")
+STARTUP_CASES = (("cli-help", [CLI_SCRIPT, "--help"]),
+                 ("app-import", ["-c", "import app"]))  # the GUI module, without opening a window
+
+_WORDS = ("the of and to in is that for it as with was on be by this are from at or an have not which "
+          "file key vault data chunk block stream encrypt decrypt compress header frame password entropy "
+          "random share secure archive token cipher index record journal latency throughput").split()
+
+def parse_size(text: str) -> int:
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def _text_pool(rng: random.Random) -> bytes:
+    lines = []
+    size = 0
+    while size < CORPUS_BLOCK:
+        line = " ".join(rng.choices(_WORDS, k=rng.randint(6, 14))).capitalize() + ".\n"
+        lines.append(line)
+        size += len(line)
+    return "".join(lines).encode()[:CORPUS_BLOCK]
+
+def corpus_blocks(kind: str, size: int, seed: int = 0):
+    """
+    Yields the corpus of the given kind and size in blocks of at most CORPUS_BLOCK bytes.
+    """
+    if kind not in CORPORA:
+        raise ValueError(f"Unknown corpus '{kind}'.")
+    rng = random.Random(seed)
+    pool = _text_pool(rng) if kind in ("text", "mixed") else b""
+    remaining = size
+    while remaining > 0:
+        n = min(remaining, CORPUS_BLOCK)
+        if kind == "random":
+            block = rng.randbytes(n)
+        elif kind == "zeros":
+            block = bytes(n)
+        elif kind == "text":
+            offset = rng.randrange(len(pool))
+            block = (pool[offset:] + pool[:offset])[:n]
+        else:
+            parts = []
+            for start in range(0, n, MIXED_SEGMENT):
+                length = min(MIXED_SEGMENT, n - start)
+                choice = rng.randrange(3)
+                if choice == 0:
+                    parts.append(rng.randbytes(length))
+                elif choice == 1:
+                    offset = rng.randrange(len(pool) - length)
+                    parts.append(pool[offset:offset + length])
+                else:
+                    parts.append(bytes(length))
+            block = b"".join(parts)
+        yield block
+        remaining -= n
+
+def make_corpus(kind: str, size: int, seed: int = 0) -> bytes:
+    return b"".join(corpus_blocks(kind, size, seed))
+
+def write_corpus(path: str, kind: str, size: int, seed: int = 0):
+    with open(path, "wb") as f:
+        for block in corpus_blocks(kind, size, seed):
+            f.write(block)
+
+# ---------- Measurement ----------
+def _reset_peak_rss():
+    # Linux lets a process reset its own high-water mark (VmHWM) since 4.0.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb():
+    """
+    Peak resident set size in MB: since the last reset on Linux, otherwise for the
+    whole process (so only an upper bound per case). None where unavailable.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def measure(func, repeat: int = 3) -> float:
+    """
+    Returns the best seconds per call of func over repeat timings. Calls faster
+    than MIN_TIME are looped so that each timing lasts at least that long.
+    """
+    start = time.perf_counter()
+    func()
+    first = time.perf_counter() - start
+    loops = max(1, int(MIN_TIME / first)) if first > 0 else 1000
+    best = first if loops == 1 else float("inf")
+    for _ in range(repeat - (loops == 1)):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+def _result(group, case, corpus, size, seconds, nbytes=None, **extra) -> dict:
+    result = {"group": group, "case": case, "corpus": corpus, "size": size,
+              "seconds": seconds, "ops_per_sec": 1 / seconds if seconds else None}
+    if nbytes is not None:
+        result["mb_per_sec"] = nbytes / (1024 * 1024) / seconds if seconds else None
+    result["peak_rss_mb"] = peak_rss_mb()
+    result.update(extra)
+    return result
+
+def _run(results, report, group, case, corpus, size, func, repeat, nbytes=None):
+    _reset_peak_rss()
+    try:
+        result = _result(group, case, corpus, size, measure(func, repeat), nbytes)
+    except Exception as e:
+        result = {"group": group, "case": case, "corpus": corpus, "size": size, "error": str(e)}
+    results.append(result)
+    if report:
+        report(result)
+
+# ---------- Suites ----------
+def bench_encryptor(workdir, sizes, corpora, repeat, report=None) -> list:
+    from cryptography.fernet import Fernet
+    from cli.encryptor import encrypt_file, decrypt_file, decrypt_range, update_file, INDEX_SUFFIX
+    results = []
+    key = Fernet.generate_key()
+    for kind in corpora:
+        for size in sizes:
+            src = os.path.join(workdir, f"{kind}-{size}")
+            enc, dec = src + ".enc", src + ".dec"
+            write_corpus(src, kind, size)
+            _run(results, report, "encryptor", "encrypt", kind, size, lambda: encrypt_file(src, key, enc), repeat, size)
+            _run(results, report, "encryptor", "decrypt", kind, size, lambda: decrypt_file(enc, key, dec), repeat, size)
+            # 4 KiB from the middle: should cost about the same at every size.
+            _run(results, report, "encryptor", "decrypt-range", kind, size,
+                 lambda: decrypt_range(enc, key, size // 2, RANGE_LENGTH), repeat)
+            # Re-encrypting with update_file: nothing changed, then one byte in the middle.
+            update_file(src, key, enc)
+            _run(results, report, "encryptor", "update-unchanged", kind, size, lambda: update_file(src, key, enc),
+                 repeat, size)
+
+            def edit():
+                with open(src, "r+b") as f:
+                    f.seek(size // 2)
+                    byte = f.read(1)
+                    f.seek(size // 2)
+                    f.write(bytes([byte[0] ^ 1]))
+                update_file(src, key, enc)
+
+            _run(results, report, "encryptor", "update-edit", kind, size, edit, repeat, size)
+            for path in (src, enc, dec, enc + INDEX_SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
+    return results
+
+def bench_archive(workdir, sizes, corpora, repeat, report=None) -> list:
+    """
+    Times a first snapshot into a new archive, a snapshot of the same data that
+    has to be re-chunked but stores nothing new (a touched file), and a restore.
+    """
+    from cryptography.fernet import Fernet
+    from cli.archive import add_snapshot, extract_snapshot
+    results = []
+    key = Fernet.generate_key()
+    for kind in corpora:
+        for size in sizes:
+            tree, out = os.path.join(workdir, f"tree-{kind}-{size}"), os.path.join(workdir, f"restore-{kind}-{size}")
+            archive = tree + ".ssa"
+            os.makedirs(tree)
+            write_corpus(os.path.join(tree, "data"), kind, size)
+
+            def first():
+                if os.path.exists(archive):
+                    os.remove(archive)
+                add_snapshot(archive, tree, key)
+
+            def rescan():
+                os.utime(os.path.join(tree, "data"))  # defeat the unchanged-file shortcut
+                add_snapshot(archive, tree, key)
+
+            _run(results, report, "archive", "archive-first", kind, size, first, repeat, size)
+            _run(results, report, "archive", "archive-dedup", kind, size, rescan, repeat, size)
+            _run(results, report, "archive", "archive-extract", kind, size, lambda: extract_snapshot(archive, key, out),
+                 repeat, size)
+            shutil.rmtree(tree)
+            shutil.rmtree(out, ignore_errors=True)
+            for path in (archive, archive + ".lock"):
+                if os.path.exists(path):
+                    os.remove(path)
+    return results
+
+def bench_compresser(workdir, sizes, corpora, repeat, report=None) -> list:
+    results = []
+    for kind in corpora:
+        for size in sizes:
+            src = os.path.join(workdir, f"{kind}-{size}")
+            write_corpus(src, kind, size)
+
+            def profile():
+                with open(src, "rb") as f:
+                    for _ in compresser.entropy_profile(f):
+                        pass
+            _run(results, report, "compresser", "entropy-profile", kind, size, profile, repeat, size)
+
+            if size <= IN_MEMORY_LIMIT:
+                data = make_corpus(kind, size)
+                huffman, runs = compresser.compress(data), compresser.rle(data)
+                cases = (("entropy", lambda: compresser.shannon_entropy(data)),
+                         ("huffman-compress", lambda: compresser.compress(data)),
+                         ("huffman-decompress", lambda: compresser.decompress(huffman)),
+                         ("rle", lambda: compresser.rle(data)),
+                         ("unrle", lambda: compresser.unrle(runs)))
+                for case, func in cases:
+                    _run(results, report, "compresser", case, kind, size, func, repeat, size)
+                del data, huffman, runs
+            os.remove(src)
+    return results
+
+def _create_vault(path):
+    from cli.key_vault import create_vault
+    with redirect_stdout(io.StringIO()):  # keep its "Vault created." out of the results
+        create_vault(BENCH_PASSWORD, path)
+
+def bench_vault(workdir, vault_sizes, repeat, report=None) -> list:
+    """
+    Times unlocking (includes the KDF), whole-vault load, and single-key get and
+    add on vaults holding each number of keys.
+    """
+    from cryptography.fernet import Fernet
+    from cli.key_vault import VaultStore
+    results = []
+    rng = random.Random(0)
+    for n in vault_sizes:
+        path = os.path.join(workdir, f"vault-{n}.enc")
+        _create_vault(path)
+        store = VaultStore(BENCH_PASSWORD, path)
+        store.put_many({f"alias-{i}": Fernet.generate_key().decode() for i in range(n)})
+        added = iter(range(n, n + 10 ** 9))
+        def unlock():
+            VaultStore(BENCH_PASSWORD, path)
+        cases = (("vault-unlock", unlock),
+                 ("vault-load", store.items),
+                 ("vault-get", lambda: store.get(f"alias-{rng.randrange(n)}")),
+                 ("vault-add", lambda: store.put(f"alias-{next(added)}", "k")))
+        for case, func in cases:
+            _run(results, report, "vault", case, "keys", n, func, repeat)
+        for suffix in ("", ".lock"):
+            os.remove(path + suffix)
+    return results
+
+def _cli(workdir, *args):
+    # A new session has no controlling terminal, so getpass reads the password from stdin.
+    subprocess.run([sys.executable, CLI_SCRIPT, *args], cwd=workdir, input=BENCH_PASSWORD + "\n", text=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True, check=True)
+
+def bench_daemon(workdir, sizes, repeat, report=None) -> list:
+    """
+    Per-file latency of encrypting and decrypting through a running daemon
+    (persistent connection), against a cold CLI process per file that unlocks
+    the vault itself, and a cold CLI process forwarding to the daemon.
+    """
+    from cryptography.fernet import Fernet
+    from cli.key_vault import VaultStore, VAULT_FILE
+    from cli.client import Client
+    from cli.daemon import serve
+    results = []
+    _create_vault(os.path.join(workdir, VAULT_FILE))
+    VaultStore(BENCH_PASSWORD, os.path.join(workdir, VAULT_FILE)).put(BENCH_ALIAS, Fernet.generate_key().decode())
+    socket_path = os.path.join(workdir, "daemon.sock")
+    ready = threading.Event()
+    daemons = []
+    server = threading.Thread(target=serve, args=(BENCH_PASSWORD, socket_path, 2),
+                              kwargs={"vault_path": os.path.join(workdir, VAULT_FILE),
+                                      "ready": lambda daemon: (daemons.append(daemon), ready.set())},
+                              daemon=True)
+    server.start()
+    if not ready.wait(60):
+        raise RuntimeError("Benchmark daemon did not start.")
+    try:
+        with Client(socket_path) as client:
+            for size in sizes:
+                src = os.path.join(workdir, f"file-{size}")
+                enc, dec = src + ".enc", src + ".dec"
+                write_corpus(src, "text", size)
+                cases = (("daemon-encrypt", lambda: client.encrypt(BENCH_ALIAS, src, enc)),
+                         ("daemon-decrypt", lambda: client.decrypt(BENCH_ALIAS, enc, dec)),
+                         ("cli-cold-encrypt", lambda: _cli(workdir, "encrypt", "--alias", BENCH_ALIAS,
+                                                           "--file", src, "--out", enc)),
+                         ("cli-client-encrypt", lambda: _cli(workdir, "encrypt", "--alias", BENCH_ALIAS, "--file", src,
+                                                             "--out", enc, "--daemon", socket_path)))
+                for case, func in cases:
+                    _run(results, report, "daemon", case, "text", size, func, repeat)
+                for path in (src, enc, dec):
+                    if os.path.exists(path):
+                        os.remove(path)
+            client.shutdown()
+    finally:
+        if server.is_alive() and daemons:
+            daemons[0].shutdown()
+        server.join()
+    return results
+
+def import_times(args: list) -> dict:
+    """
+    Runs python -X importtime with args and returns {module: cumulative microseconds}.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+def bench_startup(repeat, report=None, budget_ms: float = STARTUP_BUDGET_MS) -> list:
+    """
+    Times cold starts of the CLI and the GUI module and records which of
+    LAZY_MODULES each one imported.
+    """
+    results = []
+    for case, args in STARTUP_CASES:
+        if case == "app-import" and importlib.util.find_spec("PyQt6") is None:
+            continue
+        run = lambda: subprocess.run([sys.executable, *args], cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL, check=True)
+        _run(results, None, "startup", case, "cold", 0, run, repeat)
+        result = results[-1]
+        if "error" not in result:
+            modules = import_times(args)
+            result["budget_ms"] = budget_ms
+            result["heavy_imports"] = [m for m in LAZY_MODULES if m in modules]
+            result["slowest_imports"] = sorted(modules.items(), key=lambda item: -item[1])[:5]
+        if report:
+            report(result)
+    return results
+
+def check_startup(results: list) -> list:
+    """
+    Returns a message for every startup case over its budget or importing a lazy module.
+    """
+    problems = []
+    for result in results:
+        if result["group"] != "startup" or "error" in result:
+            continue
+        ms = result["seconds"] * 1000
+        if ms > result["budget_ms"]:
+            problems.append(f"{result['case']} took {ms:.0f} ms, budget {result['budget_ms']:.0f} ms")
+        if result["heavy_imports"]:
+            problems.append(f"{result['case']} imports {', '.join(result['heavy_imports'])} at start-up")
+    return problems
+
+def run_benchmarks(groups=GROUPS, sizes=None, corpora=CORPORA, vault_sizes=None, repeat: int = 3,
+                   report=None, startup_budget_ms: float = STARTUP_BUDGET_MS) -> dict:
+    """
+    Runs the selected benchmark groups in a scratch directory and returns
+    {"meta": {...}, "results": [...]}; report(result) is called as each case finishes.
+    """
+    sizes = sizes or [parse_size(s) for s in DEFAULT_SIZES.split(",")]
+    vault_sizes = vault_sizes or [int(s) for s in DEFAULT_VAULT_SIZES.split(",")]
+    results = []
+    workdir = tempfile.mkdtemp(prefix="secureshare-bench-")
+    try:
+        if "encryptor" in groups:
+            results += bench_encryptor(workdir, sizes, corpora, repeat, report)
+        if "compresser" in groups:
+            results += bench_compresser(workdir, sizes, corpora, repeat, report)
+        if "archive" in groups:
+            results += bench_archive(workdir, sizes, corpora, repeat, report)
+        if "vault" in groups:
+            results += bench_vault(workdir, vault_sizes, repeat, report)
+        if "daemon" in groups:
+            results += bench_daemon(workdir, sizes, repeat, report)
+        if "startup" in groups:
+            results += bench_startup(repeat, report, startup_budget_ms)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    from cryptography import __version__ as cryptography_version
+    meta = {"python": platform.python_version(), "platform": platform.platform(),
+            "cryptography": cryptography_version, "numpy": compresser.numpy() is not None,
+            "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+# ---------- Reporting ----------
+def metric(result: dict) -> tuple:
+    if result.get("mb_per_sec") is not None:
+        return "MB/s", result["mb_per_sec"]
+    return "ops/s", result.get("ops_per_sec")
+
+def format_result(result: dict) -> str:
+    label = f"{result['group']:10s} {result['case']:18s} {result['corpus']:6s} {result['size']:>11d}"
+    if "error" in result:
+        return f"{label}  error: {result['error']}"
+    unit, value = metric(result)
+    if result["group"] == "startup":
+        return f"{label}  {result['seconds'] * 1000:9.1f} ms    budget {result['budget_ms']:.0f} ms"
+    rss = result.get("peak_rss_mb")
+    return f"{label}  {value:12.1f} {unit:5s}  peak RSS {rss:.0f} MB" if rss is not None else f"{label}  {value:12.1f} {unit}"
+
+def compare(results: list, baseline: list, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Matches results to baseline cases by (group, case, corpus, size) and returns
+    (result, baseline result, relative change) for every case whose throughput
+    dropped by more than tolerance. A case that ran cleanly in the baseline but
+    now fails is returned with a change of None.
+    """
+    reference = {(b["group"], b["case"], b["corpus"], b["size"]): b for b in baseline if "error" not in b}
+    regressions = []
+    for result in results:
+        old = reference.get((result["group"], result["case"], result["corpus"], result["size"]))
+        if old is None:
+            continue
+        if "error" in result:
+            regressions.append((result, old, None))
+            continue
+        new_value, old_value = metric(result)[1], metric(old)[1]
+        if new_value and old_value:
+            change = new_value / old_value - 1
+            if change < -tolerance:
+                regressions.append((result, old, change))
+    return regressions
+
+def load_results(path: str) -> list:
+    with open(path) as f:
+        return json.load(f)["results"]
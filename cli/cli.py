@@ -1,8 +1,30 @@
 import argparse
-from getpass import getpass
-from encryptor import encrypt_file, decrypt_file, generate_key
-from key_vault import create_vault, add_key, get_key
+import json
+import os
 import re
+import stat
+import sys
+import time
+from getpass import getpass
+
+if not __package__:
+    # Run as `python cli/cli.py`: put the project root on the path instead of cli/,
+    # so `cli` resolves to the package rather than to this script.
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only what building the parser needs is imported here; each command imports
+# the rest when it runs, so --help and daemon client calls never load
+# cryptography or numpy (see the "startup" benchmark group).
+from cli.compresser import codec_names, ENTROPY_WINDOW, ENTROPY_THRESHOLD, DEFAULT_CODEC
+from cli.kdf import KDF_NAMES, KDF_CONFIG_FILE, DEFAULT_TARGET_MS
+from cli.watch import DEFAULT_SETTLE, DEFAULT_INTERVAL, DEFAULT_REPORT_EVERY
+from cli.batch import SCRATCH_GLOBS
+from cli.client import Client, default_socket_path
+from cli import bench
+
+# Never picked up as inputs when encrypting a tree: outputs, update_file indexes
+# and the scratch files written alongside them.
+ENCRYPTED_GLOBS = ["*.enc", "*.enc.idx"] + SCRATCH_GLOBS
 
 def password_strength(password: str) -> (bool, list):
     issues = []
@@ -26,6 +48,40 @@ def prompt_strong_password(prompt_msg="Password: ") -> str:
             return pwd
         print("Weak password. Please include:", ", ".join(problems))
 
+def output_path_for(path: str, root: str, out_dir: str, encrypting: bool) -> str:
+    """
+    Maps a file under root to the same relative path under out_dir (None without
+    out_dir, meaning next to the input), adding or stripping ".enc".
+    """
+    if not out_dir:
+        return None
+    rel = os.path.relpath(path, root)
+    rel = rel + ".enc" if encrypting else (rel[:-4] if rel.endswith(".enc") else rel + ".dec")
+    out = os.path.join(out_dir, rel)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    return out
+
+def parse_range(text: str) -> tuple:
+    """
+    Parses --range OFFSET:LENGTH, where both may use K/M/G suffixes.
+    """
+    offset, sep, length = text.partition(":")
+    try:
+        if not sep:
+            raise ValueError
+        return bench.parse_size(offset), bench.parse_size(length)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected OFFSET:LENGTH, e.g. 10M:4K, not '{text}'")
+
+def write_range(data: bytes, out: str):
+    if out:
+        with open(out, "wb") as f:
+            f.write(data)
+        print(f"Decrypted {len(data)} bytes to {out}")
+    else:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
 def main():
     parser = argparse.ArgumentParser(description="Secure File Encryption CLI with Key Vault")
     sub = parser.add_subparsers(dest="command", required=True)
@@ -43,56 +99,362 @@ def main():
     enc_parser.add_argument("--file", required=True, help="File to encrypt")
     enc_parser.add_argument("--out", help="Optional output path")
     enc_parser.add_argument("--delete", action="store_true", help="Delete original file")
+    enc_parser.add_argument("--workers", type=int, default=1, help="Threads used to encrypt chunks in parallel")
 
     dec_parser = sub.add_parser("decrypt", help="Decrypt file using a stored key")
     dec_parser.add_argument("--alias", required=True, help="Key alias")
     dec_parser.add_argument("--file", required=True, help="Encrypted file to decrypt")
     dec_parser.add_argument("--out", help="Optional output path")
+    dec_parser.add_argument("--workers", type=int, default=1, help="Threads used to decrypt chunks in parallel")
+
+    # Encrypt/decrypt a whole directory tree with one vault unlock
+    enc_dir = sub.add_parser("encrypt-dir", help="Encrypt every file under a directory using a stored key")
+    dec_dir = sub.add_parser("decrypt-dir", help="Decrypt every .enc file under a directory using a stored key")
+    for p in (enc_dir, dec_dir):
+        p.add_argument("--alias", required=True, help="Key alias")
+        p.add_argument("--dir", required=True, help="Directory to walk recursively")
+        p.add_argument("--out-dir", help="Write outputs here, mirroring the input tree")
+        p.add_argument("--include", action="append", help="Only process files matching this glob (repeatable)")
+        p.add_argument("--exclude", action="append", help="Skip files matching this glob (repeatable)")
+        p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files processed concurrently")
+    enc_dir.add_argument("--delete", action="store_true", help="Delete original files")
+    for p in (enc_parser, enc_dir):
+        p.add_argument("--update", action="store_true",
+                       help="Keep a chunk index next to each output and only re-encrypt chunks that changed")
+
+    for p in (enc_parser, dec_parser, enc_dir, dec_dir):
+        p.add_argument("--daemon", nargs="?", const=default_socket_path(), metavar="SOCKET",
+                       help="Send the work to a running 'serve' daemon instead of unlocking the vault here")
+
+    # Keep the vault unlocked in a local daemon
+    serve_parser = sub.add_parser("serve", help="Unlock the vault once and serve encrypt/decrypt requests on a Unix socket")
+    serve_parser.add_argument("--socket", default=default_socket_path(), help="Socket path")
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Requests handled concurrently")
+    serve_parser.add_argument("--ttl", type=float, help="Lock the vault after this many seconds (default: never)")
+
+    # Encrypt files as they arrive in a directory
+    watch_parser = sub.add_parser("watch", help="Watch a directory and encrypt new files as they arrive")
+    watch_parser.add_argument("--alias", required=True, help="Key alias")
+    watch_parser.add_argument("--dir", required=True, help="Directory to watch recursively")
+    watch_parser.add_argument("--out-dir", help="Write outputs here, mirroring the input tree")
+    watch_parser.add_argument("--include", action="append", help="Only process files matching this glob (repeatable)")
+    watch_parser.add_argument("--exclude", action="append", help="Skip files matching this glob (repeatable)")
+    watch_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files processed concurrently")
+    watch_parser.add_argument("--delete", action="store_true", help="Delete original files")
+    watch_parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE,
+                              help="Seconds a file must stay unchanged before it is encrypted")
+    watch_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between scans when polling")
+    watch_parser.add_argument("--poll", action="store_true", help="Scan periodically even where inotify is available")
+    watch_parser.add_argument("--existing", action="store_true", help="Also encrypt files already in the directory")
+    watch_parser.add_argument("--report-every", type=float, default=DEFAULT_REPORT_EVERY,
+                              help="Seconds between backlog/latency reports")
+
+    # Deduplicating snapshot archives of directory trees
+    arc_add = sub.add_parser("archive-add", help="Add a snapshot of a directory to a deduplicating encrypted archive")
+    arc_list = sub.add_parser("archive-list", help="List an archive's snapshots, or the files in one of them")
+    arc_extract = sub.add_parser("archive-extract", help="Restore a snapshot from an archive")
+    for p in (arc_add, arc_list, arc_extract):
+        p.add_argument("--alias", required=True, help="Key alias")
+        p.add_argument("--archive", required=True, help="Archive file (created by the first archive-add)")
+    for p in (arc_add, arc_extract):
+        p.add_argument("--include", action="append", help="Only process files matching this glob (repeatable)")
+        p.add_argument("--exclude", action="append", help="Skip files matching this glob (repeatable)")
+        p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Threads used to seal or open chunks")
+    arc_add.add_argument("--dir", required=True, help="Directory to snapshot")
+    arc_add.add_argument("--name", help="Snapshot name (default: the current time)")
+    arc_add.add_argument("--entropy-threshold", type=float, default=ENTROPY_THRESHOLD,
+                         help="Store chunks at or above this many bits/byte uncompressed (9 = always compress)")
+    arc_add.add_argument("--codec", choices=codec_names(), default=DEFAULT_CODEC,
+                         help="Compression codec, fixed when the archive is created")
+    arc_list.add_argument("--snapshot", help="List the files in this snapshot instead")
+    arc_extract.add_argument("--out-dir", required=True, help="Directory to restore into")
+    arc_extract.add_argument("--snapshot", help="Snapshot to restore (default: the newest)")
 
     # Password-based encryption (no vault)
     pass_enc = sub.add_parser("encrypt-pass", help="Encrypt with password (no vault)")
-    pass_enc.add_argument("--file", required=True)
-    pass_enc.add_argument("--out")
+    pass_dec = sub.add_parser("decrypt-pass", help="Decrypt with password (no vault)")
+    for p in (pass_enc, pass_dec):
+        p.add_argument("--file", required=True, nargs="+", help="Files or directories (all share one key derivation)")
+        p.add_argument("--out", help="Output path (single file only)")
+        p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files processed concurrently")
     pass_enc.add_argument("--delete", action="store_true")
 
-    pass_dec = sub.add_parser("decrypt-pass", help="Decrypt with password (no vault)")
-    pass_dec.add_argument("--file", required=True)
-    pass_dec.add_argument("--out")
+    for p in (dec_parser, pass_dec):
+        p.add_argument("--range", type=parse_range, metavar="OFFSET:LENGTH",
+                       help="Only decrypt these plaintext bytes, to --out or stdout (single file only)")
+
+    for p in (enc_parser, enc_dir, watch_parser, pass_enc):
+        p.add_argument("--entropy-threshold", type=float, default=ENTROPY_THRESHOLD,
+                       help="Store chunks at or above this many bits/byte uncompressed (9 = always compress)")
+        p.add_argument("--codec", choices=codec_names() + ["auto"], default=DEFAULT_CODEC,
+                       help="Compression codec; 'auto' picks the best ratio per CPU second on a sample")
+
+    # Tune the password KDF for this machine
+    calib = sub.add_parser("calibrate", help="Benchmark the password KDF and pick its cost for a target latency")
+    calib.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS, help="Target derivation time")
+    calib.add_argument("--max-memory", type=int, default=1024, help="scrypt memory limit in MB")
+    calib.add_argument("--kdf", choices=sorted(KDF_NAMES.values()), help="KDF to calibrate (default: scrypt if available)")
+    calib.add_argument("--save", action="store_true", help=f"Save the result to {KDF_CONFIG_FILE} for new files and vaults")
+
+    # Entropy analysis (no vault)
+    analyze = sub.add_parser("analyze", help="Print entropy profile summaries for files or directory trees")
+    analyze.add_argument("paths", nargs="+", help="Files or directories to scan")
+    analyze.add_argument("--window", type=int, default=ENTROPY_WINDOW, help="Window size in bytes")
+    analyze.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files analysed concurrently")
+
+    # Benchmarks (no vault)
+    bench_parser = sub.add_parser("bench", help="Benchmark encryption, compression and vault operations")
+    bench_parser.add_argument("--groups", default=",".join(bench.GROUPS), help="Comma-separated: " + ", ".join(bench.GROUPS))
+    bench_parser.add_argument("--sizes", default=bench.DEFAULT_SIZES, help="Corpus sizes, e.g. 1K,1M,64M,1G")
+    bench_parser.add_argument("--corpora", default=",".join(bench.CORPORA), help="Comma-separated: " + ", ".join(bench.CORPORA))
+    bench_parser.add_argument("--vault-sizes", default=bench.DEFAULT_VAULT_SIZES, help="Keys per benchmark vault")
+    bench_parser.add_argument("--repeat", type=int, default=3, help="Timings per case (best is kept)")
+    bench_parser.add_argument("--json", help="Write results as JSON to this file")
+    bench_parser.add_argument("--baseline", help="Compare against results saved with --json; exit 1 on regressions")
+    bench_parser.add_argument("--tolerance", type=float, default=bench.DEFAULT_TOLERANCE,
+                              help="Allowed throughput drop against the baseline (0.1 = 10%%)")
+    bench_parser.add_argument("--startup-budget", type=float, default=bench.STARTUP_BUDGET_MS,
+                              help="Cold-start budget in ms for the startup group; exit 1 when exceeded")
+
+    for p in sub.choices.values():
+        p.add_argument("--stats", nargs="?", const="-", metavar="FILE",
+                       help="Write per-stage timings and byte counts as JSON to FILE (stderr without FILE)")
+        p.add_argument("--profile", action="store_true", help="With --stats, include the top cProfile functions")
+        p.add_argument("--trace-memory", action="store_true", help="With --stats, include the tracemalloc peak")
 
     args = parser.parse_args()
+    if not args.stats:
+        run(args, parser)
+        return
+    from cli import stats
+    with stats.collect(args.profile, args.trace_memory) as report:
+        run(args, parser)
+    stats.dump(report, args.stats)
 
+def run(args, parser):
     if args.command == "create-vault":
+        from cli.key_vault import create_vault
         master = prompt_strong_password("Master password (strong): ")
         create_vault(master)
 
     elif args.command == "add-key":
+        from cli.key_vault import add_key
         master = getpass("Master password: ")
         key = add_key(args.alias, master)
         print("New key generated. Keep it safe if you want a backup.")
 
     elif args.command == "encrypt":
-        master = getpass("Master password: ")
-        key = get_key(args.alias, master)
-        out = encrypt_file(args.file, key, args.out, args.delete)
+        if args.update and (args.daemon or args.delete):
+            parser.error("--update keeps the original and runs locally; drop --daemon and --delete")
+        if args.daemon:
+            out = Client(args.daemon).encrypt(args.alias, args.file, args.out, args.delete, workers=args.workers,
+                                              entropy_threshold=args.entropy_threshold, codec=args.codec)
+        elif args.update:
+            from cli.encryptor import update_file
+            from cli.key_vault import get_key
+            master = getpass("Master password: ")
+            key = get_key(args.alias, master)
+            summary = update_file(args.file, key, args.out, workers=args.workers,
+                                  entropy_threshold=args.entropy_threshold, codec=args.codec)
+            out = summary["path"]
+            print(f"{summary['mode'].capitalize()}: {summary['rewritten']} of {summary['chunks']} chunks encrypted, "
+                  f"{summary['written'] / (1024 * 1024):.1f} MB written")
+        else:
+            from cli.encryptor import encrypt_file
+            from cli.key_vault import get_key
+            master = getpass("Master password: ")
+            key = get_key(args.alias, master)
+            out = encrypt_file(args.file, key, args.out, args.delete, workers=args.workers,
+                               entropy_threshold=args.entropy_threshold, codec=args.codec)
         print("Encrypted file:", out)
 
     elif args.command == "decrypt":
+        if args.daemon:
+            client = Client(args.daemon)
+            if args.range:
+                data = client.decrypt_range(args.alias, args.file, *args.range, workers=args.workers)
+            else:
+                out = client.decrypt(args.alias, args.file, args.out, workers=args.workers)
+        else:
+            from cli.encryptor import decrypt_file, decrypt_range
+            from cli.key_vault import get_key
+            master = getpass("Master password: ")
+            key = get_key(args.alias, master)
+            if args.range:
+                data = decrypt_range(args.file, key, *args.range, workers=args.workers)
+            else:
+                out = decrypt_file(args.file, key, args.out, workers=args.workers)
+        if args.range:
+            write_range(data, args.out)
+        else:
+            print("Decrypted file:", out)
+
+    elif args.command in ("encrypt-dir", "decrypt-dir"):
+        from cli.batch import iter_files, run_batch, format_summary
+        encrypting = args.command == "encrypt-dir"
+        if encrypting and args.update and (args.daemon or args.delete):
+            parser.error("--update keeps the originals and runs locally; drop --daemon and --delete")
+        if encrypting:
+            files = iter_files(args.dir, args.include, (args.exclude or []) + ENCRYPTED_GLOBS)
+        else:
+            files = iter_files(args.dir, args.include or ["*.enc"], args.exclude)
+
+        output_for = lambda path: output_path_for(path, args.dir, args.out_dir, encrypting)
+        if args.daemon:
+            # One connection per batch thread; the daemon's pool does the work.
+            client = Client(args.daemon)
+            if encrypting:
+                action = lambda path: client.encrypt(args.alias, path, output_for(path), args.delete,
+                                                     entropy_threshold=args.entropy_threshold, codec=args.codec)
+            else:
+                action = lambda path: client.decrypt(args.alias, path, output_for(path))
+        else:
+            from cli.encryptor import encrypt_file, decrypt_file, update_file
+            from cli.key_vault import get_key
+            master = getpass("Master password: ")
+            key = get_key(args.alias, master)
+            if encrypting and args.update:
+                action = lambda path: update_file(path, key, output_for(path),
+                                                  entropy_threshold=args.entropy_threshold, codec=args.codec)
+            elif encrypting:
+                action = lambda path: encrypt_file(path, key, output_for(path), args.delete,
+                                                   entropy_threshold=args.entropy_threshold, codec=args.codec)
+            else:
+                action = lambda path: decrypt_file(path, key, output_for(path))
+        summary = run_batch(files, action, args.workers)
+        print(format_summary(summary))
+
+    elif args.command == "watch":
+        from cli.batch import format_summary
+        from cli.encryptor import encrypt_file
+        from cli.key_vault import get_key
+        from cli.watch import watch
+        master = getpass("Master password: ")
+        key = get_key(args.alias, master)  # unlocked once for the whole session
+        action = lambda path: encrypt_file(path, key, output_path_for(path, args.dir, args.out_dir, True), args.delete,
+                                           entropy_threshold=args.entropy_threshold, codec=args.codec)
+        summary = watch(args.dir, action, args.workers, args.settle, args.interval, args.include,
+                        (args.exclude or []) + ENCRYPTED_GLOBS, args.existing, args.poll, args.report_every)
+        print(format_summary(summary))
+
+    elif args.command in ("archive-add", "archive-list", "archive-extract"):
+        from cli import archive
+        from cli.key_vault import get_key
         master = getpass("Master password: ")
         key = get_key(args.alias, master)
-        out = decrypt_file(args.file, key, args.out)
-        print("Decrypted file:", out)
+        if args.command == "archive-add":
+            summary = archive.add_snapshot(args.archive, args.dir, key, args.name, args.include, args.exclude, args.workers,
+                                     args.codec, args.entropy_threshold)
+            print(f"{summary['files']} files ({summary['bytes'] / (1024 * 1024):.1f} MB) in {summary['seconds']:.2f}s: "
+                  f"{summary['new_chunks']} of {summary['chunks']} chunks new ({summary['new_bytes'] / (1024 * 1024):.1f} MB), "
+                  f"archive grew by {summary['stored'] / (1024 * 1024):.1f} MB")
+        elif args.command == "archive-list" and args.snapshot:
+            for f in archive.list_files(args.archive, key, args.snapshot):
+                print(f"{stat.filemode(f['mode'] | stat.S_IFREG)} {f['size']:>12d} "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(f['mtime']))}  {f['path']}")
+        elif args.command == "archive-list":
+            for snap in archive.list_snapshots(args.archive, key):
+                print(f"{snap['name']:24s} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snap['time']))} "
+                      f"{snap['files']:>7d} files {snap['size'] / (1024 * 1024):>10.1f} MB "
+                      f"(+{snap['stored'] / (1024 * 1024):.1f} MB stored)")
+        else:
+            summary = archive.extract_snapshot(args.archive, key, args.out_dir, args.snapshot, args.include, args.exclude,
+                                         args.workers)
+            print(f"Restored {summary['files']} files ({summary['bytes'] / (1024 * 1024):.1f} MB) in {summary['seconds']:.2f}s")
 
-    elif args.command == "encrypt-pass":
-        password = prompt_strong_password("Password for encryption: ")
-        key = generate_key(password)
-        out = encrypt_file(args.file, key, args.out, args.delete)
-        print("Encrypted file:", out)
+    elif args.command == "serve":
+        from cli.daemon import serve
+        master = getpass("Master password: ")
+        ready = lambda daemon: print(f"Serving on {args.socket} with {args.workers} workers; Ctrl+C to stop.", flush=True)
+        handled = serve(master, args.socket, args.workers, args.ttl, ready=ready)
+        print(f"Daemon stopped after {handled} requests.")
+
+    elif args.command == "analyze":
+        from concurrent.futures import ThreadPoolExecutor
+        from cli.batch import iter_files
+        from cli.compresser import analyze_file
+
+        def targets():
+            for path in args.paths:
+                yield from iter_files(path) if os.path.isdir(path) else [path]
+
+        verdicts = {}
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            for r in pool.map(lambda path: analyze_file(path, args.window), targets()):
+                verdicts[r["verdict"]] = verdicts.get(r["verdict"], 0) + 1
+                print(f"{r['verdict']:12s} mean {r['mean']:.2f} min {r['min']:.2f} max {r['max']:.2f} "
+                      f"high {r['high_fraction']:6.1%} {r['size']:>12d}  {r['path']}")
+        print(", ".join(f"{n} {v}" for v, n in sorted(verdicts.items())))
+
+    elif args.command == "bench":
+        results = bench.run_benchmarks(args.groups.split(","), [bench.parse_size(s) for s in args.sizes.split(",")],
+                                       args.corpora.split(","), [int(n) for n in args.vault_sizes.split(",")],
+                                       args.repeat, report=lambda result: print(bench.format_result(result), flush=True),
+                                       startup_budget_ms=args.startup_budget)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+            print("Results written to", args.json)
+        if args.baseline:
+            regressions = bench.compare(results["results"], bench.load_results(args.baseline), args.tolerance)
+            for result, old, change in regressions:
+                label = f"REGRESSION {result['group']} {result['case']} {result['corpus']} {result['size']}"
+                if change is None:
+                    print(f"{label}: now fails: {result['error']}")
+                    continue
+                unit, value = bench.metric(result)
+                print(f"{label}: {bench.metric(old)[1]:.1f} -> {value:.1f} {unit} ({change:+.0%})")
+            print(f"{len(regressions)} regressions against {args.baseline}")
+            if regressions:
+                sys.exit(1)
+        problems = bench.check_startup(results["results"])
+        for problem in problems:
+            print("STARTUP", problem)
+        if problems:
+            sys.exit(1)
+
+    elif args.command in ("encrypt-pass", "decrypt-pass"):
+        from cli.batch import iter_files, run_batch, format_summary
+        from cli.encryptor import encrypt_file, decrypt_file, decrypt_range, password_key
+        from cli.kdf import derive_key, new_salt, load_params
+        encrypting = args.command == "encrypt-pass"
+        files = []
+        for path in args.file:
+            if os.path.isdir(path):
+                files.extend(iter_files(path, None if encrypting else ["*.enc"], ENCRYPTED_GLOBS if encrypting else None))
+            else:
+                files.append(path)
+        if args.out and len(files) != 1:
+            parser.error("--out needs exactly one input file")
+        if not encrypting and args.range and len(files) != 1:
+            parser.error("--range needs exactly one input file")
+
+        if encrypting:
+            password = prompt_strong_password("Password for encryption: ")
+            # One salt per run: every file gets its own nonce, and the key is derived once.
+            kdf = (new_salt(), load_params())
+            key = derive_key(password, *kdf)
+            action = lambda path: encrypt_file(path, key, args.out, args.delete, entropy_threshold=args.entropy_threshold,
+                                               codec=args.codec, kdf=kdf)
+        else:
+            password = getpass("Password: ")
+            # Keys are cached per salt, so files from the same run derive once.
+            action = lambda path: decrypt_file(path, password_key(path, password), args.out)
+
+        if not encrypting and args.range:
+            write_range(decrypt_range(files[0], password_key(files[0], password), *args.range), args.out)
+        elif len(files) == 1:
+            print("Encrypted file:" if encrypting else "Decrypted file:", action(files[0]))
+        else:
+            print(format_summary(run_batch(files, action, args.workers)))
 
-    elif args.command == "decrypt-pass":
-        password = getpass("Password: ")
-        key = generate_key(password)
-        out = decrypt_file(args.file, key, args.out)
-        print("Decrypted file:", out)
+    elif args.command == "calibrate":
+        from cli.kdf import calibrate, save_params
+        params = calibrate(args.target_ms, args.max_memory, args.kdf)
+        print(f"{params['name']}: cost {params['cost']}, r {params['r']}, p {params['p']} -> {params['ms']:.0f} ms per derivation")
+        if args.save:
+            save_params(params)
+            print(f"Saved to {KDF_CONFIG_FILE}.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,173 @@
+import base64
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+
+# ---------- Daemon protocol ----------
+# Requests and responses are JSON objects, each sent as a 4-byte big-endian
+# length followed by the UTF-8 body. A request is {"id", "op", ...fields}; the
+# response carries the same id and either {"ok": true, "result"} or
+# {"ok": false, "error", "type"}. A connection may pipeline requests, and
+# responses can come back out of order. This module only needs the standard
+# library, so a client does not pay for importing the crypto stack.
+MESSAGE = struct.Struct(">I")
+MAX_MESSAGE = 16 * 1024 * 1024
+SOCKET_NAME = "secureshare-{uid}.sock"
+
+class DaemonError(Exception):
+    """
+    A request failed in the daemon; kind is the name of the exception raised there.
+    """
+    def __init__(self, message: str, kind: str = None):
+        super().__init__(message)
+        self.kind = kind
+
+# Daemon-side exceptions that are re-raised as themselves in the client.
+_BUILTIN_ERRORS = {cls.__name__: cls for cls in (FileNotFoundError, FileExistsError, PermissionError,
+                                                 IsADirectoryError, KeyError, ValueError)}
+
+def default_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(runtime_dir, SOCKET_NAME.format(uid=uid))
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = sock.recv_into(view[got:])
+        if not n:
+            if got == 0:
+                return b""
+            raise ConnectionError("Connection closed in the middle of a message.")
+        got += n
+    return bytes(buf)
+
+def read_message(sock: socket.socket) -> dict:
+    """
+    Reads one message, or returns None if the peer closed the connection.
+    """
+    prefix = _recv_exact(sock, MESSAGE.size)
+    if not prefix:
+        return None
+    (length,) = MESSAGE.unpack(prefix)
+    if length > MAX_MESSAGE:
+        raise ConnectionError(f"Message of {length} bytes exceeds the {MAX_MESSAGE} byte limit.")
+    body = _recv_exact(sock, length)
+    if len(body) != length:
+        raise ConnectionError("Connection closed in the middle of a message.")
+    return json.loads(body)
+
+def send_message(sock: socket.socket, message: dict):
+    body = json.dumps(message).encode()
+    sock.sendall(MESSAGE.pack(len(body)) + body)
+
+class Client:
+    """
+    Talks to a running daemon (see cli.daemon). Each thread gets its own
+    connection, so one Client can be shared by a pool of threads. Paths are
+    sent as absolute paths because the daemon has its own working directory.
+    """
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._local = threading.local()
+        self._sockets = []
+        self._sockets_lock = threading.Lock()
+
+    def _socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock, self._local.next_id = sock, 0
+            with self._sockets_lock:
+                self._sockets.append(sock)
+        return sock
+
+    def request(self, op: str, **fields):
+        """
+        Sends one request and waits for its result, raising the daemon's error.
+        """
+        sock = self._socket()
+        self._local.next_id += 1
+        request_id = self._local.next_id
+        try:
+            send_message(sock, dict(fields, id=request_id, op=op))
+            response = read_message(sock)
+        except OSError:
+            self._drop(sock)
+            raise
+        if response is None:
+            self._drop(sock)
+            raise ConnectionError("The daemon closed the connection.")
+        if response.get("id") != request_id:
+            self._drop(sock)
+            raise ConnectionError("Response does not match the request.")
+        if not response["ok"]:
+            cls = _BUILTIN_ERRORS.get(response.get("type"))
+            raise cls(response["error"]) if cls else DaemonError(response["error"], response.get("type"))
+        return response["result"]
+
+    def _drop(self, sock: socket.socket):
+        self._local.sock = None
+        with self._sockets_lock:
+            if sock in self._sockets:
+                self._sockets.remove(sock)
+        sock.close()
+
+    def close(self):
+        with self._sockets_lock:
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            sock.close()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ping(self) -> dict:
+        return self.request("ping")
+
+    def encrypt(self, alias: str, path: str, out: str = None, delete: bool = False, **options) -> str:
+        """
+        Encrypts path with the key stored under alias. options are passed to
+        encrypt_file in the daemon: workers, entropy_threshold, codec.
+        """
+        return self.request("encrypt", alias=alias, path=os.path.abspath(path),
+                            out=out and os.path.abspath(out), delete=delete, **options)
+
+    def decrypt(self, alias: str, path: str, out: str = None, delete: bool = False, **options) -> str:
+        return self.request("decrypt", alias=alias, path=os.path.abspath(path),
+                            out=out and os.path.abspath(out), delete=delete, **options)
+
+    def decrypt_range(self, alias: str, path: str, offset: int, length: int, **options) -> bytes:
+        """
+        Returns plaintext bytes [offset, offset + length) of an encrypted file.
+        The bytes travel base64-encoded in one message, so ranges are limited to
+        about 3/4 of MAX_MESSAGE.
+        """
+        data = self.request("decrypt-range", alias=alias, path=os.path.abspath(path), offset=offset, length=length,
+                            **options)
+        return base64.b64decode(data)
+
+    def get_key(self, alias: str) -> bytes:
+        return self.request("get-key", alias=alias).encode()
+
+    def list_aliases(self) -> list:
+        return self.request("aliases")
+
+    def shutdown(self):
+        self.request("shutdown")
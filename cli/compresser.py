@@ -1,33 +1,226 @@
-import os, math
+import os, re, sys, math
 from collections import Counter
 import struct
 import heapq
-import struct
+import time
+import zlib, lzma, bz2
+
+_np = False  # numpy, None if it is not installed, or False until first needed
+
+def numpy():
+    # numpy is optional and only makes histograms and Huffman encoding faster;
+    # importing it costs ~100 ms, so it is loaded on first use rather than at import.
+    global _np
+    if _np is False:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        _np = np
+    return _np
+
+# ---------- Entropy ----------
+ENTROPY_WINDOW = 64 * 1024
+HIGH_ENTROPY = 7.9
+# Chunks whose sampled entropy reaches this many bits per byte (8 is random
+# data) are stored raw: zlib cannot shrink JPEGs, video or archives.
+ENTROPY_THRESHOLD = 7.8
+
+def byte_histogram(data):
+    np = numpy()
+    if np is not None:
+        return np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    counts = Counter(memoryview(data).cast("B"))
+    return [counts.get(b, 0) for b in range(256)]
+
+def entropy_from_histogram(hist, total):
+    if not total:
+        return 0.0
+    np = numpy()
+    if np is not None:
+        p = np.asarray(hist, dtype=np.float64)
+        p = p[p > 0] / total
+        return float(-(p * np.log2(p)).sum())
+    return -sum(c / total * math.log2(c / total) for c in hist if c)
 
-# ---------- RLE ----------
 def shannon_entropy(data):
-    freq = Counter(data)
-    entropy = 0 
-    for i in freq.values():
-        p = i / len(data)
-        if p > 0:
-            result = p * math.log2(p)
-            entropy -= result
+    return entropy_from_histogram(byte_histogram(data), len(data))
+
+def entropy_profile(f, window=ENTROPY_WINDOW, step=None):
+    # Yields (offset, length, entropy) for the windows of a stream starting every
+    # step bytes (default: window, i.e. no overlap); the last one may be short.
+    # Only the current window is held in memory and the histogram is updated
+    # incrementally as the window slides.
+    step = step or window
+    if not 0 < step <= window:
+        raise ValueError("step must be between 1 and window.")
+    buf = bytearray(f.read(window))
+    if not buf:
+        return
+    hist = byte_histogram(buf)
+    np = numpy()
+    if np is None:
+        hist = list(hist)
+    offset = 0
+    while True:
+        yield offset, len(buf), entropy_from_histogram(hist, len(buf))
+        new = f.read(step) if len(buf) == window else b""
+        if not new:
+            return
+        dropped = buf[:step]
+        added, removed = byte_histogram(new), byte_histogram(dropped)
+        if np is not None:
+            hist = hist + added - removed
+        else:
+            hist = [h + a - r for h, a, r in zip(hist, added, removed)]
+        del buf[:step]
+        buf += new
+        offset += step
+
+def analyze_file(filepath, window=ENTROPY_WINDOW):
+    # Summarises a file's entropy profile. "random" files (already compressed or
+    # encrypted) gain nothing from compression; "mixed" ones only in places.
+    with open(filepath, "rb") as f:
+        values = [(length, entropy) for _, length, entropy in entropy_profile(f, window)]
+    size = sum(length for length, _ in values)
+    entropies = [entropy for _, entropy in values]
+    high = sum(length for length, entropy in values if entropy >= HIGH_ENTROPY)
+    mean = sum(length * entropy for length, entropy in values) / size if size else 0.0
+    if not size or high == 0:
+        verdict = "compressible"
+    elif high == size:
+        verdict = "random"
+    else:
+        verdict = "mixed"
+    return {
+        "path": filepath,
+        "size": size,
+        "windows": len(values),
+        "mean": mean,
+        "min": min(entropies, default=0.0),
+        "max": max(entropies, default=0.0),
+        "high_fraction": high / size if size else 0.0,
+        "verdict": verdict,
+    }
+
+# ---------- RLE ----------
+
+# rle() output is a sequence of tokens: a LEB128 varint of (length << 1 | is_run)
+# followed by the run byte, or by the literal bytes. Runs shorter than RLE_MIN_RUN
+# stay inside literals, so incompressible data costs a few bytes per chunk
+# instead of tripling in size.
+RLE_MIN_RUN = 4
+RLE_PIECE = 1024 * 1024
+RLE_SCAN_BLOCK = 1024 * 1024
+_ZERO_DIFFS = re.compile(b"\x00" * (RLE_MIN_RUN - 1) + b"+")
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+def _read_varint(buf, pos):
+    # Returns (value, position after it), or (None, pos) if buf ends mid-varint.
+    n = shift = 0
+    while pos < len(buf):
+        if shift > 63:
+            raise ValueError("RLE data is corrupt (varint too long).")
+        b = buf[pos]
+        n |= (b & 0x7F) << shift
+        pos += 1
+        if not b & 0x80:
+            return n, pos
+        shift += 7
+    return None, pos
 
-    return entropy
+def _runs(data):
+    # Yields (start, end) of every run of at least RLE_MIN_RUN equal bytes. Each
+    # block is XOR-ed with itself shifted by one byte as a big integer, which leaves
+    # a zero wherever neighbours match; the regex engine then finds the zero
+    # stretches. Stretches that meet at a block boundary are joined.
+    view = memoryview(data).cast("B")
+    pending = None
+    for base in range(0, max(len(view) - 1, 0), RLE_SCAN_BLOCK):
+        block = view[base:base + RLE_SCAN_BLOCK + 1]
+        diff = int.from_bytes(block[1:], "big") ^ int.from_bytes(block[:-1], "big")
+        for match in _ZERO_DIFFS.finditer(diff.to_bytes(len(block) - 1, "big")):
+            start, end = match.start() + base, match.end() + base
+            if pending and pending[1] == start:
+                pending = (pending[0], end)
+                continue
+            if pending:
+                yield pending[0], pending[1] + 1
+            pending = (start, end)
+    if pending:
+        yield pending[0], pending[1] + 1
 
 def rle(data):
-    pos = 0
     compressed = bytearray()
-    while pos < len(data):
-        run_byte = data[pos]
-        count = 1
-        while pos + count < len(data) and data[pos + count] == run_byte:
-            count += 1
-        compressed += struct.pack("!BH", run_byte, count)
-        pos += count      
+    pos = 0
+    for start, end in _runs(data):
+        if start > pos:
+            compressed += _varint((start - pos) << 1)
+            compressed += data[pos:start]
+        compressed += _varint((end - start) << 1 | 1)
+        compressed.append(data[start])
+        pos = end
+    if pos < len(data):
+        compressed += _varint((len(data) - pos) << 1)
+        compressed += data[pos:]
     return compressed
 
+def iter_unrle(chunks):
+    # Streaming decoder: takes compressed pieces, yields output pieces of at most
+    # RLE_PIECE bytes, so neither long runs nor long literals are held whole.
+    buf = bytearray()
+    literal = 0
+    for chunk in chunks:
+        buf += chunk
+        pos = 0
+        while True:
+            if literal:
+                take = min(literal, len(buf) - pos, RLE_PIECE)
+                if not take:
+                    break
+                yield bytes(buf[pos:pos + take])
+                pos, literal = pos + take, literal - take
+                continue
+            token, after = _read_varint(buf, pos)
+            if token is None:
+                break
+            # rle() never writes empty literals or runs below RLE_MIN_RUN; a zero
+            # run would otherwise never finish.
+            if token >> 1 < (RLE_MIN_RUN if token & 1 else 1):
+                raise ValueError("RLE data is corrupt (empty or short token).")
+            if token & 1:
+                if after >= len(buf):
+                    break
+                count, piece = token >> 1, bytes([buf[after]]) * min(token >> 1, RLE_PIECE)
+                while count >= len(piece):
+                    yield piece
+                    count -= len(piece)
+                if count:
+                    yield piece[:count]
+                pos = after + 1
+            else:
+                literal, pos = token >> 1, after
+        del buf[:pos]
+    if buf or literal:
+        raise ValueError("RLE data is truncated.")
+
+def unrle(blob):
+    return b"".join(iter_unrle([blob]))
+
+def _unrle_triples(blob):
+    # Decoder for the first RLE format: (byte, 16-bit count) triples.
+    out = bytearray()
+    for run_byte, count in struct.iter_unpack("!BH", blob):
+        out += bytes([run_byte]) * count
+    return bytes(out)
+
 # ---------- Huffman ----------
 class Node:
     def __init__(self, freq, byte=None, left=None, right=None):
@@ -56,13 +249,130 @@ def generate_codes(node, prefix="", table=None):
         generate_codes(node.right, prefix + "1", table)
     return table
 
+ENCODE_BLOCK = 1 << 20
+PAIR_TABLE_MIN = 64 * 1024
+
+VECTOR_CODE_LIMIT = 32  # so a pair of codes fits one 64-bit word
+
+def _encode_numpy(np, view, codes):
+    # Bytes are coded two at a time from a 65536-entry table of (bits, length)
+    # pairs. Every pair starts at a known bit offset (a running sum of lengths)
+    # and, being at most 64 bits, lands in one or two big-endian 64-bit words.
+    # Each word has at least one pair starting in it, so OR-reducing the pairs'
+    # heads per word (reduceat) builds the words; the tails of pairs that spill
+    # past a word end are reduced the same way and ORed into the following word.
+    # numpy shifts by 64 or more give 0, which zeroes the tails that don't spill.
+    # The partial last word carries into the next block.
+    u64 = np.uint64
+    single_bits = np.zeros(256, dtype=u64)
+    single_len = np.zeros(256, dtype=u64)
+    for b, code in codes.items():
+        single_bits[b], single_len[b] = int(code, 2), len(code)
+    pair_bits = (single_bits[:, None] << single_len[None, :] | single_bits[None, :]).ravel()
+    pair_len = (single_len[:, None] + single_len[None, :]).ravel()
+    even = len(view) - len(view) % 2
+    pairs = np.frombuffer(view[:even], dtype=">u2")
+
+    def blocks():
+        for i in range(0, len(pairs), ENCODE_BLOCK // 2):
+            chunk = pairs[i:i + ENCODE_BLOCK // 2]
+            yield pair_bits[chunk], pair_len[chunk]
+        if even < len(view):
+            yield single_bits[[view[-1]]], single_len[[view[-1]]]
+
+    packed = bytearray()
+    word, used = u64(0), 0  # partial last word and how many of its bits are set
+    for bits, size in blocks():
+        ends = np.cumsum(size)
+        ends += u64(used)
+        offsets = ends - size
+        index = offsets >> u64(6)
+        end_bit = (offsets & u64(63)) + size  # past 64 if the pair spills into the next word
+        heads = bits >> (np.maximum(end_bit, u64(64)) - u64(64)) << (u64(64) - np.minimum(end_bit, u64(64)))
+        tails = bits << (u64(128) - end_bit)
+        heads[0] |= word
+        starts = np.flatnonzero(index[1:] != index[:-1]) + 1
+        starts = np.concatenate(([0], starts))
+        words = np.bitwise_or.reduceat(heads, starts)
+        words = np.append(words, u64(0))
+        words[1:] |= np.bitwise_or.reduceat(tails, starts)
+        total = int(ends[-1])
+        nwords = total >> 6
+        packed += words[:nwords].astype(">u8").tobytes()
+        word, used = words[nwords], total & 63
+    packed += np.array([word], dtype=">u8").tobytes()[:(used + 7) // 8]
+    return packed, (8 - used % 8) % 8
+
 def encode_data(data, codes):
-    bits = "".join(codes[b] for b in data)
-    padding = (8 - len(bits) % 8) % 8
-    bits += "0" * padding
-    packed = bytearray(int(bits[i:i+8], 2) for i in range(0, len(bits), 8))
+    # With numpy, codes are packed a block at a time by _encode_numpy. Otherwise
+    # they are looked up two input bytes at a time from a 65536-entry table and
+    # each block's bits are packed with one int() parse, instead of one per byte.
+    view = memoryview(data).cast("B")
+    np = numpy() if len(view) >= PAIR_TABLE_MIN else None
+    if np is not None and max(map(len, codes.values()), default=VECTOR_CODE_LIMIT + 1) <= VECTOR_CODE_LIMIT:
+        return _encode_numpy(np, view, codes)
+    single = [codes.get(b, "") for b in range(256)]
+    packed = bytearray()
+    if len(view) < PAIR_TABLE_MIN:
+        # Building the pair table costs more than it saves on small inputs.
+        carry = "".join([single[b] for b in view])
+    else:
+        if sys.byteorder == "little":
+            pairs = [single[lo] + single[hi] for hi in range(256) for lo in range(256)]
+        else:
+            pairs = [single[hi] + single[lo] for hi in range(256) for lo in range(256)]
+        even = len(view) - len(view) % 2
+        carry = ""
+        for start in range(0, even, ENCODE_BLOCK):
+            bits = carry + "".join([pairs[p] for p in view[start:min(start + ENCODE_BLOCK, even)].cast("H")])
+            spare = len(bits) % 8
+            if len(bits) > spare:
+                packed += (int(bits, 2) >> spare).to_bytes(len(bits) // 8, "big")
+            carry = bits[len(bits) - spare:]
+        if even < len(view):
+            carry += single[view[-1]]
+    padding = (8 - len(carry) % 8) % 8
+    if carry:
+        carry += "0" * padding
+        packed += int(carry, 2).to_bytes(len(carry) // 8, "big")
     return packed, padding
 
+def _walk_bits(node, root, byte, nbits=8):
+    # Follows the top nbits of byte from node; returns (decoded bytes, node reached).
+    out = bytearray()
+    for shift in range(7, 7 - nbits, -1):
+        node = node.right if byte >> shift & 1 else node.left
+        if node.byte is not None:
+            out.append(node.byte)
+            node = root
+    return bytes(out), node
+
+def decode_data(packed, padding, root):
+    # Decodes a whole input byte per step: table maps (tree position, byte) to the
+    # symbols completed within that byte and the position reached, so codes of any
+    # length need no special case. Entries are filled in the first time they occur.
+    nodes, states = [root], {id(root): 0}
+    table = {}
+    out = bytearray()
+    state = 0
+    view = memoryview(packed).cast("B")
+    for byte in view[:-1]:
+        key = state | byte
+        try:
+            chunk, state = table[key]
+        except KeyError:
+            chunk, node = _walk_bits(nodes[state >> 8], root, byte)
+            if id(node) not in states:
+                states[id(node)] = len(nodes) << 8
+                nodes.append(node)
+            table[key] = chunk, states[id(node)]
+            chunk, state = table[key]
+        out += chunk
+    if len(view):
+        chunk, _ = _walk_bits(nodes[state >> 8], root, view[-1], 8 - padding)
+        out += chunk
+    return out
+
 def write_header(freqs):
     header = struct.pack(">H", len(freqs))
     for b, f in freqs.items():
@@ -79,51 +389,240 @@ def read_header(blob):
         pos += 5
     return freqs, pos
 
+# ---------- Canonical Huffman ----------
+# Blobs start with HUFFMAN_VERSION, then padding, the lowest and highest symbol
+# present and one 4-bit code length per symbol in that range (0 = unused).
+# The codes themselves are rebuilt from the lengths. Legacy blobs started with a
+# 16-bit symbol count (first byte 0 or 1) followed by 5-byte frequency entries.
+HUFFMAN_VERSION = 2
+MAX_CODE_LENGTH = 15
+
+def limit_code_lengths(lengths, freqs, max_len=MAX_CODE_LENGTH):
+    lengths = {b: min(l, max_len) for b, l in lengths.items()}
+    overflow = sum(1 << (max_len - l) for l in lengths.values()) - (1 << max_len)
+    # Clamping broke the Kraft inequality; lengthen the rarest short codes until it holds.
+    for b in sorted(lengths, key=lambda b: (freqs[b], b)):
+        while overflow > 0 and lengths[b] < max_len:
+            lengths[b] += 1
+            overflow -= 1 << (max_len - lengths[b])
+    return lengths
+
+def canonical_codes(lengths):
+    codes, code, prev_len = {}, 0, 0
+    for b in sorted(lengths, key=lambda b: (lengths[b], b)):
+        code <<= lengths[b] - prev_len
+        codes[b] = format(code, f"0{lengths[b]}b")
+        code, prev_len = code + 1, lengths[b]
+    return codes
+
+def tree_from_codes(codes):
+    root = Node(0)
+    for b, code in codes.items():
+        node = root
+        for bit in code[:-1]:
+            if bit == "1":
+                node.right = node.right or Node(0)
+                node = node.right
+            else:
+                node.left = node.left or Node(0)
+                node = node.left
+        if code[-1] == "1":
+            node.right = Node(0, b)
+        else:
+            node.left = Node(0, b)
+    return root
+
+def write_lengths(lengths):
+    if not lengths:
+        return struct.pack(">BB", 1, 0)
+    lo, hi = min(lengths), max(lengths)
+    nibbles = [lengths.get(b, 0) for b in range(lo, hi + 1)] + [0]
+    return struct.pack(">BB", lo, hi) + bytes(nibbles[i] << 4 | nibbles[i + 1] for i in range(0, hi - lo + 1, 2))
+
+def read_lengths(blob, pos):
+    lo, hi = struct.unpack_from(">BB", blob, pos)
+    pos += 2
+    lengths = {}
+    for i in range(hi - lo + 1):
+        nibble = blob[pos + i // 2] >> (4 if i % 2 == 0 else 0) & 0x0F
+        if nibble:
+            lengths[lo + i] = nibble
+    return lengths, pos + (hi - lo + 2) // 2 if hi >= lo else pos
+
 def compress(data):
     freqs = dict(Counter(data))
-    root = build_tree(freqs)
-    codes = generate_codes(root)
-    packed, padding = encode_data(data, codes)
-    header = write_header(freqs)
-    return header + struct.pack(">B", padding) + packed
+    lengths = {}
+    if freqs:
+        lengths = {b: len(code) for b, code in generate_codes(build_tree(freqs)).items()}
+        lengths = limit_code_lengths(lengths, freqs)
+    packed, padding = encode_data(data, canonical_codes(lengths))
+    return struct.pack(">BB", HUFFMAN_VERSION, padding) + write_lengths(lengths) + packed
 
 def decompress(blob):
+    if blob and blob[0] == HUFFMAN_VERSION:
+        padding = blob[1]
+        lengths, pos = read_lengths(blob, 2)
+        if not lengths:
+            return b""
+        return bytes(decode_data(blob[pos:], padding, tree_from_codes(canonical_codes(lengths))))
+    return _decompress_legacy(blob)
+
+def _decompress_legacy(blob):
     freqs, pos = read_header(blob)
     padding = struct.unpack_from(">B", blob, pos)[0]
     pos += 1
-    bitstring = "".join(f"{b:08b}" for b in blob[pos:])
-    bitstring = bitstring[:-padding] if padding else bitstring
+    if len(freqs) <= 1:
+        # A single symbol gets a 1-bit code but no tree to walk.
+        return b"".join(bytes([b]) * f for b, f in freqs.items())
     root = build_tree(freqs)
-    out, node = bytearray(), root
-    for bit in bitstring:
-        node = node.right if bit == "1" else node.left
-        if node.byte is not None:
-            out.append(node.byte)
-            node = root
-    return bytes(out)
+    return bytes(decode_data(blob[pos:], padding, root))
+
+# ---------- Block files ----------
+# compress_file writes: BLOCK_MAGIC | version | block size, then each block as an
+# independent canonical Huffman blob, then an index of (offset, raw size, blob size)
+# per block and a footer pointing at it, so any block can be decoded on its own.
+BLOCK_MAGIC = b"HUFB"
+BLOCK_VERSION = 1
+BLOCK_SIZE = 1024 * 1024
+BLOCK_HEADER = struct.Struct(">4sBI")
+BLOCK_ENTRY = struct.Struct(">QII")
+BLOCK_FOOTER = struct.Struct(">QI4s")
+
+def iter_blocks(f, block_size=BLOCK_SIZE):
+    while True:
+        block = f.read(block_size)
+        if not block:
+            return
+        yield block
 
-def compress_file(filepath, output_path=None):
+def compress_blocks(blocks):
+    for block in blocks:
+        yield len(block), compress(block)
+
+def read_block_index(f):
+    f.seek(0)
+    magic, version, block_size = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+    if magic != BLOCK_MAGIC or version != BLOCK_VERSION:
+        raise ValueError("Not a block-compressed file.")
+    f.seek(-BLOCK_FOOTER.size, os.SEEK_END)
+    index_offset, count, magic = BLOCK_FOOTER.unpack(f.read(BLOCK_FOOTER.size))
+    if magic != BLOCK_MAGIC:
+        raise ValueError("Block index footer is missing; the file is truncated.")
+    f.seek(index_offset)
+    raw = f.read(count * BLOCK_ENTRY.size)
+    return [BLOCK_ENTRY.unpack_from(raw, i * BLOCK_ENTRY.size) for i in range(count)]
+
+def decompress_block(f, entry):
+    offset, _, size = entry
+    f.seek(offset)
+    return decompress(f.read(size))
+
+def iter_decompressed_blocks(f):
+    for entry in read_block_index(f):
+        yield decompress_block(f, entry)
+
+def is_block_file(f):
+    f.seek(0)
+    magic = f.read(len(BLOCK_MAGIC))
+    f.seek(0)
+    return magic == BLOCK_MAGIC
+
+def compress_file(filepath, output_path=None, block_size=BLOCK_SIZE):
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"File '{filepath}' not found.")
-    with open(filepath, "rb") as f:
-        data = f.read()
-    compressed_data = compress(data)
     output_path = output_path or filepath + ".huf"
-    with open(output_path, "wb") as f:
-        f.write(compressed_data)
-    print(f"Compressed {len(data)} -> {len(compressed_data)} bytes")
+    index, total_in = [], 0
+    with open(filepath, "rb") as src, open(output_path, "wb") as dst:
+        dst.write(BLOCK_HEADER.pack(BLOCK_MAGIC, BLOCK_VERSION, block_size))
+        for raw_size, blob in compress_blocks(iter_blocks(src, block_size)):
+            index.append(BLOCK_ENTRY.pack(dst.tell(), raw_size, len(blob)))
+            dst.write(blob)
+            total_in += raw_size
+        index_offset = dst.tell()
+        dst.write(b"".join(index))
+        dst.write(BLOCK_FOOTER.pack(index_offset, len(index), BLOCK_MAGIC))
+        total_out = dst.tell()
+    print(f"Compressed {total_in} -> {total_out} bytes")
     return output_path
 
-def decompress_file(filepath, output_path=None):
-    with open(filepath, "rb") as f:
-        blob = f.read()
-    data = decompress(blob)
+def decompress_file(filepath, output_path=None, block=None):
+    # With block set, only that (0-based) block is decoded. Single-blob files
+    # from older versions are read whole.
     output_path = output_path or filepath + ".orig"
-    with open(output_path, "wb") as f:
-        f.write(data)
+    with open(filepath, "rb") as src, open(output_path, "wb") as dst:
+        if is_block_file(src):
+            if block is None:
+                for data in iter_decompressed_blocks(src):
+                    dst.write(data)
+            else:
+                dst.write(decompress_block(src, read_block_index(src)[block]))
+        else:
+            dst.write(decompress(src.read()))
     print(f"Decompressed to {output_path}")
     return output_path
 
+# ---------- Codec registry ----------
+# Codecs are identified on disk by a one-byte id, so ids must never be reused.
+CODECS = {}
+
+def register_codec(codec_id: int, name: str, compress_fn, decompress_fn):
+    # compress_fn may be None for formats that are only kept around for reading.
+    if codec_id in CODECS or get_codec_id(name, None) is not None:
+        raise ValueError(f"Codec '{name}' ({codec_id}) is already registered.")
+    CODECS[codec_id] = (name, compress_fn, decompress_fn)
+
+def get_codec_id(name: str, default=KeyError) -> int:
+    for codec_id, (codec_name, _, _) in CODECS.items():
+        if codec_name == name:
+            return codec_id
+    if default is KeyError:
+        raise KeyError(f"Unknown codec '{name}'. Available: {', '.join(codec_names())}")
+    return default
+
+def get_codec(codec_id: int) -> tuple:
+    """
+    Returns (name, compress, decompress) for a codec id.
+    """
+    if codec_id not in CODECS:
+        raise ValueError(f"Unknown codec id {codec_id}.")
+    return CODECS[codec_id]
+
+def codec_names() -> list:
+    return [name for name, compress_fn, _ in CODECS.values() if compress_fn is not None]
+
+register_codec(0, "none", bytes, bytes)
+for level in range(1, 10):
+    register_codec(level, f"zlib-{level}", lambda data, level=level: zlib.compress(data, level), zlib.decompress)
+register_codec(10, "lzma", lzma.compress, lzma.decompress)
+register_codec(11, "bz2", bz2.compress, bz2.decompress)
+register_codec(12, "huffman", lambda data: bytes(compress(bytes(data))), lambda data: decompress(bytes(data)))
+register_codec(13, "rle-triples", None, lambda data: _unrle_triples(bytes(data)))
+register_codec(14, "rle", lambda data: bytes(rle(data)), unrle)
+
+DEFAULT_CODEC = "zlib-6"
+AUTO_CANDIDATES = ("zlib-1", "zlib-6", "zlib-9", "bz2", "lzma", "rle", "huffman")
+
+def pick_codec(sample, candidates=AUTO_CANDIDATES, min_saving: float = 0.02) -> str:
+    """
+    Test-compresses sample with each candidate and returns the name of the one
+    with the best ratio per CPU second (fraction of bytes saved / seconds spent),
+    or "none" if no candidate saves at least min_saving of the sample.
+    """
+    if not sample:
+        return "none"
+    best, best_score = "none", 0.0
+    for name in candidates:
+        compress_fn = get_codec(get_codec_id(name))[1]
+        # CPU time of this thread only: pick_codec runs on worker threads, and
+        # wall-clock time would charge a codec for the other workers' chunks.
+        start = time.thread_time()
+        size = len(compress_fn(sample))
+        elapsed = max(time.thread_time() - start, 1e-6)
+        saving = 1 - size / len(sample)
+        if saving >= min_saving and saving / elapsed > best_score:
+            best, best_score = name, saving / elapsed
+    return best
+
 if __name__ == "__main__":
     inp = "/path/to/file.txt"
     cmp = compress_file(inp)      
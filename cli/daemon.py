@@ -0,0 +1,189 @@
+import base64
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from cli.client import Client, read_message, send_message, default_socket_path, MAX_MESSAGE
+from cli.encryptor import encrypt_file, decrypt_file, decrypt_range, ENTROPY_THRESHOLD, DEFAULT_CODEC
+from cli.key_vault import VaultSession
+from cli.stats import stopwatch
+
+# ---------- Encryption daemon ----------
+# A long-running local process that unlocks the vault once and serves
+# encrypt/decrypt/get-key requests over a Unix domain socket, using the framed
+# JSON protocol in cli.client. Every connection is read on its own thread and
+# its requests run on a shared worker pool, so a client may pipeline requests.
+# The socket is created owner-only and, on Linux, peers running as another
+# user are refused, since get-key hands out keys.
+PEERCRED = struct.Struct("3i")  # pid, uid, gid
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, session: VaultSession, workers: int = 4):
+        self.session = session
+        self.workers = max(1, workers)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.started = time.monotonic()
+        self.requests = 0
+        self._count_lock = threading.Lock()
+        _clear_stale_socket(socket_path)
+        super().__init__(socket_path, _Handler)
+
+    def server_bind(self):
+        old = os.umask(0o177)  # srw------- from the start, no window before a chmod
+        try:
+            super().server_bind()
+        finally:
+            os.umask(old)
+
+    def verify_request(self, request, client_address) -> bool:
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True  # socket permissions still apply
+        _, uid, _ = PEERCRED.unpack(request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size))
+        return uid == os.getuid()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+        self.session.lock()
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+
+    def dispatch(self, request: dict):
+        """
+        Runs one request and returns its result; exceptions become error responses.
+        """
+        sw = stopwatch()
+        op = request.get("op")
+        handler = _OPS.get(op)
+        if handler is None:
+            raise ValueError(f"Unknown operation '{op}'.")
+        result = handler(self, request)
+        with self._count_lock:
+            self.requests += 1
+        if sw: sw.lap(f"daemon.{op}")
+        return result
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        write_lock = threading.Lock()
+        pending, pending_lock = set(), threading.Lock()  # callbacks discard from worker threads
+
+        def reply(request, future):
+            try:
+                response = {"id": request.get("id"), "ok": True, "result": future.result()}
+            except Exception as e:
+                message = e.args[0] if isinstance(e, KeyError) and e.args else str(e) or type(e).__name__
+                response = {"id": request.get("id"), "ok": False, "error": message, "type": type(e).__name__}
+            try:
+                with write_lock:
+                    send_message(self.request, response)
+            except OSError:
+                pass  # the client went away; nothing to tell it
+            if request.get("op") == "shutdown":
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            with pending_lock:
+                pending.discard(future)
+
+        try:
+            while True:
+                request = read_message(self.request)
+                if not isinstance(request, dict):
+                    break
+                future = self.server.pool.submit(self.server.dispatch, request)
+                with pending_lock:
+                    pending.add(future)
+                future.add_done_callback(lambda f, request=request: reply(request, f))
+        except (OSError, ValueError):
+            pass  # broken connection or malformed message: drop the connection
+        finally:
+            with pending_lock:
+                running = list(pending)
+            wait(running)
+
+def _workers(daemon: Daemon, request: dict) -> int:
+    """
+    The request's worker count, capped at the daemon's pool size so one client
+    cannot start more threads than the daemon was given.
+    """
+    return min(max(1, int(request.get("workers", 1))), daemon.workers)
+
+def _encrypt(daemon: Daemon, request: dict) -> str:
+    key = daemon.session.get_key(request["alias"])
+    return encrypt_file(request["path"], key, request.get("out"), request.get("delete", False),
+                        workers=_workers(daemon, request),
+                        entropy_threshold=request.get("entropy_threshold", ENTROPY_THRESHOLD),
+                        codec=request.get("codec", DEFAULT_CODEC))
+
+def _decrypt(daemon: Daemon, request: dict) -> str:
+    key = daemon.session.get_key(request["alias"])
+    return decrypt_file(request["path"], key, request.get("out"), request.get("delete", False),
+                        workers=_workers(daemon, request))
+
+def _decrypt_range(daemon: Daemon, request: dict) -> str:
+    if request["length"] > MAX_MESSAGE * 3 // 4 - 1024:
+        raise ValueError("Range too large to send in one message; decrypt it in smaller pieces.")
+    key = daemon.session.get_key(request["alias"])
+    data = decrypt_range(request["path"], key, request["offset"], request["length"], _workers(daemon, request))
+    return base64.b64encode(data).decode()
+
+def _ping(daemon: Daemon, request: dict) -> dict:
+    return {"pid": os.getpid(), "uptime": time.monotonic() - daemon.started, "requests": daemon.requests}
+
+_OPS = {
+    "ping": _ping,
+    "encrypt": _encrypt,
+    "decrypt": _decrypt,
+    "decrypt-range": _decrypt_range,
+    "get-key": lambda daemon, request: daemon.session.get_key(request["alias"]).decode(),
+    "aliases": lambda daemon, request: daemon.session.list_aliases(),
+    "shutdown": lambda daemon, request: None,
+}
+
+def _clear_stale_socket(socket_path: str):
+    """
+    Removes a socket file left by a daemon that is gone; refuses if one still answers.
+    """
+    if not os.path.exists(socket_path):
+        return
+    try:
+        with Client(socket_path, timeout=2) as client:
+            client.ping()
+    except (OSError, ValueError):
+        os.remove(socket_path)
+        return
+    raise RuntimeError(f"A daemon is already listening on {socket_path}.")
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(master_password: str, socket_path: str = None, workers: int = 4, ttl: float = None,
+          vault_path: str = None, ready=None):
+    """
+    Unlocks the vault and serves requests on socket_path until a shutdown request,
+    Ctrl+C, or SIGTERM. With ttl the vault locks again after ttl seconds and
+    requests needing keys fail from then on. ready(daemon) is called once the
+    socket is listening.
+    """
+    socket_path = socket_path or default_socket_path()
+    session = VaultSession(master_password, ttl, vault_path)
+    daemon = Daemon(socket_path, session, workers)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _terminate)
+    if ready:
+        ready(daemon)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping daemon...", file=sys.stderr)
+    finally:
+        daemon.server_close()
+    return daemon.requests
@@ -1,33 +1,454 @@
 import os
 import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hmac
 import base64
-from cryptography.fernet import Fernet
+import io
+import struct
+import tempfile
+from contextlib import contextmanager
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 import zlib
+from cli.compresser import shannon_entropy, get_codec, get_codec_id, pick_codec, DEFAULT_CODEC, ENTROPY_THRESHOLD
+from cli.kdf import KDF_BLOCK, derive_key, pack_kdf, unpack_kdf
+from cli.stats import stopwatch
+
+# ---------- Chunked container format ----------
+# header: magic | version | codec id | chunk size | file nonce | KDF block
+# frame:  flags | ciphertext length | iv | ciphertext | HMAC-SHA256 tag
+# Every tag covers the header, the chunk index and the frame, so chunks cannot
+# be reordered, spliced between files or dropped without detection. The last
+# frame carries FLAG_FINAL; a file that ends before it is truncated.
+# Password-encrypted files record their salt and KDF parameters in the KDF
+# block (see cli.kdf); files encrypted with a vault key leave it empty.
+# From version 4 a seek table follows the final frame: the file offset of every
+# frame, then a footer with the chunk count, the plaintext size, an HMAC-SHA256
+# tag over the header and table, and SEEK_MAGIC. decrypt_range finds it from
+# the end of the file and reads only the frames it needs.
+# From version 5 every table entry also holds the frame's tag. update_file
+# keeps the header (and so the nonce) of the file it updates, so frame tags
+# alone would still accept a frame from an earlier version of the same file at
+# the same index; the authenticated table pins each index to one frame.
+MAGIC = b"SSENC"
+FORMAT_VERSION = 5
+SEEK_VERSION = 4  # first version with a seek table
+TAGGED_SEEK_VERSION = 5  # first version whose seek table lists every frame's tag
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024  # readers refuse headers above this before sizing any buffer
+HEADER = struct.Struct(">5sBBI16s" + KDF_BLOCK.format[1:])
+HEADER_V2 = struct.Struct(">5sBBI16s")  # version 2 had no KDF block
+HEADER_V1 = struct.Struct(">5sBI16s")  # version 1 had no codec id and always used zlib
+FRAME = struct.Struct(">BI16s")
+TAG_SIZE = 32
+BLOCK_SIZE = 16
+FLAG_FINAL = 0x01
+FLAG_RAW = 0x02  # payload stored without compression
+SEEK_MAGIC = b"SSIDX"
+SEEK_ENTRY = struct.Struct(">Q32s")  # file offset and tag of a frame
+SEEK_ENTRY_V4 = struct.Struct(">Q")  # version 4 tables hold offsets only
+SEEK_FOOTER = struct.Struct(">QQ32s5s")  # chunk count, plaintext size, tag, magic
+
+# Chunks whose sampled entropy reaches ENTROPY_THRESHOLD are stored raw.
+ENTROPY_SAMPLE = 4096
+CODEC_SAMPLE = 64 * 1024
+
+class Cancelled(Exception):
+    """
+    Raised by encrypt_file/decrypt_file when their cancel token is set.
+    The partial output file has already been removed.
+    """
 
 def generate_key(password: str) -> bytes:
     """
     Generates a Fernet key from a password using SHA-256 hashing.
+    Unsalted and fast, so only kept to open files and vaults written before
+    cli.kdf; new data uses derive_key.
     """
     sha = hashlib.sha256(password.encode("utf-8")).digest()
     return base64.urlsafe_b64encode(sha)
 
-def encrypt_file(filepath: str, key: bytes, output_path: str = None, delete_original: bool = False) -> str:
+def read_kdf(filepath: str) -> tuple:
+    """
+    Returns the (salt, params) a password-encrypted file was written with, or
+    (None, None) if its key was not derived by cli.kdf (vault keys and older files).
+    """
+    with open(filepath, "rb") as src:
+        if src.read(len(MAGIC)) != MAGIC:
+            return None, None
+        src.seek(0)
+        header = _read_header(src)[0]
+    if len(header) != HEADER.size:
+        return None, None
+    return unpack_kdf(header[HEADER_V2.size:])
+
+def password_key(filepath: str, password: str) -> bytes:
+    """
+    Derives the key for a file encrypted with a password, using the salt and
+    parameters in its header, or the legacy SHA-256 key for older files.
+    """
+    salt, params = read_kdf(filepath)
+    if salt is None:
+        return generate_key(password)
+    return derive_key(password, salt, params, cache=True)
+
+def _split_key(key: bytes) -> tuple:
+    """
+    Splits a Fernet key into its (signing key, encryption key) halves.
+    """
+    raw = base64.urlsafe_b64decode(key)
+    if len(raw) != 32:
+        raise ValueError("Fernet key must be 32 url-safe base64-encoded bytes.")
+    return raw[:16], raw[16:]
+
+def _chunk_iv(signing_key: bytes, nonce: bytes, index: int) -> bytes:
+    return hmac.new(signing_key, b"iv" + nonce + struct.pack(">Q", index), hashlib.sha256).digest()[:16]
+
+def _chunk_tag(signing_key: bytes, header: bytes, index: int, frame: bytes, ciphertext: bytes) -> bytes:
+    mac = hmac.new(signing_key, header, hashlib.sha256)
+    mac.update(struct.pack(">Q", index))
+    mac.update(frame)
+    mac.update(ciphertext)
+    return mac.digest()
+
+def _seek_tag(signing_key: bytes, header: bytes, count: int, size: int, table: bytes) -> bytes:
+    mac = hmac.new(signing_key, SEEK_MAGIC + header, hashlib.sha256)
+    mac.update(struct.pack(">QQ", count, size))
+    mac.update(table)
+    return mac.digest()
+
+def _seek_table(keys: tuple, header: bytes, offsets: list, tags: list, size: int) -> bytes:
+    """
+    Packs the seek table and footer for frames at offsets, with tags, holding
+    size plaintext bytes.
+    """
+    table = b"".join(SEEK_ENTRY.pack(offset, tag) for offset, tag in zip(offsets, tags))
+    tag = _seek_tag(keys[0], header, len(offsets), size, table)
+    return table + SEEK_FOOTER.pack(len(offsets), size, tag, SEEK_MAGIC)
+
+def _seek_entry(header: bytes) -> struct.Struct:
+    return SEEK_ENTRY if header[len(MAGIC)] >= TAGGED_SEEK_VERSION else SEEK_ENTRY_V4
+
+def _unpack_seek_table(header: bytes, table: bytes) -> tuple:
+    """
+    Returns (frame offsets, frame tags) from a verified table; tags is None
+    for version 4 tables, which do not record them.
+    """
+    entries = list(_seek_entry(header).iter_unpack(table))
+    if header[len(MAGIC)] < TAGGED_SEEK_VERSION:
+        return [offset for offset, in entries], None
+    return [offset for offset, _ in entries], [tag for _, tag in entries]
+
+def _max_frame_length(chunk_size: int) -> int:
+    # Compressed chunks can expand (Huffman codes run up to 15 bits per byte).
+    # Lengths are only authenticated with the frame, so larger ones are refused
+    # before anything is allocated for them.
+    return 2 * chunk_size + 64 * 1024
+
+def _looks_incompressible(data, threshold: float) -> bool:
+    """
+    Estimates the entropy of data from four evenly spaced samples.
+    """
+    if threshold is None or len(data) < 4 * ENTROPY_SAMPLE:
+        return False
+    step = len(data) // 4
+    sample = b"".join(bytes(data[i:i + ENTROPY_SAMPLE]) for i in range(0, 4 * step, step))
+    return shannon_entropy(sample) >= threshold
+
+def _seal_chunk(keys: tuple, header: bytes, nonce: bytes, index: int, data, flags: int,
+                compress=zlib.compress, entropy_threshold: float = ENTROPY_THRESHOLD, iv: bytes = None) -> tuple:
+    """
+    Compresses, encrypts and authenticates one chunk, returning its frame as
+    (frame header, ciphertext, tag) so it can be written without joining.
+    data may be any buffer, e.g. a memoryview slice of a mapped file.
+    Chunks that look incompressible are stored raw and flagged FLAG_RAW.
+    iv replaces the IV derived from nonce and index; readers take it from the frame.
+    """
+    sw = stopwatch()
+    signing_key, encryption_key = keys
+    iv = iv or _chunk_iv(signing_key, nonce, index)
+    incompressible = _looks_incompressible(data, entropy_threshold)
+    if sw: sw.lap("encrypt.entropy", len(data))
+    if incompressible:
+        flags |= FLAG_RAW
+        compressed = memoryview(data)
+    else:
+        compressed = memoryview(compress(data))
+        if sw: sw.lap("encrypt.compress", len(data))
+    # PKCS7: encrypt the whole blocks straight out of the compressed buffer and
+    # only build the short padded tail separately.
+    whole = len(compressed) - len(compressed) % BLOCK_SIZE
+    pad = BLOCK_SIZE - len(compressed) % BLOCK_SIZE
+    tail = bytes(compressed[whole:]) + bytes([pad]) * pad
+    ciphertext = bytearray(whole + 2 * BLOCK_SIZE - 1)
+    out = memoryview(ciphertext)
+    encryptor = Cipher(algorithms.AES(encryption_key), modes.CBC(iv), backend=default_backend()).encryptor()
+    n = encryptor.update_into(compressed[:whole], out) if whole else 0
+    n += encryptor.update_into(tail, out[n:])
+    encryptor.finalize()
+    ciphertext = out[:n]
+    if sw: sw.lap("encrypt.cipher", n)
+    frame = FRAME.pack(flags, n, iv)
+    tag = _chunk_tag(signing_key, header, index, frame, ciphertext)
+    if sw: sw.lap("encrypt.mac", n)
+    return frame, ciphertext, tag
+
+def _open_chunk(keys: tuple, header: bytes, index: int, frame: bytes, ciphertext, tag: bytes,
+                decompress=zlib.decompress) -> bytes:
+    """
+    Verifies and decrypts one chunk frame, returning the plaintext chunk.
+    """
+    sw = stopwatch()
+    signing_key, encryption_key = keys
+    if not hmac.compare_digest(tag, _chunk_tag(signing_key, header, index, frame, ciphertext)):
+        raise InvalidToken(f"Chunk {index} failed authentication.")
+    if sw: sw.lap("decrypt.mac", len(ciphertext))
+    flags, _, iv = FRAME.unpack(frame)
+    if not ciphertext or len(ciphertext) % BLOCK_SIZE:
+        raise InvalidToken(f"Chunk {index} has an invalid length.")
+    out = memoryview(bytearray(len(ciphertext) + BLOCK_SIZE - 1))
+    decryptor = Cipher(algorithms.AES(encryption_key), modes.CBC(iv), backend=default_backend()).decryptor()
+    n = decryptor.update_into(ciphertext, out)
+    decryptor.finalize()
+    pad = out[n - 1]
+    if not 1 <= pad <= BLOCK_SIZE or out[n - pad:n] != bytes([pad]) * pad:
+        raise InvalidToken(f"Chunk {index} has invalid padding.")
+    if sw: sw.lap("decrypt.cipher", n)
+    if flags & FLAG_RAW:
+        return bytes(out[:n - pad])
+    data = decompress(out[:n - pad])
+    if sw: sw.lap("decrypt.decompress", len(data))
+    return data
+
+def _read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise InvalidToken("Encrypted file is truncated.")
+    return data
+
+def _read_into(f, size: int) -> memoryview:
+    """
+    Reads exactly size bytes into a freshly allocated buffer.
+    """
+    buf = memoryview(bytearray(size))
+    got = 0
+    while got < size:
+        n = f.readinto(buf[got:])
+        if not n:
+            raise InvalidToken("Encrypted file is truncated.")
+        got += n
+    return buf
+
+def _write_all(dst, buf):
+    # Unbuffered files write what the OS accepts, which may be less than asked.
+    buf = memoryview(buf)
+    while buf:
+        buf = buf[dst.write(buf):]
+
+def _write_parts(dst, parts):
+    """
+    Writes a sequence of buffers to an unbuffered file with writev() where the
+    OS provides it, so frames are never joined into a temporary copy.
+    """
+    if not hasattr(os, "writev"):
+        for part in parts:
+            _write_all(dst, part)
+        return
+    written = os.writev(dst.fileno(), parts)
+    for part in parts:
+        if written >= len(part):
+            written -= len(part)
+            continue
+        # Short write: finish the remainder part by part.
+        _write_all(dst, memoryview(part)[written:])
+        written = 0
+
+def _read_chunk(f, chunk_size: int) -> memoryview:
+    """
+    Reads up to chunk_size bytes straight into a new buffer with readinto(),
+    so the chunk is not copied again before zlib sees it.
+    """
+    buf = memoryview(bytearray(chunk_size))
+    got = 0
+    while got < chunk_size:
+        n = f.readinto(buf[got:])
+        if not n:
+            break
+        got += n
+    return buf[:got]
+
+def _read_chunks(f, chunk_size: int):
+    """
+    Yields (index, data, flags) for each chunk of f, reading one chunk ahead so
+    the last chunk can be flagged. The file is read rather than mapped: a
+    mapped file that shrinks under us (log rotation, an exporter rewriting it)
+    kills the process with SIGBUS, which the daemon, watch and batch callers
+    could not survive; a read just ends early.
+    """
+    sw = stopwatch()
+    index, current = 0, _read_chunk(f, chunk_size)
+    if sw: sw.lap("encrypt.read", len(current))
+    while True:
+        if sw: sw.start()
+        following = _read_chunk(f, chunk_size) if len(current) == chunk_size else b""
+        if sw: sw.lap("encrypt.read", len(following))
+        yield index, current, 0 if following else FLAG_FINAL
+        if not following:
+            return
+        index, current = index + 1, following
+
+def _codec_sample(f, slices: int = 4) -> bytes:
+    """
+    Reads a few evenly spaced CODEC_SAMPLE slices of f for codec selection.
+    """
+    size = os.fstat(f.fileno()).st_size
+    step = max(size // slices, CODEC_SAMPLE)
+    sample = bytearray()
+    for offset in range(0, size, step):
+        f.seek(offset)
+        sample += f.read(CODEC_SAMPLE)
+    f.seek(0)
+    return bytes(sample)
+
+def _check_chunk_size(chunk_size: int):
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE} bytes.")
+
+def _header_chunk_size(chunk_size: int) -> int:
+    # The header is only authenticated along with the first frame, so a forged
+    # chunk size must not be trusted to size buffers before then.
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Unsupported chunk size {chunk_size} in header.")
+    return chunk_size
+
+def _read_header(src) -> tuple:
+    """
+    Reads the container header, returning (raw header, codec id, chunk size, nonce).
+    """
+    prefix = _read_exact(src, len(MAGIC) + 1)
+    version = prefix[-1]
+    if version == 1:
+        header = prefix + _read_exact(src, HEADER_V1.size - len(prefix))
+        _, _, chunk_size, nonce = HEADER_V1.unpack(header)
+        return header, get_codec_id(DEFAULT_CODEC), _header_chunk_size(chunk_size), nonce
+    if 2 <= version <= FORMAT_VERSION:
+        header = prefix + _read_exact(src, (HEADER_V2 if version == 2 else HEADER).size - len(prefix))
+        _, _, codec_id, chunk_size, nonce = HEADER_V2.unpack_from(header)
+        return header, codec_id, _header_chunk_size(chunk_size), nonce
+    raise ValueError(f"Unsupported encrypted file version {version}.")
+
+def _report(progress, cancel, done: int, total: int):
+    """
+    Per-chunk hook: raises Cancelled once cancel (anything with is_set(), such as
+    a threading.Event) is set, then reports progress(done, total) in bytes.
+    """
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("Operation cancelled.")
+    if progress is not None:
+        progress(done, total)
+
+def _ordered_map(func, items, workers: int):
+    """
+    Like map(), but runs func on a pool of worker threads when workers > 1.
+    Results come back in input order and at most 2 * workers items are in
+    flight, so memory stays bounded however long items is.
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _file_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+_UMASK = _file_umask()
+
+@contextmanager
+def _atomic_output(output_path: str, buffering: int = -1):
+    """
+    Yields a temporary file in output_path's directory that replaces
+    output_path only once the block completes. On any error, including
+    failed authentication or Cancelled, the temporary file is removed and
+    whatever was at output_path is left as it was.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), prefix=".", suffix=".tmp")
+    try:
+        with open(fd, "wb", buffering=buffering) as f:
+            yield f
+        os.chmod(tmp, 0o666 & ~_UMASK)  # mkstemp creates 0600; match a plain open()
+        os.replace(tmp, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+def encrypt_file(filepath: str, key: bytes, output_path: str = None, delete_original: bool = False,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1,
+                 entropy_threshold: float = ENTROPY_THRESHOLD, codec: str = DEFAULT_CODEC,
+                 kdf: tuple = None, progress=None, cancel=None) -> str:
     """
     Encrypts a file using a Fernet key (already base64 encoded).
+    The file is streamed in chunk_size pieces, so memory use does not grow with the file.
+    With workers > 1 chunks are sealed on a thread pool (zlib and OpenSSL release the GIL);
+    chunk IVs depend only on the file nonce and chunk index, so the output is identical
+    to the serial path.
+    Chunks whose sampled entropy is at least entropy_threshold bits/byte skip
+    compression; pass None to always compress.
+    codec names a codec from cli.compresser (e.g. "zlib-1", "lzma", "none"), or "auto"
+    to test a sample of the file and pick the best ratio per CPU second. The codec id
+    is stored in the header, so decrypt_file needs no options.
+    If key was derived from a password, pass kdf=(salt, params) so the header
+    records how to derive it again (see password_key).
+    progress(done, total) is called from the calling thread after every chunk with
+    plaintext bytes processed; setting cancel stops at the next chunk and raises
+    Cancelled.
     """
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"File '{filepath}' not found.")
+    _check_chunk_size(chunk_size)
 
-    fernet = Fernet(key)
-    with open(filepath, "rb") as f:
-        data = f.read()
-        data = zlib.compress(data)
-
-    encrypted = fernet.encrypt(data)
+    keys = _split_key(key)
+    nonce = os.urandom(16)
+    codec_id = None if codec == "auto" else get_codec_id(codec)
     output_path = output_path or (filepath + ".enc")
 
-    with open(output_path, "wb") as f:
-        f.write(encrypted)
+    total = os.path.getsize(filepath)
+    _report(progress, cancel, 0, total)
+
+    with open(filepath, "rb") as src, _atomic_output(output_path, buffering=0) as dst:
+        if codec_id is None:
+            sw = stopwatch()
+            codec_id = get_codec_id(pick_codec(_codec_sample(src)))
+            if sw: sw.lap("encrypt.codec-select")
+        compress = get_codec(codec_id)[1]
+        header = HEADER_V2.pack(MAGIC, FORMAT_VERSION, codec_id, chunk_size, nonce) + pack_kdf(*(kdf or ()))
+        _write_parts(dst, [header])
+        seal = lambda item: (_seal_chunk(keys, header, nonce, *item, compress, entropy_threshold), len(item[1]))
+        offsets, tags, position, size = [], [], len(header), 0
+        sw = stopwatch()
+        for index, (sealed, n) in enumerate(_ordered_map(seal, _read_chunks(src, chunk_size), workers)):
+            if sw: sw.start()
+            _write_parts(dst, sealed)
+            if sw: sw.lap("encrypt.write", sum(len(part) for part in sealed))
+            offsets.append(position)
+            tags.append(sealed[2])
+            position += sum(len(part) for part in sealed)
+            size += n
+            _report(progress, cancel, min(total, (index + 1) * chunk_size), total)
+        _write_parts(dst, [_seek_table(keys, header, offsets, tags, size)])
 
     if delete_original:
         try:
@@ -37,25 +458,208 @@ def encrypt_file(filepath: str, key: bytes, output_path: str = None, delete_orig
 
     return output_path
 
-def decrypt_file(filepath: str, key: bytes, output_path: str = None, delete_original: bool = False) -> str:
+def _read_frames(src, seek_table: bool = False, max_length: int = None):
     """
-    Decrypts a file using a Fernet key.
+    Yields (index, frame, ciphertext, tag) for every chunk frame after the header,
+    checking that the stream ends exactly at the final frame, or stopping there
+    when a seek table follows.
+    """
+    sw = stopwatch()
+    index = 0
+    while True:
+        if sw: sw.start()
+        frame = src.read(FRAME.size)
+        if not frame:
+            raise InvalidToken("Encrypted file is truncated (no final chunk).")
+        if len(frame) != FRAME.size:
+            raise InvalidToken("Encrypted file is truncated.")
+        flags, length, _ = FRAME.unpack(frame)
+        if max_length is not None and length > max_length:
+            raise InvalidToken(f"Chunk {index} is larger than the file's chunk size allows.")
+        ciphertext = _read_into(src, length)
+        tag = _read_exact(src, TAG_SIZE)
+        if sw: sw.lap("decrypt.read", FRAME.size + length + TAG_SIZE)
+        yield index, frame, ciphertext, tag
+        index += 1
+        if flags & FLAG_FINAL:
+            break
+    if not seek_table and src.read(1):
+        raise InvalidToken("Unexpected data after the final chunk.")
+
+def _read_seek_table(src, keys: tuple, header: bytes) -> tuple:
+    """
+    Reads and verifies the seek table at the end of a version 4+ file, returning
+    (frame offsets, frame tags or None, plaintext size, offset of the table).
+    """
+    end = os.fstat(src.fileno()).st_size
+    if end < len(header) + SEEK_FOOTER.size:
+        raise InvalidToken("Encrypted file is truncated (no seek table).")
+    src.seek(end - SEEK_FOOTER.size)
+    count, size, tag, magic = SEEK_FOOTER.unpack(_read_exact(src, SEEK_FOOTER.size))
+    entry = _seek_entry(header)
+    start = end - SEEK_FOOTER.size - count * entry.size
+    if magic != SEEK_MAGIC or not count or start < len(header):
+        raise InvalidToken("Encrypted file is truncated (no seek table).")
+    src.seek(start)
+    table = _read_exact(src, count * entry.size)
+    if not hmac.compare_digest(tag, _seek_tag(keys[0], header, count, size, table)):
+        raise InvalidToken("Seek table failed authentication.")
+    return _unpack_seek_table(header, table) + (size, start)
+
+def _scan_frames(src) -> list:
+    """
+    Finds the frame offsets of a file without a seek table by hopping from frame
+    header to frame header, without reading the ciphertext.
+    """
+    end = os.fstat(src.fileno()).st_size
+    offsets = []
+    while True:
+        offsets.append(src.tell())
+        frame = src.read(FRAME.size)
+        if len(frame) != FRAME.size:
+            raise InvalidToken("Encrypted file is truncated.")
+        flags, length, _ = FRAME.unpack(frame)
+        if src.seek(length + TAG_SIZE, os.SEEK_CUR) > end:
+            raise InvalidToken("Encrypted file is truncated.")
+        if flags & FLAG_FINAL:
+            return offsets
+
+def _read_frame_at(src, offset: int, index: int, max_length: int) -> tuple:
+    src.seek(offset)
+    frame = _read_exact(src, FRAME.size)
+    length = FRAME.unpack(frame)[1]
+    if length > max_length:
+        raise InvalidToken(f"Chunk {index} is larger than the file's chunk size allows.")
+    return index, frame, _read_into(src, length), _read_exact(src, TAG_SIZE)
+
+def _decrypt_chunked(src, dst, key: bytes, workers: int = 1, progress=None, cancel=None):
+    total = os.fstat(src.fileno()).st_size
+    header, codec_id, chunk_size, _ = _read_header(src)
+    seek_table = header[len(MAGIC)] >= SEEK_VERSION
+    decompress = get_codec(codec_id)[2]
+    keys = _split_key(key)
+    open_chunk = lambda item: _open_chunk(keys, header, *item, decompress)
+    read_tags, written = [], 0
+
+    def frames():
+        for item in _read_frames(src, seek_table, _max_frame_length(chunk_size)):
+            read_tags.append(item[3])
+            yield item
+
+    sw = stopwatch()
+    for data in _ordered_map(open_chunk, frames(), workers):
+        if sw: sw.start()
+        dst.write(data)
+        if sw: sw.lap("decrypt.write", len(data))
+        written += len(data)
+        _report(progress, cancel, src.tell(), total)
+    if seek_table:
+        frames_end = src.tell()
+        offsets, tags, size, start = _read_seek_table(src, keys, header)
+        if start != frames_end or len(offsets) != len(read_tags) or size != written:
+            raise InvalidToken("Seek table does not match the file.")
+        if tags is not None and tags != read_tags:
+            raise InvalidToken("A chunk does not match the seek table (spliced from another version?).")
+
+def _decrypt_legacy(src, dst, key: bytes):
     """
+    Decrypts a file written before the chunked format: one zlib-compressed Fernet token.
+    """
+    sw = stopwatch()
+    blob = src.read()
+    if sw: sw.lap("decrypt.read", len(blob))
+    compressed = Fernet(key).decrypt(blob)
+    if sw: sw.lap("decrypt.fernet", len(blob))
+    data = zlib.decompress(compressed)
+    if sw: sw.lap("decrypt.decompress", len(data))
+    dst.write(data)
+    if sw: sw.lap("decrypt.write", len(data))
+
+def decrypt_range(filepath: str, key: bytes, offset: int, length: int, workers: int = 1) -> bytes:
+    """
+    Returns length bytes of plaintext starting at offset (fewer at the end of
+    the file), decrypting only the chunks that cover them, so the cost depends
+    on the range and not on the file size. Version 4 files locate their chunks
+    through the authenticated seek table; older chunked files by skipping over
+    frame headers; legacy single-token files have to be decrypted whole.
+    Every chunk returned is authenticated as in decrypt_file.
+    """
+    if offset < 0 or length < 0:
+        raise ValueError("offset and length must not be negative.")
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"Encrypted file '{filepath}' not found.")
 
-    fernet = Fernet(key)
-    with open(filepath, "rb") as f:
-        encrypted = f.read()
+    with open(filepath, "rb") as src:
+        if src.read(len(MAGIC)) != MAGIC:
+            src.seek(0)
+            out = io.BytesIO()
+            _decrypt_legacy(src, out, key)
+            return out.getbuffer()[offset:offset + length].tobytes()
+        src.seek(0)
+        header, codec_id, chunk_size, _ = _read_header(src)
+        keys = _split_key(key)
+        seek_table = header[len(MAGIC)] >= SEEK_VERSION
+        tags = None
+        if seek_table:
+            offsets, tags, size, _ = _read_seek_table(src, keys, header)
+        else:
+            offsets = _scan_frames(src)
+            size = len(offsets) * chunk_size  # upper bound: the last chunk may be short
+        end = min(offset + length, size)
+        if offset >= end:
+            return b""
+        first, last = offset // chunk_size, (end - 1) // chunk_size
+        if last >= len(offsets):
+            raise InvalidToken("Seek table does not match the file.")
+        decompress = get_codec(codec_id)[2]
+        max_length = _max_frame_length(chunk_size)
+        items = (_read_frame_at(src, offsets[index], index, max_length) for index in range(first, last + 1))
+
+        def open_chunk(item):
+            if tags is not None and not hmac.compare_digest(item[3], tags[item[0]]):
+                raise InvalidToken(f"Chunk {item[0]} does not match the seek table.")
+            return _open_chunk(keys, header, *item, decompress)
+
+        chunks = list(_ordered_map(open_chunk, items, workers))
+
+    for index, data in enumerate(chunks, first):
+        if index < len(offsets) - 1:
+            expected = chunk_size
+        elif seek_table:
+            expected = size - index * chunk_size
+        else:
+            continue
+        if len(data) != expected:
+            raise InvalidToken(f"Chunk {index} has the wrong length.")
+    data = b"".join(chunks)
+    start = offset - first * chunk_size
+    return data[start:start + end - offset]
 
-    decrypted = fernet.decrypt(encrypted)
-    decrypted = zlib.decompress(decrypted)  
+def decrypt_file(filepath: str, key: bytes, output_path: str = None, delete_original: bool = False,
+                 workers: int = 1, progress=None, cancel=None) -> str:
+    """
+    Decrypts a file using a Fernet key.
+    Both the chunked format and legacy single-token files are accepted.
+    progress and cancel work as for encrypt_file, except that progress counts
+    encrypted bytes read.
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"Encrypted file '{filepath}' not found.")
 
     if not output_path:
         output_path = filepath[:-4] if filepath.endswith(".enc") else filepath + ".dec"
 
-    with open(output_path, "wb") as f:
-        f.write(decrypted)
+    with open(filepath, "rb") as src:
+        chunked = src.read(len(MAGIC)) == MAGIC
+        src.seek(0)
+        # Nothing reaches output_path until the last chunk has been verified, so a
+        # wrong key never clobbers an existing plaintext.
+        with _atomic_output(output_path) as dst:
+            if chunked:
+                _decrypt_chunked(src, dst, key, workers, progress, cancel)
+            else:
+                _report(progress, cancel, 0, os.path.getsize(filepath))
+                _decrypt_legacy(src, dst, key)
 
     if delete_original:
         try:
@@ -64,3 +668,251 @@ def decrypt_file(filepath: str, key: bytes, output_path: str = None, delete_orig
             raise Exception(f"Decryption succeeded but failed to delete encrypted file: {e}")
 
     return output_path
+
+# ---------- Incremental update ----------
+# update_file keeps a chunk index next to its output (output + INDEX_SUFFIX):
+#   magic | version | frame sealed like a chunk, holding the plaintext size and
+#   a keyed digest of every plaintext chunk
+# The index's tag covers the output's header and seek footer, so it only counts
+# for the exact file it was written with; anything else means a full rewrite.
+# On update the plaintext is hashed and only chunks whose digest or final flag
+# changed are sealed again. They get a random IV rather than the derived one,
+# since their index was already used with other plaintext under the same
+# nonce. Unchanged frames are kept byte for byte: their tags cover the header,
+# index and frame, none of which change. The rewritten seek table lists the new
+# frames' tags, so the frames they replaced no longer decrypt in their place.
+# Outputs older than version 5 are rewritten in full.
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"SSUPD"
+INDEX_VERSION = 1
+DIGEST_SIZE = 16
+PATCH_LIMIT = 64  # changed chunks held in memory while deciding whether to patch in place
+
+def _digest_key(keys: tuple) -> bytes:
+    return hmac.new(keys[0], b"chunk-digest", hashlib.sha256).digest()
+
+def _chunk_digest(digest_key: bytes, data) -> bytes:
+    return hmac.new(digest_key, data, hashlib.sha256).digest()[:DIGEST_SIZE]
+
+def _index_binding(header: bytes, footer: bytes) -> bytes:
+    return INDEX_MAGIC + header + footer
+
+def _write_index(path: str, keys: tuple, header: bytes, footer: bytes, size: int, digests: list):
+    payload = struct.pack(">Q", size) + b"".join(digests)
+    # Digests do not compress: threshold 0 stores all but tiny indexes raw.
+    parts = _seal_chunk(keys, _index_binding(header, footer), os.urandom(16), 0, payload, FLAG_FINAL,
+                        entropy_threshold=0.0)
+    with _atomic_output(path) as f:
+        f.write(INDEX_MAGIC + bytes([INDEX_VERSION]) + b"".join(parts))
+
+def _read_index(path: str, keys: tuple, header: bytes, footer: bytes) -> list:
+    """
+    Returns the chunk digests recorded for the output with this header and seek
+    footer, or None if the index is missing, stale or not authentic.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    prefix = len(INDEX_MAGIC) + 1
+    if len(data) < prefix + FRAME.size + TAG_SIZE or data[:prefix] != INDEX_MAGIC + bytes([INDEX_VERSION]):
+        return None
+    frame, ciphertext, tag = data[prefix:prefix + FRAME.size], data[prefix + FRAME.size:-TAG_SIZE], data[-TAG_SIZE:]
+    try:
+        payload = _open_chunk(keys, _index_binding(header, footer), 0, frame, ciphertext, tag)
+    except (InvalidToken, zlib.error):
+        return None
+    return [payload[i:i + DIGEST_SIZE] for i in range(8, len(payload), DIGEST_SIZE)]
+
+def _load_previous(output_path: str, keys: tuple) -> dict:
+    """
+    Reads what update_file needs from an existing output and its index, or
+    returns None when the output has to be written from scratch.
+    """
+    try:
+        with open(output_path, "rb") as f:
+            header, codec_id, chunk_size, nonce = _read_header(f)
+            if header[len(MAGIC)] < TAGGED_SEEK_VERSION:
+                return None
+            offsets, tags, size, table = _read_seek_table(f, keys, header)
+            f.seek(-SEEK_FOOTER.size, os.SEEK_END)
+            footer = f.read(SEEK_FOOTER.size)
+    except (FileNotFoundError, InvalidToken, ValueError):
+        return None
+    digests = _read_index(output_path + INDEX_SUFFIX, keys, header, footer)
+    if digests is None or len(digests) != len(offsets):
+        return None
+    return {"header": header, "codec_id": codec_id, "chunk_size": chunk_size, "nonce": nonce,
+            "offsets": offsets + [table], "tags": tags, "digests": digests}
+
+def _copy_range(src, dst, offset: int, length: int):
+    """
+    Copies length bytes at offset in src to dst's position, inside the kernel
+    where os.copy_file_range is available (a reflink on btrfs and XFS).
+    """
+    while length:
+        n = 0
+        if hasattr(os, "copy_file_range"):
+            try:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), length, offset)
+            except OSError:
+                pass  # e.g. EXDEV on older kernels; fall back to copying through memory
+        if not n:
+            src.seek(offset)
+            n = dst.write(src.read(min(length, DEFAULT_CHUNK_SIZE)))
+        if not n:
+            raise InvalidToken("Encrypted file is truncated.")
+        offset += n
+        length -= n
+
+def update_file(filepath: str, key: bytes, output_path: str = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                workers: int = 1, entropy_threshold: float = ENTROPY_THRESHOLD, codec: str = DEFAULT_CODEC,
+                progress=None, cancel=None) -> dict:
+    """
+    Encrypts filepath like encrypt_file, but when output_path already holds an
+    earlier encryption of it (with an index from a previous update_file) only
+    the chunks that changed are compressed and encrypted again.
+    Changes confined to the end of the file (appends, a rewritten tail), or
+    that keep every frame's length, are patched in place once all new frames
+    have been sealed; otherwise the
+    output is rebuilt in a temporary file by copying unchanged frames, then
+    swapped in. chunk_size and codec only apply when the output is written
+    from scratch; an existing output keeps its own.
+    progress is reported during the hashing pass; cancel is honoured
+    throughout, and a cancelled update leaves the previous output intact.
+    Returns a summary: path, mode ("full", "unchanged", "patched" or
+    "rebuilt"), chunks, rewritten (chunks sealed), bytes (plaintext) and
+    written (bytes written to the output).
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"File '{filepath}' not found.")
+    _check_chunk_size(chunk_size)
+    keys = _split_key(key)
+    digest_key = _digest_key(keys)
+    output_path = output_path or (filepath + ".enc")
+    previous = _load_previous(output_path, keys)
+    total = os.path.getsize(filepath)
+    _report(progress, cancel, 0, total)
+
+    with open(filepath, "rb") as src:
+        if previous:
+            header, codec_id = previous["header"], previous["codec_id"]
+            chunk_size, nonce = previous["chunk_size"], previous["nonce"]
+        else:
+            nonce = os.urandom(16)
+            codec_id = get_codec_id(pick_codec(_codec_sample(src)) if codec == "auto" else codec)
+            header = HEADER_V2.pack(MAGIC, FORMAT_VERSION, codec_id, chunk_size, nonce) + pack_kdf()
+        compress = get_codec(codec_id)[1]
+
+        # Pass 1: hash every chunk; only digests are kept.
+        sw = stopwatch()
+        old = previous["digests"] if previous else []
+        digest = lambda item: (_chunk_digest(digest_key, item[1]), len(item[1]), item[2])
+        digests, changed, size = [], [], 0
+        for index, (chunk_digest, n, flags) in enumerate(_ordered_map(digest, _read_chunks(src, chunk_size), workers)):
+            was_final = index == len(old) - 1
+            if index >= len(old) or old[index] != chunk_digest or bool(flags & FLAG_FINAL) != was_final:
+                changed.append(index)
+            digests.append(chunk_digest)
+            size += n
+            _report(progress, cancel, min(total, (index + 1) * chunk_size), total)
+        if sw: sw.lap("update.hash", size)
+        count = len(digests)
+        summary = {"path": output_path, "chunks": count, "rewritten": len(changed), "bytes": size, "written": 0}
+        if previous and not changed and count == len(old):
+            summary["mode"] = "unchanged"
+            return summary
+
+        def seal(item):
+            index, data = item
+            if _chunk_digest(digest_key, data) != digests[index]:
+                raise ValueError(f"'{filepath}' changed while it was being updated.")
+            flags = FLAG_FINAL if index == count - 1 else 0
+            # Reusing the derived IV would pair it with two plaintexts.
+            iv = os.urandom(16) if previous else None
+            return _seal_chunk(keys, header, nonce, index, data, flags, compress, entropy_threshold, iv)
+
+        def reads(indexes):
+            # Reads stay on this thread; only sealing runs on the pool.
+            for index in indexes:
+                _report(None, cancel, index, count)
+                src.seek(index * chunk_size)
+                yield index, src.read(chunk_size)
+
+        # Pass 2: read the changed chunks again and seal them. Every frame is
+        # sealed, and its digest checked, before the output is touched, so a
+        # source that changed meanwhile, an I/O error or a cancel leaves the
+        # previous output as it was. Changes before the trailing run of changed
+        # chunks are held in memory and patched in place if each new frame is
+        # exactly as long as the old one (always true for full-size chunks
+        # stored raw); the trailing run is spooled to a temporary file and
+        # appended. Otherwise the output is rebuilt in a temporary file.
+        pending = set(changed)
+        tail = count
+        while tail and tail - 1 in pending:
+            tail -= 1
+        middle = [index for index in changed if index < tail]
+        ready = {}
+        if previous and len(middle) <= PATCH_LIMIT:
+            ready = dict(zip(middle, _ordered_map(seal, reads(middle), workers)))
+        old_offsets = previous["offsets"] if previous else []
+        old_tags = previous["tags"] if previous else []
+        frame_length = lambda parts: sum(len(part) for part in parts)
+        in_place = previous and len(ready) == len(middle) and all(
+            frame_length(parts) == old_offsets[index + 1] - old_offsets[index] for index, parts in ready.items())
+        if in_place:
+            summary["mode"] = "patched"
+            offsets, position = old_offsets[:tail], old_offsets[tail]
+            tags = old_tags[:tail]
+            for index, parts in ready.items():
+                tags[index] = parts[2]
+            with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(output_path)), buffering=0) as spool:
+                for parts in _ordered_map(seal, reads(range(tail, count)), workers):
+                    offsets.append(position)
+                    tags.append(parts[2])
+                    _write_parts(spool, parts)
+                    position += frame_length(parts)
+                table = _seek_table(keys, header, offsets, tags, size)
+                spooled = spool.tell()
+                with open(output_path, "r+b", buffering=0) as dst:
+                    # Drop the seek table first: if the patch is interrupted
+                    # now, the file reads as truncated, not as mixed content.
+                    dst.truncate(old_offsets[-1])
+                    for index, parts in ready.items():
+                        dst.seek(old_offsets[index])
+                        _write_parts(dst, parts)
+                    dst.truncate(old_offsets[tail])
+                    dst.seek(old_offsets[tail])
+                    if sw: sw.start()
+                    _copy_range(spool, dst, 0, spooled)
+                    if sw: sw.lap("update.copy", spooled)
+                    _write_parts(dst, [table])
+            summary["written"] = sum(frame_length(parts) for parts in ready.values()) + spooled + len(table)
+        else:
+            summary["mode"] = "rebuilt" if previous else "full"
+            with _atomic_output(output_path, buffering=0) as dst, \
+                    open(output_path if previous else os.devnull, "rb") as old_file:
+                _write_parts(dst, [header])
+                offsets, tags, position = [], [], len(header)
+                sealed = _ordered_map(seal, reads([i for i in changed if i not in ready]), workers)
+                for index in range(count):
+                    offsets.append(position)
+                    if index in pending:
+                        parts = ready.pop(index, None) or next(sealed)
+                        _write_parts(dst, parts)
+                        tags.append(parts[2])
+                        n = frame_length(parts)
+                    else:
+                        tags.append(old_tags[index])
+                        _report(None, cancel, index, count)
+                        if sw: sw.start()
+                        n = old_offsets[index + 1] - old_offsets[index]
+                        _copy_range(old_file, dst, old_offsets[index], n)
+                        if sw: sw.lap("update.copy", n)
+                    position += n
+                table = _seek_table(keys, header, offsets, tags, size)
+                _write_parts(dst, [table])
+            summary["written"] = position + len(table)
+    _write_index(output_path + INDEX_SUFFIX, keys, header, table[-SEEK_FOOTER.size:], size, digests)
+    return summary
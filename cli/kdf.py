@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from cli.stats import stopwatch
+
+# ---------- Password key derivation ----------
+# Passwords are stretched with scrypt (PBKDF2-SHA256 where OpenSSL lacks it)
+# under a random salt. The salt and cost parameters travel with the data they
+# protect, packed as KDF_BLOCK: kdf id | salt | cost | r | p, where cost is
+# log2(N) for scrypt and the iteration count for PBKDF2. Id 0 means the key
+# was not derived from a password.
+KDF_NONE, KDF_SCRYPT, KDF_PBKDF2 = 0, 1, 2
+KDF_NAMES = {KDF_SCRYPT: "scrypt", KDF_PBKDF2: "pbkdf2"}
+KDF_BLOCK = struct.Struct(">B16sIBB")
+SALT_SIZE = 16
+HAVE_SCRYPT = hasattr(hashlib, "scrypt")
+KDF_CONFIG_FILE = "kdf.json"
+DEFAULT_TARGET_MS = 250
+# Upper bounds on what a header may ask for: well above anything calibrate picks
+# by default, and far below what would hang or exhaust memory.
+MAX_SCRYPT_COST = 24
+MAX_SCRYPT_R = 32
+MAX_SCRYPT_P = 16
+MAX_SCRYPT_MEMORY = 2 << 30
+MAX_PBKDF2_ITERATIONS = 10_000_000
+KEY_CACHE_SIZE = 64
+_derive_lock = threading.Lock()  # so concurrent callers wait for one derivation instead of racing
+_key_cache = OrderedDict()  # (password digest, salt, params...) -> key, oldest first
+_cache_secret = os.urandom(32)  # per-process key for the digests, so they can't be brute-forced offline
+
+if HAVE_SCRYPT:
+    DEFAULT_PARAMS = {"name": "scrypt", "cost": 15, "r": 8, "p": 1}
+else:
+    DEFAULT_PARAMS = {"name": "pbkdf2", "cost": 600_000, "r": 0, "p": 0}
+
+def _kdf_id(name: str) -> int:
+    for kdf_id, kdf_name in KDF_NAMES.items():
+        if kdf_name == name:
+            return kdf_id
+    raise ValueError(f"Unknown KDF '{name}'.")
+
+def check_params(params: dict):
+    """
+    Raises ValueError unless params are ones calibrate could have picked.
+    Headers are read before anything is authenticated, so this keeps a crafted
+    file from asking for hours of PBKDF2 or gigabytes of scrypt memory.
+    """
+    name, cost, r, p = params["name"], params["cost"], params["r"], params["p"]
+    if name == "scrypt":
+        if not (1 <= cost <= MAX_SCRYPT_COST and 1 <= r <= MAX_SCRYPT_R and 1 <= p <= MAX_SCRYPT_P) \
+                or 128 * r << cost > MAX_SCRYPT_MEMORY:
+            raise ValueError(f"scrypt parameters out of range (cost {cost}, r {r}, p {p}).")
+    elif name == "pbkdf2":
+        if not 1 <= cost <= MAX_PBKDF2_ITERATIONS:
+            raise ValueError(f"PBKDF2 iteration count out of range ({cost}).")
+    else:
+        raise ValueError(f"Unknown KDF '{name}'.")
+
+def _derive(password: str, salt: bytes, name: str, cost: int, r: int, p: int) -> bytes:
+    sw = stopwatch()
+    secret = password.encode("utf-8")
+    if name == "scrypt":
+        n = 1 << cost
+        raw = hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=128 * r * (n + p) + (1 << 20), dklen=32)
+    elif name == "pbkdf2":
+        raw = hashlib.pbkdf2_hmac("sha256", secret, salt, cost, dklen=32)
+    else:
+        raise ValueError(f"Unknown KDF '{name}'.")
+    if sw: sw.lap("kdf.derive")
+    return base64.urlsafe_b64encode(raw)
+
+def derive_key(password: str, salt: bytes, params: dict = None, cache: bool = False) -> bytes:
+    """
+    Derives a Fernet key from a password, salt and KDF parameters.
+    With cache=True the key is kept for the life of the process (until
+    clear_key_cache), so a batch of files sharing one salt pays for a single
+    derivation, even when the files are processed on several threads. The cache
+    is keyed on a keyed digest of the password, never the password itself.
+    Vault keys are never cached.
+    """
+    params = params or DEFAULT_PARAMS
+    check_params(params)
+    args = (bytes(salt), params["name"], params["cost"], params["r"], params["p"])
+    if not cache:
+        return _derive(password, *args)
+    ident = (hmac.new(_cache_secret, password.encode("utf-8"), "sha256").digest(),) + args
+    with _derive_lock:
+        key = _key_cache.pop(ident, None) or _derive(password, *args)
+        _key_cache[ident] = key
+        while len(_key_cache) > KEY_CACHE_SIZE:
+            _key_cache.popitem(last=False)
+        return key
+
+def clear_key_cache():
+    with _derive_lock:
+        _key_cache.clear()
+
+def new_salt() -> bytes:
+    return os.urandom(SALT_SIZE)
+
+def pack_kdf(salt: bytes = None, params: dict = None) -> bytes:
+    """
+    Packs salt and params into a KDF_BLOCK; with no salt, an all-zero "no KDF" block.
+    """
+    if salt is None:
+        return KDF_BLOCK.pack(KDF_NONE, bytes(SALT_SIZE), 0, 0, 0)
+    params = params or DEFAULT_PARAMS
+    return KDF_BLOCK.pack(_kdf_id(params["name"]), salt, params["cost"], params["r"], params["p"])
+
+def unpack_kdf(block: bytes) -> tuple:
+    """
+    Returns (salt, params) from a KDF_BLOCK, or (None, None) for a "no KDF" block.
+    """
+    kdf_id, salt, cost, r, p = KDF_BLOCK.unpack(block)
+    if kdf_id == KDF_NONE:
+        return None, None
+    if kdf_id not in KDF_NAMES:
+        raise ValueError(f"Unknown KDF id {kdf_id}.")
+    params = {"name": KDF_NAMES[kdf_id], "cost": cost, "r": r, "p": p}
+    check_params(params)
+    return salt, params
+
+def load_params(path: str = None) -> dict:
+    """
+    Returns the parameters saved by `calibrate`, or DEFAULT_PARAMS if there are none.
+    """
+    path = path or KDF_CONFIG_FILE
+    if not os.path.exists(path):
+        return dict(DEFAULT_PARAMS)
+    with open(path) as f:
+        params = json.load(f)
+    if params.get("name") == "scrypt" and not HAVE_SCRYPT:
+        return dict(DEFAULT_PARAMS)
+    return params
+
+def save_params(params: dict, path: str = None):
+    with open(path or KDF_CONFIG_FILE, "w") as f:
+        json.dump(params, f, indent=2)
+
+def time_params(params: dict, rounds: int = 1) -> float:
+    """
+    Returns the seconds one uncached derivation with params takes on this machine.
+    """
+    salt = new_salt()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _derive("calibration", salt, params["name"], params["cost"], params["r"], params["p"])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def calibrate(target_ms: float = DEFAULT_TARGET_MS, max_memory_mb: int = 1024, name: str = None) -> dict:
+    """
+    Picks the largest cost whose derivation stays within target_ms on this machine.
+    scrypt doubles N (memory grows with it, capped at max_memory_mb); PBKDF2 scales
+    its iteration count from a timed probe. Returns the params with a "ms" field.
+    """
+    name = name or DEFAULT_PARAMS["name"]
+    target = target_ms / 1000
+    if name == "scrypt":
+        if not HAVE_SCRYPT:
+            raise ValueError("scrypt is not available in this Python build.")
+        params = {"name": "scrypt", "cost": 12, "r": 8, "p": 1}
+        elapsed = time_params(params, rounds=2)
+        while True:
+            bigger = dict(params, cost=params["cost"] + 1)
+            if 128 * bigger["r"] << bigger["cost"] > min(max_memory_mb << 20, MAX_SCRYPT_MEMORY) or elapsed * 2 > target:
+                break
+            params, elapsed = bigger, time_params(bigger, rounds=2)
+    elif name == "pbkdf2":
+        probe = {"name": "pbkdf2", "cost": 100_000, "r": 0, "p": 0}
+        per_iter = time_params(probe, rounds=2) / probe["cost"]
+        params = dict(probe, cost=min(MAX_PBKDF2_ITERATIONS, max(100_000, int(target / per_iter))))
+        elapsed = time_params(params)
+    else:
+        raise ValueError(f"Unknown KDF '{name}'.")
+    params["ms"] = round(elapsed * 1000, 1)
+    return params
@@ -1,61 +1,436 @@
-from cryptography.fernet import Fernet
-import json, os
-from cli.encryptor import generate_key
+from cryptography.fernet import Fernet, InvalidToken
+from contextlib import contextmanager
+import base64, hashlib, hmac, json, os, struct, threading, time
+from cli.encryptor import _atomic_output, generate_key
+from cli.kdf import clear_key_cache, derive_key, load_params, new_salt
+from cli.locking import file_lock
+from cli.stats import stopwatch
 
 VAULT_FILE = "key_vault.enc"
+DEFAULT_SESSION_TTL = 300  # seconds an unlocked VaultSession keeps the keys in memory
 
-def create_vault(master_password: str): 
-    if os.path.exists(VAULT_FILE): 
-        raise FileExistsError("Vault already exists.") 
-    vault_key = Fernet(generate_key(master_password)) 
-    encrypted = vault_key.encrypt(json.dumps({}).encode()) 
-    with open(VAULT_FILE, "wb") as f:
-        f.write(encrypted) 
+# The vault is an append-only journal: a header, then one record per change,
+#   op | token length | alias tag | record MAC | Fernet token of {"op", "alias", "key"}
+# Every record is encrypted on its own, so adding or removing a key appends a
+# record instead of re-encrypting the whole vault. The alias tag is an HMAC of
+# the alias under a key derived from the master password; the tag -> offset
+# index is rebuilt from record headers alone, so a lookup decrypts one record.
+# The record MAC covers the header metadata, the record's offset, its header
+# fields and token, so an op or tag edited in place, or a record copied to
+# another position or vault, is refused when the index is built rather than
+# silently hiding or redirecting a key. Version 2 journals had no record MAC
+# and are rewritten, from their decrypted records, the first time they are opened.
+# Writers serialise on a lock file, and once superseded records outnumber the
+# live ones the journal is compacted into a new file that atomically replaces it.
+# The header metadata holds the salt and KDF parameters for the master password
+# and a check token that fails to decrypt under a wrong one.
+VAULT_MAGIC = b"SSVAULT"
+VAULT_VERSION = 3
+VAULT_HEADER = struct.Struct(">7sBI")  # magic, version, metadata length
+RECORD = struct.Struct(">BI32s32s")    # op, token length, alias tag, record MAC
+RECORD_V2 = struct.Struct(">BI32s")    # op, token length, alias tag
+OP_PUT, OP_DEL = 1, 2
+CHECK_PLAINTEXT = b"secureshare-vault"
+COMPACT_MIN_DEAD = 1024
+
+class VaultLocked(Exception):
+    pass
+
+class VaultStore:
+    """
+    Record-level access to the vault file. Lookups, inserts and deletes touch a
+    single record; only listing and whole-vault load/save decrypt every record.
+    Vaults written by older versions, either one Fernet token of JSON or a
+    journal keyed by the unsalted SHA-256 of the password, are re-keyed with the
+    current KDF parameters the first time they are opened; version 2 journals
+    are rewritten with record MACs.
+    """
+    def __init__(self, master_password: str, path: str = None):
+        self.path = path or VAULT_FILE
+        self._index = {}  # alias tag -> offset of its live record
+        self._dead = 0
+        self._meta = None
+        self._binding = None  # digest of _meta, fed into every record MAC
+        self._end = 0
+        version, meta = _read_meta(self.path)
+        kdf = meta and meta.get("kdf")
+        if kdf is None or version != VAULT_VERSION:
+            self._upgrade(master_password)
+        else:
+            self._use_kdf(master_password, kdf)
+        with open(self.path, "rb") as f:
+            self._refresh(f)  # fails here on a wrong password
+
+    def _use_key(self, vault_key: bytes, kdf: dict = None):
+        self._kdf = kdf
+        self._fernet = Fernet(vault_key)
+        raw = base64.urlsafe_b64decode(vault_key)
+        self._tag_key = hmac.new(raw, b"alias-index", hashlib.sha256).digest()
+        self._mac_key = hmac.new(raw, b"record-mac", hashlib.sha256).digest()
+
+    def _use_kdf(self, master_password: str, kdf: dict):
+        self._use_key(derive_key(master_password, base64.b64decode(kdf["salt"]), kdf["params"]), kdf)
+
+    def _tag(self, alias: str) -> bytes:
+        return hmac.new(self._tag_key, alias.encode("utf-8"), hashlib.sha256).digest()
+
+    def _header(self) -> bytes:
+        return _vault_header(self._fernet, self._kdf)
+
+    def _entry(self, op: int, alias: str, key: str = None) -> tuple:
+        """
+        Encrypts one change, returning (op, alias tag, token) for _pack_record.
+        """
+        sw = stopwatch()
+        token = self._fernet.encrypt(json.dumps({"op": op, "alias": alias, "key": key}).encode())
+        if sw: sw.lap("vault.encrypt", len(token))
+        return op, self._tag(alias), token
+
+    def _record_mac(self, binding: bytes, offset: int, op: int, tag: bytes, token) -> bytes:
+        mac = hmac.new(self._mac_key, binding, hashlib.sha256)
+        mac.update(struct.pack(">QBI", offset, op, len(token)) + tag)
+        mac.update(token)
+        return mac.digest()
+
+    def _pack_record(self, binding: bytes, offset: int, op: int, tag: bytes, token: bytes) -> bytes:
+        return RECORD.pack(op, len(token), tag, self._record_mac(binding, offset, op, tag, token)) + token
+
+    def _refresh(self, f):
+        """
+        Brings the index up to date with the open vault file f. The header's
+        check token is fresh for every file written, so a changed header means
+        the file was replaced and the index is rebuilt; otherwise only records
+        appended since the last refresh are read.
+        """
+        f.seek(0)
+        magic, version, meta_len = VAULT_HEADER.unpack(f.read(VAULT_HEADER.size))
+        if magic != VAULT_MAGIC or version != VAULT_VERSION:
+            raise ValueError(f"Unsupported vault format in '{self.path}'.")
+        meta = f.read(meta_len)
+        if meta != self._meta:
+            if self._fernet.decrypt(json.loads(meta)["check"].encode()) != CHECK_PLAINTEXT:
+                raise ValueError("Vault check value does not match.")
+            self._index, self._dead = {}, 0
+            self._meta, self._binding = meta, hashlib.sha256(meta).digest()
+            self._end = VAULT_HEADER.size + meta_len
+        size = os.fstat(f.fileno()).st_size
+        if size <= self._end:
+            return
+        sw = stopwatch()
+        f.seek(self._end)
+        buf = memoryview(f.read(size - self._end))
+        pos = 0
+        while pos + RECORD.size <= len(buf):
+            op, length, tag, mac = RECORD.unpack_from(buf, pos)
+            if pos + RECORD.size + length > len(buf):
+                break  # torn append; the next writer truncates it
+            token = buf[pos + RECORD.size:pos + RECORD.size + length]
+            if not hmac.compare_digest(mac, self._record_mac(self._binding, self._end + pos, op, tag, token)):
+                raise InvalidToken(f"Vault record at offset {self._end + pos} failed authentication.")
+            if tag in self._index:
+                self._dead += 1
+            if op == OP_PUT:
+                self._index[tag] = self._end + pos
+            else:
+                self._index.pop(tag, None)
+                self._dead += 1
+            pos += RECORD.size + length
+        self._end += pos
+        if sw: sw.lap("vault.index", pos)
+
+    def _read_record(self, f, offset: int) -> dict:
+        sw = stopwatch()
+        f.seek(offset)
+        _, length, _, _ = RECORD.unpack(f.read(RECORD.size))
+        record = json.loads(self._fernet.decrypt(f.read(length)))
+        if sw: sw.lap("vault.decrypt", length)
+        return record
+
+    def _lookup(self, f, alias: str):
+        offset = self._index.get(self._tag(alias))
+        if offset is None:
+            return None
+        record = self._read_record(f, offset)
+        return record if record["alias"] == alias else None
+
+    @contextmanager
+    def _writing(self):
+        with file_lock(self.path), open(self.path, "r+b") as f:
+            self._refresh(f)
+            f.truncate(self._end)
+            yield f
+            sw = stopwatch()
+            f.flush()
+            os.fsync(f.fileno())
+            if sw: sw.lap("vault.fsync")
+        if self._dead >= max(COMPACT_MIN_DEAD, len(self._index)):
+            self.compact()
+
+    def _append(self, f, op: int, alias: str, key: str = None):
+        _, tag, token = self._entry(op, alias, key)
+        record = self._pack_record(self._binding, self._end, op, tag, token)
+        f.seek(self._end)
+        f.write(record)
+        if tag in self._index:
+            self._dead += 1
+        if op == OP_PUT:
+            self._index[tag] = self._end
+        else:
+            del self._index[tag]
+            self._dead += 1
+        self._end += len(record)
+
+    def _rewrite(self, entries):
+        """
+        Replaces the vault with a fresh header and one record per (op, alias
+        tag, token) entry, through a temporary file in the same directory.
+        """
+        header = self._header()
+        binding = hashlib.sha256(header[VAULT_HEADER.size:]).digest()
+        with _atomic_output(self.path) as out:
+            out.write(header)
+            offset = len(header)
+            for entry in entries:
+                record = self._pack_record(binding, offset, *entry)
+                out.write(record)
+                offset += len(record)
+            out.flush()
+            os.fsync(out.fileno())
+
+    def _replay_v2(self, blob: bytes) -> dict:
+        """
+        Returns alias -> key from a version 2 journal. Its record headers are
+        not authenticated, so every record is decrypted and applied by the op
+        and alias inside its token.
+        """
+        _, _, meta_len = VAULT_HEADER.unpack_from(blob)
+        meta = json.loads(blob[VAULT_HEADER.size:VAULT_HEADER.size + meta_len])
+        if self._fernet.decrypt(meta["check"].encode()) != CHECK_PLAINTEXT:
+            raise ValueError("Vault check value does not match.")
+        vault, pos = {}, VAULT_HEADER.size + meta_len
+        while pos + RECORD_V2.size <= len(blob):
+            _, length, _ = RECORD_V2.unpack_from(blob, pos)
+            token = blob[pos + RECORD_V2.size:pos + RECORD_V2.size + length]
+            if len(token) != length:
+                break  # torn append
+            record = json.loads(self._fernet.decrypt(token))
+            if record["op"] == OP_PUT:
+                vault[record["alias"]] = record["key"]
+            else:
+                vault.pop(record["alias"], None)
+            pos += RECORD_V2.size + length
+        return vault
+
+    def _upgrade(self, master_password: str):
+        with file_lock(self.path):
+            version, meta = _read_meta(self.path)
+            kdf = meta and meta.get("kdf")
+            if kdf is not None and version == VAULT_VERSION:  # upgraded by another process in the meantime
+                self._use_kdf(master_password, kdf)
+                return
+            if kdf is None:
+                self._use_key(generate_key(master_password))
+            else:
+                self._use_kdf(master_password, kdf)
+            with open(self.path, "rb") as f:
+                blob = f.read()
+            if blob.startswith(VAULT_MAGIC):
+                vault = self._replay_v2(blob)
+            else:
+                vault = json.loads(self._fernet.decrypt(blob))
+            if kdf is None:
+                self._use_kdf(master_password, _new_kdf())
+            self._rewrite(self._entry(OP_PUT, alias, key) for alias, key in vault.items())
+
+    def get(self, alias: str) -> str:
+        with open(self.path, "rb") as f:
+            self._refresh(f)
+            record = self._lookup(f, alias)
+        if record is None:
+            raise KeyError(f"Key '{alias}' not found in vault.")
+        return record["key"]
+
+    def put(self, alias: str, key: str):
+        with self._writing() as f:
+            self._append(f, OP_PUT, alias, key)
+
+    def put_many(self, items: dict):
+        """
+        Stores several alias -> key pairs under one lock and one fsync.
+        """
+        with self._writing() as f:
+            for alias, key in items.items():
+                self._append(f, OP_PUT, alias, key)
+
+    def delete(self, alias: str):
+        with self._writing() as f:
+            if self._lookup(f, alias) is None:
+                raise KeyError(f"Alias '{alias}' not found.")
+            self._append(f, OP_DEL, alias)
+
+    def rename(self, old_alias: str, new_alias: str):
+        with self._writing() as f:
+            record = self._lookup(f, old_alias)
+            if record is None:
+                raise KeyError(f"Alias '{old_alias}' not found.")
+            if self._lookup(f, new_alias) is not None:
+                raise KeyError(f"Alias '{new_alias}' already exists.")
+            self._append(f, OP_PUT, new_alias, record["key"])
+            self._append(f, OP_DEL, old_alias)
+
+    def items(self) -> dict:
+        with open(self.path, "rb") as f:
+            self._refresh(f)
+            records = [self._read_record(f, offset) for offset in sorted(self._index.values())]
+        return {r["alias"]: r["key"] for r in records}
+
+    def aliases(self) -> list[str]:
+        return list(self.items())
+
+    def replace_all(self, vault: dict):
+        with file_lock(self.path):
+            self._rewrite(self._entry(OP_PUT, alias, key) for alias, key in vault.items())
+
+    def compact(self):
+        """
+        Rewrites the journal with only the live records. Their tokens are copied
+        as they are, so compaction needs no decryption; only the record MACs,
+        which cover each record's offset, are computed again.
+        """
+        with file_lock(self.path):
+            sw = stopwatch()
+            with open(self.path, "rb") as f:
+                self._refresh(f)
+                entries = []
+                for offset in sorted(self._index.values()):
+                    f.seek(offset)
+                    op, length, tag, _ = RECORD.unpack(f.read(RECORD.size))
+                    entries.append((op, tag, f.read(length)))
+            self._rewrite(entries)
+            if sw: sw.lap("vault.compact", sum(RECORD.size + len(entry[2]) for entry in entries))
+
+def _new_kdf() -> dict:
+    return {"salt": base64.b64encode(new_salt()).decode(), "params": load_params()}
+
+def _vault_header(fernet: Fernet, kdf: dict) -> bytes:
+    meta = json.dumps({"kdf": kdf, "check": fernet.encrypt(CHECK_PLAINTEXT).decode()}).encode()
+    return VAULT_HEADER.pack(VAULT_MAGIC, VAULT_VERSION, len(meta)) + meta
+
+def _read_meta(path: str) -> tuple:
+    """
+    Returns (version, header metadata) of a journal vault, or (None, None) for
+    a single-token vault.
+    """
+    with open(path, "rb") as f:
+        magic, version, meta_len = VAULT_HEADER.unpack(f.read(VAULT_HEADER.size).ljust(VAULT_HEADER.size, b"\0"))
+        if magic != VAULT_MAGIC:
+            return None, None
+        return version, json.loads(f.read(meta_len))
+
+def create_vault(master_password: str, path: str = None):
+    path = path or VAULT_FILE
+    if os.path.exists(path):
+        raise FileExistsError("Vault already exists.")
+    kdf = _new_kdf()
+    vault_key = Fernet(derive_key(master_password, base64.b64decode(kdf["salt"]), kdf["params"]))
+    with open(path, "xb") as f:
+        f.write(_vault_header(vault_key, kdf))
         print("Vault created.")
 
 def load_vault(master_password: str) -> dict:
-    vault_key = Fernet(generate_key(master_password))
-    with open(VAULT_FILE, "rb") as f:
-        decrypted = vault_key.decrypt(f.read())
-    return json.loads(decrypted)
+    return VaultStore(master_password).items()
 
 def save_vault(vault: dict, master_password: str):
-    vault_key = Fernet(generate_key(master_password))
-    encrypted = vault_key.encrypt(json.dumps(vault).encode())
-    with open(VAULT_FILE, "wb") as f:
-        f.write(encrypted)
-
-def add_key(alias: str, master_password: str) -> bytes: 
-    """ Generates a new Fernet key and stores it under an alias. Returns the new key so the user can note it if desired. """ 
-    vault = load_vault(master_password) 
-    key = Fernet.generate_key().decode() 
-    vault[alias] = key 
-    save_vault(vault, master_password) 
-    print(f"Key '{alias}' stored.") 
+    VaultStore(master_password).replace_all(vault)
+
+def add_key(alias: str, master_password: str) -> bytes:
+    """ Generates a new Fernet key and stores it under an alias. Returns the new key so the user can note it if desired. """
+    key = Fernet.generate_key().decode()
+    VaultStore(master_password).put(alias, key)
+    print(f"Key '{alias}' stored.")
     return key.encode()
 
 def list_aliases(master_password: str) -> list[str]:
-    vault = load_vault(master_password)
-    return list(vault.keys())
+    return VaultStore(master_password).aliases()
 
 def delete_key(alias: str, master_password: str):
-    vault = load_vault(master_password)
-    if alias not in vault:
-        raise KeyError(f"Alias '{alias}' not found.")
-    del vault[alias]
-    save_vault(vault, master_password)
+    VaultStore(master_password).delete(alias)
 
 def rename_key(old_alias: str, new_alias: str, master_password: str):
-    vault = load_vault(master_password)
-    if old_alias not in vault:
-        raise KeyError(f"Alias '{old_alias}' not found.")
-    if new_alias in vault:
-        raise KeyError(f"Alias '{new_alias}' already exists.")
-    vault[new_alias] = vault.pop(old_alias)
-    save_vault(vault, master_password)
-
-def get_key(alias: str, master_password: str) -> bytes: 
-    vault = load_vault(master_password)
-    if alias not in vault: 
-        raise KeyError(f"Key '{alias}' not found in vault.") 
-    return vault[alias].encode()
\ No newline at end of file
+    VaultStore(master_password).rename(old_alias, new_alias)
+
+def get_key(alias: str, master_password: str) -> bytes:
+    return VaultStore(master_password).get(alias).encode()
+
+class VaultSession:
+    """
+    Keeps the vault unlocked for ttl seconds after unlocking, so a batch of
+    operations costs one key derivation instead of one each. The session holds
+    an open VaultStore, whose index follows changes other processes make to the
+    vault file, and caches the keys it has decrypted. Both are dropped when the
+    ttl runs out; after that every call raises VaultLocked until a new session
+    is opened. ttl=None keeps the session unlocked until lock() is called.
+    """
+    def __init__(self, master_password: str, ttl: float = DEFAULT_SESSION_TTL, path: str = None):
+        self._lock = threading.RLock()
+        self._store = VaultStore(master_password, path)  # fails now on a wrong password
+        self._cache = {}  # alias -> ((file header, record offset), key)
+        self.expires_at = float("inf") if ttl is None else time.monotonic() + ttl
+        self._timer = None
+        if ttl is not None:
+            self._timer = threading.Timer(ttl, self.lock)
+            self._timer.daemon = True
+            self._timer.start()
+
+    @property
+    def unlocked(self) -> bool:
+        return self._store is not None and time.monotonic() < self.expires_at
+
+    def lock(self):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+            self._cache.clear()
+            self._store = None
+            clear_key_cache()  # drop file keys derived from passwords while the session was open
+
+    def _unlocked_store(self) -> VaultStore:
+        # Caller must hold self._lock.
+        if not self.unlocked:
+            self.lock()
+            raise VaultLocked("Vault session expired; unlock it again.")
+        return self._store
+
+    def get_key(self, alias: str) -> bytes:
+        with self._lock:
+            store = self._unlocked_store()
+            with open(store.path, "rb") as f:
+                store._refresh(f)
+                where = (store._meta, store._index.get(store._tag(alias)))
+                cached = self._cache.get(alias)
+                if cached is None or cached[0] != where:
+                    record = store._lookup(f, alias)
+                    if record is None:
+                        raise KeyError(f"Key '{alias}' not found in vault.")
+                    cached = self._cache[alias] = (where, record["key"])
+            return cached[1].encode()
+
+    def list_aliases(self) -> list[str]:
+        with self._lock:
+            return self._unlocked_store().aliases()
+
+    def add_key(self, alias: str) -> bytes:
+        with self._lock:
+            key = Fernet.generate_key().decode()
+            self._unlocked_store().put(alias, key)
+            return key.encode()
+
+    def delete_key(self, alias: str):
+        with self._lock:
+            self._unlocked_store().delete(alias)
+            self._cache.pop(alias, None)
+
+    def rename_key(self, old_alias: str, new_alias: str):
+        with self._lock:
+            self._unlocked_store().rename(old_alias, new_alias)
+            self._cache.pop(old_alias, None)
@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ---------- Cross-process file locks ----------
+# The lock is taken on a separate "<path>.lock" file rather than the file itself,
+# since the vault and archive replace or truncate the files they protect.
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Holds an exclusive lock on path + ".lock" for the duration of the block,
+    waiting for other processes (and threads) that hold it.
+    """
+    with open(path + ".lock", "a+b") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,141 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ---------- Instrumentation hooks ----------
+# Instrumented code reports (stage, seconds, nbytes) to every registered hook.
+# With no hooks, stopwatch() returns None and each instrumented stage costs one
+# truthiness test, so nothing is timed unless someone is listening. Stage names
+# are "<area>.<stage>", e.g. "encrypt.compress" or "kdf.derive". Stages running on
+# worker threads are summed across threads, so they can add up to more than the
+# wall-clock time.
+_hooks = []
+_hooks_lock = threading.Lock()
+
+def add_hook(hook):
+    """
+    Registers hook(stage, seconds, nbytes) to receive every timing. Hooks are
+    called on the thread that did the work and must be thread-safe.
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+def remove_hook(hook):
+    with _hooks_lock:
+        _hooks.remove(hook)
+
+def enabled() -> bool:
+    return bool(_hooks)
+
+def record(stage: str, seconds: float, nbytes: int = 0):
+    for hook in list(_hooks):
+        hook(stage, seconds, nbytes)
+
+class Stopwatch:
+    __slots__ = ("last",)
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def start(self):
+        """
+        Restarts timing without recording, e.g. when a generator resumes.
+        """
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str, nbytes: int = 0):
+        """
+        Records the time since the previous lap (or creation) under stage.
+        """
+        now = time.perf_counter()
+        record(stage, now - self.last, nbytes)
+        self.last = now
+
+def stopwatch():
+    """
+    A started Stopwatch when hooks are registered, otherwise None. Use as
+        sw = stopwatch()
+        ...work...
+        if sw: sw.lap("area.stage", nbytes)
+    """
+    return Stopwatch() if _hooks else None
+
+class Collector:
+    """
+    A hook that totals calls, seconds and bytes per stage.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def __call__(self, stage: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            totals = self.stages.setdefault(stage, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += nbytes
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {stage: {"calls": calls, "seconds": seconds, "bytes": nbytes,
+                            "mb_per_sec": nbytes / (1024 * 1024) / seconds if nbytes and seconds else None}
+                    for stage, (calls, seconds, nbytes) in sorted(self.stages.items())}
+
+@contextmanager
+def collect(profile: bool = False, trace_memory: bool = False, top: int = 25):
+    """
+    Collects stage timings for the duration of the block and yields a dict that
+    is filled in on exit with "wall_seconds" and "stages", plus "profile" (the
+    top functions by cumulative time, calling thread only) with profile=True and
+    "memory_peak_mb" (Python allocations) with trace_memory=True.
+    """
+    # Imported here: every module with stopwatches imports this one, and the
+    # profiling modules would add ~60 ms to each start-up.
+    import cProfile
+    import tracemalloc
+    report = {}
+    collector = Collector()
+    add_hook(collector)
+    profiler = cProfile.Profile() if profile else None
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield report
+    finally:
+        if profiler:
+            profiler.disable()
+        report["wall_seconds"] = time.perf_counter() - start
+        remove_hook(collector)
+        report["stages"] = collector.as_dict()
+        if trace_memory:
+            report["memory_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        if profiler:
+            report["profile"] = _top_functions(profiler, top)
+
+def _top_functions(profiler, top: int) -> list:
+    import io
+    import pstats
+    stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats("cumulative")
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({"function": f"{filename}:{line}({name})", "calls": calls,
+                     "own_seconds": own, "cumulative_seconds": cumulative})
+    rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+    return rows[:top]
+
+def dump(report: dict, path: str = "-"):
+    """
+    Writes a report from collect() as JSON to path, or to stderr for "-".
+    """
+    text = json.dumps(report, indent=2)
+    if path == "-":
+        print(text, file=sys.stderr)
+    else:
+        with open(path, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,221 @@
+import asyncio
+import hmac
+import os
+from collections import deque
+from cryptography.fernet import InvalidToken
+from cli.compresser import get_codec, get_codec_id, pick_codec
+from cli.encryptor import (
+    MAGIC, FORMAT_VERSION, SEEK_VERSION, HEADER, HEADER_V1, HEADER_V2, FRAME, TAG_SIZE, FLAG_FINAL,
+    SEEK_MAGIC, SEEK_FOOTER, DEFAULT_CHUNK_SIZE, DEFAULT_CODEC, ENTROPY_THRESHOLD, CODEC_SAMPLE,
+    _split_key, _seal_chunk, _open_chunk, _seek_table, _seek_tag, _seek_entry, _unpack_seek_table,
+    _max_frame_length, _check_chunk_size, _header_chunk_size,
+)
+from cli.kdf import pack_kdf
+
+# ---------- asyncio streaming ----------
+# The same container format as encrypt_file/decrypt_file, produced and consumed
+# as async generators. Sources are an asyncio.StreamReader (anything with an
+# async read(n)) or an async iterable of bytes. Compression and encryption run
+# in an executor, at most `workers` chunks at a time per stream, and the next
+# chunk is only read when the consumer asks for more output, so a slow consumer
+# slows the producer down. A stream holds about workers + 3 chunks at most: the
+# chunks being sealed, one chunk of lookahead (to flag the final chunk), the
+# read buffer and the piece waiting for the consumer.
+#
+#   async for piece in encrypt_stream(request.content, key):
+#       await response.write(piece)
+
+class _Source:
+    """
+    Buffered exact-size reads over a StreamReader or an async iterable of bytes.
+    """
+    def __init__(self, source):
+        self._reader = source if hasattr(source, "read") else None
+        self._iterator = None if self._reader else source.__aiter__()
+        self._buf = bytearray()
+        self._eof = False
+
+    async def _fill(self, size: int):
+        while len(self._buf) < size and not self._eof:
+            if self._reader:
+                piece = await self._reader.read(size - len(self._buf))
+            else:
+                try:
+                    piece = await self._iterator.__anext__()
+                except StopAsyncIteration:
+                    piece = b""
+            if piece:
+                self._buf += piece
+            else:
+                self._eof = True
+
+    async def read(self, size: int) -> bytes:
+        """
+        Returns size bytes, or fewer only at the end of the stream.
+        """
+        await self._fill(size)
+        if len(self._buf) <= size:
+            data, self._buf = bytes(self._buf), bytearray()
+        else:
+            with memoryview(self._buf) as view:
+                data = bytes(view[:size])
+            del self._buf[:size]
+        return data
+
+    async def read_exact(self, size: int) -> bytes:
+        data = await self.read(size)
+        if len(data) != size:
+            raise InvalidToken("Encrypted stream is truncated.")
+        return data
+
+    async def at_eof(self) -> bool:
+        await self._fill(1)
+        return not self._buf
+
+async def _chunks(source: _Source, chunk_size: int):
+    """
+    Yields (index, data, flags) like encryptor._read_chunks, reading one chunk ahead.
+    """
+    index, current = 0, await source.read(chunk_size)
+    while True:
+        following = await source.read(chunk_size) if len(current) == chunk_size else b""
+        yield index, current, 0 if following else FLAG_FINAL
+        if not following:
+            return
+        index, current = index + 1, following
+
+async def _ordered_in_executor(func, items, workers: int, executor):
+    """
+    Async counterpart of encryptor._ordered_map: runs func on executor for each
+    item, keeping at most workers calls in flight, and yields results in order.
+    """
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    try:
+        async for item in items:
+            pending.append(loop.run_in_executor(executor, func, item))
+            if len(pending) >= max(1, workers):
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def _seal_joined(keys, header, nonce, index, data, *args) -> tuple:
+    return b"".join(_seal_chunk(keys, header, nonce, index, data, *args)), len(data)
+
+async def encrypt_stream(source, key: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1,
+                         entropy_threshold: float = ENTROPY_THRESHOLD, codec: str = DEFAULT_CODEC,
+                         kdf: tuple = None, executor=None):
+    """
+    Encrypts a stream, yielding the container as bytes: the header, one piece
+    per chunk frame, then the seek table. The output is what encrypt_file would
+    write for the same data, and decrypt_file, decrypt_range or decrypt_stream
+    can read it.
+    codec "auto" picks from a sample of the first chunk, since a stream cannot
+    be sampled throughout. executor defaults to the loop's default executor.
+    """
+    _check_chunk_size(chunk_size)
+    keys = _split_key(key)
+    nonce = os.urandom(16)
+    codec_id = None if codec == "auto" else get_codec_id(codec)
+    source = _Source(source)
+    chunks = _chunks(source, chunk_size)
+    first = await chunks.__anext__()
+    if codec_id is None:
+        sample = first[1][:4 * CODEC_SAMPLE]
+        codec_id = get_codec_id(await asyncio.get_running_loop().run_in_executor(executor, pick_codec, sample))
+    compress = get_codec(codec_id)[1]
+    header = HEADER_V2.pack(MAGIC, FORMAT_VERSION, codec_id, chunk_size, nonce) + pack_kdf(*(kdf or ()))
+    yield header
+
+    async def items():
+        yield first
+        async for item in chunks:
+            yield item
+
+    seal = lambda item: _seal_joined(keys, header, nonce, *item, compress, entropy_threshold)
+    offsets, tags, position, size = [], [], len(header), 0
+    async for frame, n in _ordered_in_executor(seal, items(), workers, executor):
+        offsets.append(position)
+        tags.append(frame[-TAG_SIZE:])
+        position += len(frame)
+        size += n
+        yield frame
+    yield _seek_table(keys, header, offsets, tags, size)
+
+async def _read_stream_header(source: _Source) -> tuple:
+    prefix = await source.read(len(MAGIC) + 1)
+    if prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a chunked container; legacy single-token files need decrypt_file.")
+    version = prefix[-1]
+    if version == 1:
+        header = prefix + await source.read_exact(HEADER_V1.size - len(prefix))
+        _, _, chunk_size, _ = HEADER_V1.unpack(header)
+        return header, get_codec_id(DEFAULT_CODEC), _header_chunk_size(chunk_size)
+    if 2 <= version <= FORMAT_VERSION:
+        header = prefix + await source.read_exact((HEADER_V2 if version == 2 else HEADER).size - len(prefix))
+        _, _, codec_id, chunk_size, _ = HEADER_V2.unpack_from(header)
+        return header, codec_id, _header_chunk_size(chunk_size)
+    raise ValueError(f"Unsupported encrypted file version {version}.")
+
+async def _frames(source: _Source, keys: tuple, header: bytes, max_length: int, trailer: dict):
+    """
+    Yields (index, frame, ciphertext, tag) like encryptor._read_frames. For
+    version 4+ streams the seek table after the final frame is then verified
+    against the frames read, and its plaintext size left in trailer["size"].
+    """
+    index, offsets, tags, position = 0, [], [], len(header)
+    while True:
+        frame = await source.read(FRAME.size)
+        if not frame:
+            raise InvalidToken("Encrypted stream is truncated (no final chunk).")
+        if len(frame) != FRAME.size:
+            raise InvalidToken("Encrypted stream is truncated.")
+        flags, length, _ = FRAME.unpack(frame)
+        # Frames are only authenticated once read; refuse to buffer absurd lengths first.
+        if length > max_length:
+            raise InvalidToken(f"Chunk {index} is larger than the stream's chunk size allows.")
+        ciphertext = await source.read_exact(length)
+        tag = await source.read_exact(TAG_SIZE)
+        offsets.append(position)
+        tags.append(tag)
+        position += FRAME.size + length + TAG_SIZE
+        yield index, frame, ciphertext, tag
+        index += 1
+        if flags & FLAG_FINAL:
+            break
+    if header[len(MAGIC)] >= SEEK_VERSION:
+        table = await source.read_exact(index * _seek_entry(header).size)
+        count, size, tag, magic = SEEK_FOOTER.unpack(await source.read_exact(SEEK_FOOTER.size))
+        if magic != SEEK_MAGIC or not hmac.compare_digest(tag, _seek_tag(keys[0], header, count, size, table)):
+            raise InvalidToken("Seek table failed authentication.")
+        table_offsets, table_tags = _unpack_seek_table(header, table)
+        if count != index or table_offsets != offsets or table_tags not in (None, tags):
+            raise InvalidToken("Seek table does not match the stream.")
+        trailer["size"] = size
+    if not await source.at_eof():
+        raise InvalidToken("Unexpected data after the final chunk.")
+
+async def decrypt_stream(source, key: bytes, workers: int = 1, executor=None):
+    """
+    Decrypts a stream written by encrypt_stream or encrypt_file, yielding the
+    plaintext chunk by chunk. Every chunk is authenticated before it is yielded,
+    but a stream that turns out to be truncated or tampered with raises
+    InvalidToken only when that point is reached, after earlier chunks have been
+    yielded; callers must discard what they received if iteration fails.
+    """
+    source = _Source(source)
+    header, codec_id, chunk_size = await _read_stream_header(source)
+    decompress = get_codec(codec_id)[2]
+    keys = _split_key(key)
+    trailer = {}
+    frames = _frames(source, keys, header, _max_frame_length(chunk_size), trailer)
+    open_chunk = lambda item: _open_chunk(keys, header, *item, decompress)
+    size = 0
+    async for data in _ordered_in_executor(open_chunk, frames, workers, executor):
+        size += len(data)
+        yield data
+    if trailer.get("size", size) != size:
+        raise InvalidToken("Seek table does not match the stream.")
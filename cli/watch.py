@@ -0,0 +1,218 @@
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cli.batch import SCRATCH_GLOBS, iter_files, matches
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+DEFAULT_SETTLE = 2.0    # seconds a file must stay unchanged before it is picked up
+DEFAULT_INTERVAL = 1.0  # seconds between scans when polling
+DEFAULT_REPORT_EVERY = 10.0
+
+class _Inotify:
+    """
+    Minimal inotify binding over ctypes, watching a directory tree for files
+    being created, written or moved in. Only available on Linux.
+    """
+    def __init__(self):
+        import ctypes, ctypes.util  # only needed here, and ctypes.util is slow to import
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+
+    def add_tree(self, root: str):
+        for dirpath, _, _ in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd >= 0:
+                self.dirs[wd] = dirpath
+
+    def read(self, timeout: float) -> tuple:
+        """
+        Waits up to timeout seconds and returns (events, overflowed), where events
+        is a list of (path, is_dir). After an overflow the caller must rescan.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return [], False
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+        events, overflowed, pos = [], False, 0
+        while pos < len(buf):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buf, pos)
+            name = buf[pos + INOTIFY_EVENT.size:pos + INOTIFY_EVENT.size + length].rstrip(b"\0")
+            pos += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+            elif wd in self.dirs and name:
+                events.append((os.path.join(self.dirs[wd], os.fsdecode(name)), bool(mask & IN_ISDIR)))
+        return events, overflowed
+
+    def close(self):
+        os.close(self.fd)
+
+def _open_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return _Inotify()
+    except (OSError, AttributeError):
+        return None
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def watch(root: str, action, workers: int = 4, settle: float = DEFAULT_SETTLE, interval: float = DEFAULT_INTERVAL,
+          include: list = None, exclude: list = None, existing: bool = False, poll: bool = False,
+          report_every: float = DEFAULT_REPORT_EVERY, stop: threading.Event = None) -> dict:
+    """
+    Watches root and calls action(path) on a pool of worker threads for every file
+    that appears or changes, once its size and mtime have stayed the same for
+    settle seconds (so files still being written are left alone). Uses inotify on
+    Linux and scans every interval seconds elsewhere or with poll=True. Files
+    already present are only processed with existing=True. Scratch files
+    (cli.batch.SCRATCH_GLOBS) are always excluded.
+    Every report_every seconds prints the backlog (settling + queued + running)
+    and arrival-to-output latency. Runs until stop is set or Ctrl+C, waits for
+    running actions, and returns a summary like cli.batch.run_batch.
+    """
+    stop = stop or threading.Event()
+    exclude = (exclude or []) + SCRATCH_GLOBS
+    source = None if poll else _open_inotify()
+    settling = {}  # path -> [first seen, last change, (size, mtime)]
+    handled = {}   # path -> (size, mtime) it was last submitted with
+    running = {}   # future -> (path, first seen, size)
+    latencies, window = [], []
+    summary = {"files": 0, "failed": 0, "bytes": 0, "errors": []}
+    start = time.perf_counter()
+
+    def note(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            settling.pop(path, None)
+            return
+        if not stat.S_ISREG(st.st_mode):
+            return
+        stamp = (st.st_size, st.st_mtime_ns)
+        now = time.monotonic()
+        entry = settling.get(path)
+        if entry is None:
+            if handled.get(path) != stamp:
+                settling[path] = [now, now, stamp]
+        elif entry[2] != stamp:
+            entry[1], entry[2] = now, stamp
+
+    def scan():
+        for path in iter_files(root, include, exclude):
+            note(path)
+
+    def reap():
+        for future in [f for f in running if f.done()]:
+            path, first_seen, size = running.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                summary["failed"] += 1
+                summary["errors"].append((path, str(e)))
+                print(f"Failed: {path}: {e}", file=sys.stderr)
+                continue
+            latency = time.monotonic() - first_seen
+            summary["files"] += 1
+            summary["bytes"] += size
+            latencies.append(latency)
+            window.append(latency)
+            if not os.path.exists(path):
+                handled.pop(path, None)  # deleted original; the name may be reused
+            print(f"Encrypted: {path} ({latency:.2f}s after arrival)")
+
+    def report():
+        queued = sum(1 for f in running if not f.running())
+        line = f"backlog {len(settling) + len(running)} (settling {len(settling)}, queued {queued}, running {len(running) - queued})"
+        if window:
+            line += f", {len(window)} done, latency p50 {_percentile(window, 0.5):.2f}s p95 {_percentile(window, 0.95):.2f}s max {max(window):.2f}s"
+        print(line)
+        window.clear()
+
+    if source:
+        source.add_tree(root)
+    for path in iter_files(root, include, exclude):
+        if existing:
+            note(path)
+        else:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            handled[path] = (st.st_size, st.st_mtime_ns)
+    print(f"Watching {root} ({'inotify' if source else f'polling every {interval:g}s'}); Ctrl+C to stop.")
+
+    next_report = time.monotonic() + report_every
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            try:
+                while not stop.is_set():
+                    if source:
+                        events, overflowed = source.read(min(interval, settle / 2 or interval))
+                        for path, is_dir in events:
+                            if is_dir:
+                                source.add_tree(path)
+                                for inner in iter_files(path):
+                                    if matches(inner, root, include, exclude):
+                                        note(inner)
+                            elif matches(path, root, include, exclude):
+                                note(path)
+                        if overflowed:
+                            scan()
+                    else:
+                        stop.wait(interval)
+                        scan()
+
+                    now = time.monotonic()
+                    for path, entry in list(settling.items()):
+                        if now - entry[1] < settle:
+                            continue
+                        note(path)  # inotify may miss writes and files may vanish; confirm before submitting
+                        entry = settling.get(path)
+                        if entry is None or now - entry[1] < settle:
+                            continue
+                        del settling[path]
+                        handled[path] = entry[2]
+                        running[pool.submit(action, path)] = (path, entry[0], entry[2][0])
+
+                    reap()
+                    if now >= next_report:
+                        report()
+                        next_report = now + report_every
+            except KeyboardInterrupt:
+                print("Stopping; waiting for running files...")
+        reap()
+    finally:
+        if source:
+            source.close()
+
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = elapsed
+    summary["files_per_sec"] = summary["files"] / elapsed if elapsed else 0.0
+    summary["mb_per_sec"] = summary["bytes"] / (1024 * 1024) / elapsed if elapsed else 0.0
+    if latencies:
+        summary["latency_p50"] = _percentile(latencies, 0.5)
+        summary["latency_max"] = max(latencies)
+    return summary
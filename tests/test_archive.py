@@ -0,0 +1,109 @@
+import os
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+from cli import archive
+from cli.encryptor import FRAME
+
+KEY = Fernet.generate_key()
+
+
+def _tree(root, files):
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def _read_tree(root):
+    return {os.path.relpath(os.path.join(d, n), root).replace(os.sep, "/"): open(os.path.join(d, n), "rb").read()
+            for d, _, names in os.walk(root) for n in names}
+
+
+@pytest.fixture
+def files():
+    return {"a.txt": b"hello " * 1000, "sub/b.bin": os.urandom(300_000), "empty": b""}
+
+
+def test_roundtrip(tmp_path, files):
+    _tree(tmp_path / "src", files)
+    arc = str(tmp_path / "x.ssa")
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY, name="one")
+    summary = archive.extract_snapshot(arc, KEY, str(tmp_path / "out"))
+    assert summary["files"] == 3
+    assert _read_tree(tmp_path / "out") == files
+    assert [s["name"] for s in archive.list_snapshots(arc, KEY)] == ["one"]
+
+
+def test_unchanged_data_is_not_stored_again(tmp_path, files):
+    _tree(tmp_path / "src", files)
+    arc = str(tmp_path / "x.ssa")
+    first = archive.add_snapshot(arc, str(tmp_path / "src"), KEY, name="one")
+    _tree(tmp_path / "src", {"copy.bin": files["sub/b.bin"]})
+    second = archive.add_snapshot(arc, str(tmp_path / "src"), KEY, name="two")
+    assert first["new_chunks"] > 0
+    assert second["new_chunks"] == 0
+    archive.extract_snapshot(arc, KEY, str(tmp_path / "old"), snapshot="one")
+    assert _read_tree(tmp_path / "old") == files
+
+
+def test_torn_append_keeps_previous_snapshot(tmp_path, files):
+    _tree(tmp_path / "src", files)
+    arc = str(tmp_path / "x.ssa")
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY, name="one")
+    good = os.path.getsize(arc)
+    _tree(tmp_path / "src", {"c.bin": os.urandom(100_000)})
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY, name="two")
+    with open(arc, "r+b") as f:
+        f.truncate(os.path.getsize(arc) - 10)  # lose the new footer
+    assert [s["name"] for s in archive.list_snapshots(arc, KEY)] == ["one"]
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY, name="three")
+    assert [s["name"] for s in archive.list_snapshots(arc, KEY)] == ["one", "three"]
+    assert os.path.getsize(arc) > good
+
+
+def test_record_numbers_reused_after_a_torn_append_get_fresh_ivs(tmp_path, files):
+    _tree(tmp_path / "src", files)
+    arc = str(tmp_path / "x.ssa")
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY)
+    good = os.path.getsize(arc)
+
+    def first_new_iv():
+        with open(arc, "rb") as f:
+            f.seek(good + 1)  # the record type, then the frame
+            return FRAME.unpack(f.read(FRAME.size))[2]
+
+    _tree(tmp_path / "src", {"c.bin": os.urandom(100_000)})
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY)
+    torn = first_new_iv()
+    with open(arc, "r+b") as f:
+        f.truncate(os.path.getsize(arc) - 10)
+    _tree(tmp_path / "src", {"c.bin": os.urandom(100_000)})
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY)
+    assert first_new_iv() != torn
+    archive.extract_snapshot(arc, KEY, str(tmp_path / "out"))
+    assert (tmp_path / "out" / "c.bin").read_bytes() == (tmp_path / "src" / "c.bin").read_bytes()
+
+
+def test_wrong_key_is_rejected(tmp_path, files):
+    _tree(tmp_path / "src", files)
+    arc = str(tmp_path / "x.ssa")
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY)
+    with pytest.raises(InvalidToken):
+        archive.list_snapshots(arc, Fernet.generate_key())
+
+
+def test_tampered_chunk_keeps_existing_files(tmp_path, files):
+    _tree(tmp_path / "src", files)
+    arc = str(tmp_path / "x.ssa")
+    archive.add_snapshot(arc, str(tmp_path / "src"), KEY)
+    _tree(tmp_path / "out", {"a.txt": b"previous"})
+    with open(arc, "r+b") as f:
+        f.seek(archive.ARCHIVE_HEADER.size + 100)  # inside the first chunk, a.txt's
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    with pytest.raises(InvalidToken):
+        archive.extract_snapshot(arc, KEY, str(tmp_path / "out"))
+    assert _read_tree(tmp_path / "out") == {"a.txt": b"previous"}
@@ -0,0 +1,48 @@
+import os
+
+from cli.batch import SCRATCH_GLOBS, format_summary, iter_files, matches, run_batch
+
+
+def _tree(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 100)
+
+
+def _rel(root, paths):
+    return [os.path.relpath(path, root).replace(os.sep, "/") for path in paths]
+
+
+def test_include_and_exclude_match_names_and_relative_paths(tmp_path):
+    _tree(tmp_path, ["a.log", "b.txt", "logs/c.log", "logs/old/d.log", "e.enc", ".x.enc.abc.tmp", "e.enc.lock"])
+    assert _rel(tmp_path, iter_files(str(tmp_path))) == [
+        ".x.enc.abc.tmp", "a.log", "b.txt", "e.enc", "e.enc.lock", "logs/c.log", "logs/old/d.log"]
+    assert _rel(tmp_path, iter_files(str(tmp_path), ["*.log"])) == ["a.log", "logs/c.log", "logs/old/d.log"]
+    assert _rel(tmp_path, iter_files(str(tmp_path), ["*.log"], ["logs/old/*"])) == ["a.log", "logs/c.log"]
+    assert _rel(tmp_path, iter_files(str(tmp_path), None, ["*.enc"] + SCRATCH_GLOBS)) == [
+        "a.log", "b.txt", "logs/c.log", "logs/old/d.log"]
+    assert matches(str(tmp_path / "logs" / "c.log"), str(tmp_path), ["logs/*"])
+    assert not matches(str(tmp_path / "b.txt"), str(tmp_path), ["logs/*"])
+
+
+def test_run_batch_continues_past_failures(tmp_path, capsys):
+    _tree(tmp_path, [f"f{i}" for i in range(10)])
+    done = []
+
+    def action(path):
+        if path.endswith(("f3", "f7")):
+            raise ValueError("bad file")
+        done.append(path)
+
+    summary = run_batch(iter_files(str(tmp_path)), action, workers=3)
+    assert len(done) == 8
+    assert summary["files"] == 8 and summary["failed"] == 2 and summary["bytes"] == 800
+    assert sorted(os.path.basename(path) for path, _ in summary["errors"]) == ["f3", "f7"]
+    assert "bad file" in capsys.readouterr().err
+
+
+def test_format_summary():
+    summary = {"files": 3, "failed": 1, "bytes": 3 * 1024 * 1024, "seconds": 2.0, "files_per_sec": 1.5,
+               "mb_per_sec": 1.5, "errors": []}
+    assert format_summary(summary) == "3 files (3.0 MB) in 2.00s, 1 failed: 1.5 files/s, 1.5 MB/s"
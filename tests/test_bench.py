@@ -0,0 +1,48 @@
+import io
+from contextlib import redirect_stdout
+
+from cli import bench
+
+
+def _result(case, mb_per_sec=None, error=None):
+    result = {"group": "encryptor", "case": case, "corpus": "random", "size": 1024, "mb_per_sec": mb_per_sec}
+    if error:
+        result["error"] = error
+    return result
+
+
+def test_compare_flags_slowdowns_beyond_tolerance():
+    baseline = [_result("encrypt", 100), _result("decrypt", 100)]
+    results = [_result("encrypt", 50), _result("decrypt", 95)]
+    regressions = bench.compare(results, baseline, tolerance=0.1)
+    assert [(r["case"], round(change, 2)) for r, _, change in regressions] == [("encrypt", -0.5)]
+
+
+def test_compare_flags_cases_that_now_fail():
+    baseline = [_result("encrypt", 100), _result("decrypt", error="boom")]
+    results = [_result("encrypt", error="broken"), _result("decrypt", error="boom")]
+    regressions = bench.compare(results, baseline, tolerance=0.1)
+    assert [(r["case"], change) for r, _, change in regressions] == [("encrypt", None)]
+
+
+def test_bench_vault_prints_only_results(tmp_path):
+    out = io.StringIO()
+    with redirect_stdout(out):
+        results = bench.bench_vault(str(tmp_path), [1], repeat=1)
+    assert out.getvalue() == ""
+    assert results and all("error" not in r for r in results)
+
+
+def test_cli_help_does_not_import_lazy_modules():
+    modules = bench.import_times([bench.CLI_SCRIPT, "--help"])
+    assert "argparse" in modules
+    assert not [m for m in ("cryptography", "numpy", "ctypes") + bench.LAZY_MODULES if m in modules]
+
+
+def test_check_startup_flags_budget_and_heavy_imports():
+    results = bench.bench_startup(repeat=1, budget_ms=10_000)
+    assert [r["case"] for r in results][:1] == ["cli-help"]
+    assert bench.check_startup(results) == []
+    slow = dict(results[0], seconds=0.2, budget_ms=150, heavy_imports=["numpy"])
+    assert bench.check_startup([slow]) == ["cli-help took 200 ms, budget 150 ms",
+                                           "cli-help imports numpy at start-up"]
@@ -0,0 +1,176 @@
+import io
+import math
+import os
+import sys
+
+import pytest
+
+from cli import cli as cli_main, compresser
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"a",
+    b"abc" * 100,
+    b"\x00" * 5000 + b"xyz" + b"\xff" * 3,
+    os.urandom(4096),
+])
+def test_rle_roundtrip(data):
+    assert compresser.unrle(compresser.rle(data)) == data
+
+
+def test_rle_roundtrip_in_pieces():
+    data = b"a" * 10000 + os.urandom(300) + b"b" * 7
+    blob = compresser.rle(data)
+    pieces = [blob[i:i + 3] for i in range(0, len(blob), 3)]
+    assert b"".join(compresser.iter_unrle(pieces)) == data
+
+
+@pytest.mark.parametrize("blob", [
+    b"\x01a",          # zero-length run
+    b"\x05a",          # run of 2, below RLE_MIN_RUN
+    b"\x00",           # empty literal
+])
+def test_unrle_rejects_tokens_rle_never_writes(blob):
+    with pytest.raises(ValueError):
+        compresser.unrle(blob)
+
+
+@pytest.mark.parametrize("blob", [
+    b"\x80",           # varint cut off
+    b"\x09",           # run without its byte
+    b"\x06ab",         # literal shorter than its length
+])
+def test_unrle_rejects_truncated_data(blob):
+    with pytest.raises(ValueError):
+        compresser.unrle(blob)
+
+
+def test_unrle_rejects_overlong_varint():
+    with pytest.raises(ValueError):
+        compresser.unrle(b"\xff" * 20 + b"\x01a")
+
+
+def _reference_encode(data, codes):
+    bits = "".join(codes[b] for b in data)
+    padding = (8 - len(bits) % 8) % 8
+    bits += "0" * padding
+    return bytes(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8)), padding
+
+
+@pytest.mark.parametrize("data", [
+    b"a" * (compresser.PAIR_TABLE_MIN + 1),
+    bytes(range(256)) * 400 + b"xyz",
+    os.urandom(compresser.ENCODE_BLOCK + 12345),
+    b"abcdefgh" * (compresser.ENCODE_BLOCK // 4 + 1),
+    b"".join(bytes([i]) * (1 << (i // 2)) for i in range(36)),  # skewed: codes up to the length limit
+])
+def test_encode_data_matches_reference(data, monkeypatch):
+    freqs = dict(compresser.Counter(data))
+    lengths = {b: len(code) for b, code in compresser.generate_codes(compresser.build_tree(freqs)).items()}
+    codes = compresser.canonical_codes(compresser.limit_code_lengths(lengths, freqs))
+    expected = _reference_encode(data, codes)
+    packed, padding = compresser.encode_data(data, codes)
+    assert (bytes(packed), padding) == expected
+    monkeypatch.setattr(compresser, "_np", None)  # the pure-Python path
+    packed, padding = compresser.encode_data(data, codes)
+    assert (bytes(packed), padding) == expected
+
+
+@pytest.mark.parametrize("data", [b"", b"a", b"hello world" * 50, os.urandom(100000)])
+def test_huffman_roundtrip(data):
+    assert compresser.decompress(compresser.compress(data)) == data
+
+
+def test_canonical_header_is_small_and_legacy_blobs_still_decode():
+    data = b"the quick brown fox jumps over the lazy dog " * 200
+    blob = compresser.compress(data)
+    assert blob[0] == compresser.HUFFMAN_VERSION
+    freqs = dict(compresser.Counter(data))
+    assert len(compresser.write_lengths({b: 1 for b in freqs})) < len(compresser.write_header(freqs)) // 2
+    packed, padding = compresser.encode_data(data, compresser.generate_codes(compresser.build_tree(freqs)))
+    legacy = compresser.write_header(freqs) + bytes([padding]) + bytes(packed)
+    assert compresser.decompress(legacy) == data
+
+
+def test_code_lengths_are_limited():
+    freqs = {i: 1 << i for i in range(40)}
+    lengths = {b: len(code) for b, code in compresser.generate_codes(compresser.build_tree(freqs)).items()}
+    assert max(lengths.values()) > compresser.MAX_CODE_LENGTH
+    limited = compresser.limit_code_lengths(lengths, freqs)
+    assert max(limited.values()) <= compresser.MAX_CODE_LENGTH
+    assert sum(2.0 ** -n for n in limited.values()) <= 1
+
+
+def test_block_file_roundtrip_and_single_block(tmp_path):
+    data = os.urandom(5000) + b"abc" * 5000 + bytes(3000)
+    src = tmp_path / "data"
+    src.write_bytes(data)
+    huf = compresser.compress_file(str(src), block_size=4096)
+    out = compresser.decompress_file(huf, str(tmp_path / "out"))
+    assert open(out, "rb").read() == data
+    compresser.decompress_file(huf, str(tmp_path / "block"), block=2)
+    assert (tmp_path / "block").read_bytes() == data[8192:12288]
+
+
+def test_truncated_block_file_is_rejected(tmp_path):
+    src = tmp_path / "data"
+    src.write_bytes(b"hello world " * 1000)
+    huf = compresser.compress_file(str(src), block_size=4096)
+    with open(huf, "r+b") as f:
+        f.truncate(os.path.getsize(huf) - 3)
+    with pytest.raises(ValueError):
+        compresser.decompress_file(huf, str(tmp_path / "out"))
+
+
+@pytest.fixture(params=["numpy", "python"])
+def histograms(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(compresser, "_np", False)  # loaded again on first use
+    else:
+        monkeypatch.setattr(compresser, "_np", None)
+    return request.param
+
+
+def _entropy(data):
+    counts = [data.count(bytes([b])) for b in range(256)]
+    return -sum(c / len(data) * math.log2(c / len(data)) for c in counts if c)
+
+
+@pytest.mark.parametrize("step", [None, 1000, 4096])
+def test_entropy_profile_matches_each_window(histograms, step):
+    data = os.urandom(5000) + b"abc" * 3000 + bytes(range(256)) * 10
+    windows = list(compresser.entropy_profile(io.BytesIO(data), window=4096, step=step))
+    step = step or 4096
+    assert [offset for offset, _, _ in windows] == list(range(0, step * len(windows), step))
+    for offset, length, entropy in windows:
+        assert length == len(data[offset:offset + 4096])
+        assert entropy == pytest.approx(_entropy(data[offset:offset + length]))
+    assert windows[-1][0] + windows[-1][1] == len(data)
+    with pytest.raises(ValueError):
+        list(compresser.entropy_profile(io.BytesIO(data), window=100, step=101))
+
+
+def test_analyze_file_verdicts(histograms, tmp_path):
+    files = {"random": os.urandom(4 * compresser.ENTROPY_WINDOW), "compressible": b"log line\n" * 20_000,
+             "mixed": os.urandom(100_000) + b"\0" * 100_000, "empty": b""}
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    results = {name: compresser.analyze_file(str(tmp_path / name)) for name in files}
+    assert {name: r["verdict"] for name, r in results.items()} == {
+        "random": "random", "compressible": "compressible", "mixed": "mixed", "empty": "compressible"}
+    assert results["mixed"]["high_fraction"] == pytest.approx(0.5, abs=0.2)
+    assert results["random"]["windows"] == 4 and results["empty"]["windows"] == 0
+
+
+def test_analyze_command(histograms, tmp_path, monkeypatch, capsys):
+    (tmp_path / "a.bin").write_bytes(os.urandom(12 * 8192))  # whole windows: a short tail scores lower
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.txt").write_bytes(b"hello " * 20_000)
+    monkeypatch.setattr(sys, "argv", ["cli.py", "analyze", str(tmp_path), "--window", "8192", "--workers", "2"])
+    cli_main.main()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("random") and lines[0].endswith("a.bin")
+    assert lines[1].startswith("compressible") and lines[1].endswith("b.txt")
+    assert lines[-1] == "1 compressible, 1 random"
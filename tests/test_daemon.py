@@ -0,0 +1,84 @@
+import os
+import socket
+import threading
+
+import pytest
+from cryptography.fernet import Fernet
+
+from cli import key_vault
+from cli.client import Client, DaemonError, MESSAGE, MAX_MESSAGE, read_message
+from cli import daemon as daemon_module
+from cli.daemon import serve
+from cli.encryptor import encrypt_file
+from cli.key_vault import VaultStore, create_vault
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(key_vault, "load_params", lambda: {"name": "pbkdf2", "cost": 1000, "r": 0, "p": 0})
+    vault = str(tmp_path / "vault.enc")
+    create_vault("master", vault)
+    VaultStore("master", vault).put("k", Fernet.generate_key().decode())
+    socket_path = str(tmp_path / "d.sock")
+    open(socket_path, "w").close()  # stale leftover from a daemon that is gone
+    ready = threading.Event()
+    thread = threading.Thread(target=serve, args=("master", socket_path, 2),
+                              kwargs={"vault_path": vault, "ready": lambda d: ready.set()})
+    thread.start()
+    assert ready.wait(10)
+    client = Client(socket_path, timeout=10)
+    yield client, socket_path
+    client.shutdown()
+    client.close()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert not os.path.exists(socket_path)
+
+
+def test_encrypt_decrypt_and_range(tmp_path, daemon):
+    client, _ = daemon
+    src = tmp_path / "a.txt"
+    data = os.urandom(5000) + b"text" * 5000
+    src.write_bytes(data)
+    enc = client.encrypt("k", str(src))
+    out = client.decrypt("k", enc, str(tmp_path / "b.txt"))
+    assert open(out, "rb").read() == data
+    assert client.decrypt_range("k", enc, 4000, 3000) == data[4000:7000]
+    assert client.ping()["requests"] >= 3
+
+
+def test_errors_are_raised_in_the_client(tmp_path, daemon):
+    client, _ = daemon
+    with pytest.raises(KeyError):
+        client.get_key("missing")
+    with pytest.raises(ValueError):
+        client.request("no-such-op")
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"secret")
+    enc = encrypt_file(str(src), Fernet.generate_key())
+    with pytest.raises(DaemonError) as info:
+        client.decrypt("k", enc, str(tmp_path / "out"))
+    assert info.value.kind == "InvalidToken"
+    assert client.list_aliases() == ["k"]
+
+
+def test_oversized_message_drops_only_that_connection(daemon):
+    client, socket_path = daemon
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(socket_path)
+        sock.sendall(MESSAGE.pack(MAX_MESSAGE + 1))
+        assert read_message(sock) is None
+    assert client.ping()["pid"] == os.getpid()
+
+
+def test_client_workers_are_capped_at_the_pool_size(tmp_path, daemon, monkeypatch):
+    client, _ = daemon
+    seen = []
+    real = daemon_module.encrypt_file
+    monkeypatch.setattr(daemon_module, "encrypt_file", lambda *a, **kw: seen.append(kw["workers"]) or real(*a, **kw))
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"data" * 1000)
+    for i, workers in enumerate([1000, 0, 2]):
+        client.encrypt("k", str(src), str(tmp_path / f"{i}.enc"), workers=workers)
+    assert seen == [2, 1, 2]
@@ -0,0 +1,169 @@
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+from cli import encryptor
+from cli.encryptor import encrypt_file, decrypt_file, decrypt_range, Cancelled, FRAME, HEADER, MAX_CHUNK_SIZE
+
+KEY = Fernet.generate_key()
+
+@pytest.fixture
+def plain(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(os.urandom(300_000) + b"text " * 100_000)
+    return path
+
+def test_roundtrip(plain, tmp_path):
+    enc = encrypt_file(str(plain), KEY, chunk_size=64 * 1024, workers=2)
+    out = decrypt_file(enc, KEY, str(tmp_path / "out"), workers=2)
+    assert open(out, "rb").read() == plain.read_bytes()
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty"
+    path.write_bytes(b"")
+    enc = encrypt_file(str(path), KEY)
+    assert open(decrypt_file(enc, KEY, str(tmp_path / "out")), "rb").read() == b""
+
+def test_decrypt_range(plain):
+    data = plain.read_bytes()
+    enc = encrypt_file(str(plain), KEY, chunk_size=64 * 1024)
+    for offset, length in ((0, 10), (65530, 20), (len(data) - 5, 100), (len(data) + 10, 5)):
+        assert decrypt_range(enc, KEY, offset, length) == data[offset:offset + length]
+
+def test_wrong_key_keeps_existing_output(plain):
+    enc = encrypt_file(str(plain), KEY)
+    original = plain.read_bytes()
+    with pytest.raises(InvalidToken):
+        decrypt_file(enc, Fernet.generate_key())  # default output path is the plaintext itself
+    assert plain.read_bytes() == original
+    assert sorted(os.listdir(plain.parent)) == ["report.pdf", "report.pdf.enc"]
+
+def test_cancel_keeps_previous_output(plain):
+    enc = encrypt_file(str(plain), KEY)
+    before = open(enc, "rb").read()
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(Cancelled):
+        encrypt_file(str(plain), KEY, cancel=cancel)
+    assert open(enc, "rb").read() == before
+
+def test_missing_output_directory_raises(plain, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        encrypt_file(str(plain), KEY, str(tmp_path / "missing" / "x.enc"))
+
+@pytest.mark.parametrize("offset", [HEADER.size + FRAME.size + 5, -40])
+def test_tampering_is_detected(plain, tmp_path, offset):
+    enc = encrypt_file(str(plain), KEY, chunk_size=64 * 1024)
+    data = bytearray(open(enc, "rb").read())
+    data[offset] ^= 1
+    open(enc, "wb").write(data)
+    with pytest.raises(InvalidToken):
+        decrypt_file(enc, KEY, str(tmp_path / "out"))
+    assert not (tmp_path / "out").exists()
+
+def test_truncation_is_detected(plain, tmp_path):
+    enc = encrypt_file(str(plain), KEY, chunk_size=64 * 1024)
+    data = open(enc, "rb").read()
+    open(enc, "wb").write(data[:len(data) // 2])
+    with pytest.raises(InvalidToken):
+        decrypt_file(enc, KEY, str(tmp_path / "out"))
+
+def test_source_shrinking_mid_encrypt_does_not_crash(tmp_path):
+    # Run in a child: a memory-mapped reader would die of SIGBUS here.
+    path = tmp_path / "rotating.log"
+    path.write_bytes(os.urandom(1024 * 1024))
+    script = (
+        "import os, sys\n"
+        "from cli.encryptor import encrypt_file\n"
+        "path = sys.argv[1]\n"
+        "shrink = lambda done, total: done and os.truncate(path, 1000)\n"
+        f"encrypt_file(path, {KEY!r}, chunk_size=64 * 1024, workers=2, progress=shrink)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script, str(path)], cwd=root, capture_output=True)
+    assert result.returncode == 0, result.stderr
+    decrypted = decrypt_file(str(path) + ".enc", KEY, str(tmp_path / "out"))
+    assert os.path.getsize(decrypted) >= 64 * 1024
+
+def test_legacy_single_token_file(tmp_path):
+    import zlib
+    data = b"written by an old version " * 100
+    enc = tmp_path / "old.enc"
+    enc.write_bytes(Fernet(KEY).encrypt(zlib.compress(data)))
+    assert open(decrypt_file(str(enc), KEY, str(tmp_path / "old")), "rb").read() == data
+    (tmp_path / "keep").write_bytes(b"keep")
+    with pytest.raises(InvalidToken):
+        decrypt_file(str(enc), Fernet.generate_key(), str(tmp_path / "keep"))
+    assert (tmp_path / "keep").read_bytes() == b"keep"
+
+def test_codecs_roundtrip(plain, tmp_path):
+    from cli.compresser import codec_names
+    for codec in codec_names():
+        enc = encrypt_file(str(plain), KEY, str(tmp_path / f"{codec}.enc"), chunk_size=64 * 1024, codec=codec)
+        out = decrypt_file(enc, KEY, str(tmp_path / codec))
+        assert open(out, "rb").read() == plain.read_bytes(), codec
+
+def test_version_4_files_still_decrypt(tmp_path):
+    # Version 4 seek tables list frame offsets only.
+    import struct
+    from cli import encryptor
+    from cli.compresser import get_codec_id
+    keys, nonce = encryptor._split_key(KEY), os.urandom(16)
+    header = encryptor.HEADER_V2.pack(encryptor.MAGIC, 4, get_codec_id("zlib-6"), 4096, nonce) + encryptor.pack_kdf()
+    data = os.urandom(10_000)
+    out, offsets = bytearray(header), []
+    for index in range(3):
+        offsets.append(len(out))
+        flags = encryptor.FLAG_FINAL if index == 2 else 0
+        out += b"".join(encryptor._seal_chunk(keys, header, nonce, index, data[index * 4096:(index + 1) * 4096], flags))
+    table = struct.pack(">3Q", *offsets)
+    tag = encryptor._seek_tag(keys[0], header, 3, len(data), table)
+    out += table + encryptor.SEEK_FOOTER.pack(3, len(data), tag, encryptor.SEEK_MAGIC)
+    enc = tmp_path / "v4.enc"
+    enc.write_bytes(out)
+    assert open(decrypt_file(str(enc), KEY, str(tmp_path / "v4")), "rb").read() == data
+    assert decrypt_range(str(enc), KEY, 4000, 200) == data[4000:4200]
+
+def test_oversized_chunk_size_is_refused(plain, tmp_path):
+    with pytest.raises(ValueError):
+        encrypt_file(str(plain), KEY, chunk_size=MAX_CHUNK_SIZE + 1)
+    enc = encrypt_file(str(plain), KEY, chunk_size=64 * 1024)
+    data = bytearray(open(enc, "rb").read())
+    data[7:11] = (0xFFFFFFFF).to_bytes(4, "big")  # header chunk size, after magic, version and codec
+    open(enc, "wb").write(data)
+    with pytest.raises(ValueError, match="chunk size"):
+        decrypt_file(enc, KEY, str(tmp_path / "out"))
+    with pytest.raises(ValueError, match="chunk size"):
+        decrypt_range(enc, KEY, 0, 10)
+
+class _Trickle:
+    """An unbuffered file that accepts at most a few bytes per write()."""
+    def __init__(self, f):
+        self.f = f
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def write(self, buf):
+        return self.f.write(bytes(memoryview(buf)[:5]))
+
+@pytest.mark.parametrize("writev", [True, False])
+def test_short_writes_are_finished(tmp_path, monkeypatch, writev):
+    parts = [b"frame header", memoryview(os.urandom(1000)), b"tag" * 11]
+    if writev:  # the kernel takes only the first few bytes of the first buffer
+        monkeypatch.setattr(encryptor.os, "writev", lambda fd, bufs: os.write(fd, bytes(bufs[0][:3])), raising=False)
+    else:
+        monkeypatch.delattr(encryptor.os, "writev", raising=False)
+    with open(tmp_path / "out", "wb", buffering=0) as f:
+        encryptor._write_parts(_Trickle(f), parts)
+    assert (tmp_path / "out").read_bytes() == b"".join(bytes(p) for p in parts)
+
+def test_parallel_output_matches_serial(plain, tmp_path, monkeypatch):
+    nonce = os.urandom(16)
+    monkeypatch.setattr(encryptor.os, "urandom", lambda n: nonce[:n])
+    outputs = [open(encrypt_file(str(plain), KEY, str(tmp_path / f"{workers}.enc"), chunk_size=64 * 1024,
+                                 workers=workers), "rb").read()
+               for workers in (1, 4)]
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,86 @@
+import struct
+
+import pytest
+
+from cli import kdf
+from cli.encryptor import HEADER_V2, decrypt_file, encrypt_file, password_key
+from cli.key_vault import VaultSession, create_vault
+
+FAST = {"name": "pbkdf2", "cost": 1000, "r": 0, "p": 0}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    kdf.clear_key_cache()
+    yield
+    kdf.clear_key_cache()
+
+
+def test_pack_unpack_roundtrip():
+    salt = kdf.new_salt()
+    assert kdf.unpack_kdf(kdf.pack_kdf(salt, FAST)) == (salt, FAST)
+    assert kdf.unpack_kdf(kdf.pack_kdf()) == (None, None)
+
+
+@pytest.mark.parametrize("kdf_id, cost, r, p", [
+    (kdf.KDF_PBKDF2, 2 ** 31, 0, 0),
+    (kdf.KDF_PBKDF2, 0, 0, 0),
+    (kdf.KDF_SCRYPT, 60, 8, 1),
+    (kdf.KDF_SCRYPT, 20, 255, 1),
+    (kdf.KDF_SCRYPT, 15, 8, 255),
+    (kdf.KDF_SCRYPT, 15, 0, 1),
+    (9, 15, 8, 1),
+])
+def test_unpack_rejects_unsafe_params(kdf_id, cost, r, p):
+    with pytest.raises(ValueError):
+        kdf.unpack_kdf(kdf.KDF_BLOCK.pack(kdf_id, bytes(16), cost, r, p))
+
+
+def test_default_params_are_accepted():
+    kdf.check_params(kdf.DEFAULT_PARAMS)
+
+
+def test_derive_is_deterministic_and_uncached_by_default():
+    salt = kdf.new_salt()
+    key = kdf.derive_key("pw", salt, FAST)
+    assert key == kdf.derive_key("pw", salt, FAST)
+    assert key != kdf.derive_key("pw2", salt, FAST)
+    assert not kdf._key_cache
+
+
+def test_cache_does_not_hold_the_password():
+    salt = kdf.new_salt()
+    key = kdf.derive_key("hunter2-password", salt, FAST, cache=True)
+    assert kdf.derive_key("hunter2-password", salt, FAST, cache=True) == key
+    assert len(kdf._key_cache) == 1
+    assert "hunter2-password" not in repr(list(kdf._key_cache))
+
+
+def test_session_lock_clears_cached_keys(tmp_path):
+    path = str(tmp_path / "vault.enc")
+    create_vault("master", path)
+    session = VaultSession("master", ttl=None, path=path)
+    kdf.derive_key("pw", kdf.new_salt(), FAST, cache=True)
+    session.lock()
+    assert not kdf._key_cache
+
+
+def test_crafted_header_is_rejected_before_deriving(tmp_path):
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"secret" * 100)
+    salt = kdf.new_salt()
+    enc = encrypt_file(str(src), kdf.derive_key("pw", salt, FAST), kdf=(salt, FAST))
+    data = bytearray(open(enc, "rb").read())
+    struct.pack_into(">I", data, HEADER_V2.size + 1 + kdf.SALT_SIZE, 2 ** 31)
+    open(enc, "wb").write(data)
+    with pytest.raises(ValueError):
+        password_key(enc, "pw")
+
+
+def test_password_roundtrip(tmp_path):
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"secret" * 100)
+    salt = kdf.new_salt()
+    enc = encrypt_file(str(src), kdf.derive_key("pw", salt, FAST), kdf=(salt, FAST))
+    out = decrypt_file(enc, password_key(enc, "pw"), str(tmp_path / "b.txt"))
+    assert open(out, "rb").read() == b"secret" * 100
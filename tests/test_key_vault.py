@@ -0,0 +1,132 @@
+import json
+import os
+import time
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+from cli import key_vault
+from cli.encryptor import generate_key
+from cli.key_vault import VaultLocked, VaultSession, VaultStore, create_vault
+
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    monkeypatch.setattr(key_vault, "load_params", lambda: {"name": "pbkdf2", "cost": 1000, "r": 0, "p": 0})
+    path = str(tmp_path / "vault.enc")
+    create_vault("master", path)
+    return path
+
+
+def test_put_get_delete_rename(vault):
+    store = VaultStore("master", vault)
+    store.put_many({"a": "ka", "b": "kb"})
+    store.put("a", "ka2")
+    store.rename("b", "c")
+    store.delete("a")
+    assert store.items() == {"c": "kb"}
+    with pytest.raises(KeyError):
+        store.get("a")
+    with pytest.raises(KeyError):
+        store.rename("c", "c")
+    assert VaultStore("master", vault).get("c") == "kb"
+
+
+def test_wrong_password_is_rejected(vault):
+    with pytest.raises(InvalidToken):
+        VaultStore("not the master", vault)
+
+
+def test_other_writers_are_seen(vault):
+    first, second = VaultStore("master", vault), VaultStore("master", vault)
+    first.put("a", "ka")
+    assert second.get("a") == "ka"
+    second.delete("a")
+    assert first.items() == {}
+
+
+def test_torn_append_is_ignored_and_dropped(vault):
+    store = VaultStore("master", vault)
+    store.put("a", "ka")
+    good = os.path.getsize(vault)
+    store.put("b", "kb")
+    with open(vault, "r+b") as f:
+        f.truncate(os.path.getsize(vault) - 5)
+    assert VaultStore("master", vault).items() == {"a": "ka"}
+    store = VaultStore("master", vault)
+    store.put("c", "kc")
+    assert VaultStore("master", vault).items() == {"a": "ka", "c": "kc"}
+    assert os.path.getsize(vault) > good
+
+
+def test_compact_keeps_live_records(vault):
+    store = VaultStore("master", vault)
+    for i in range(20):
+        store.put("a", f"k{i}")
+    store.put("b", "kb")
+    before = os.path.getsize(vault)
+    store.compact()
+    assert os.path.getsize(vault) < before
+    assert VaultStore("master", vault).items() == {"a": "k19", "b": "kb"}
+
+
+def test_legacy_vault_is_upgraded(tmp_path, monkeypatch):
+    monkeypatch.setattr(key_vault, "load_params", lambda: {"name": "pbkdf2", "cost": 1000, "r": 0, "p": 0})
+    path = tmp_path / "vault.enc"
+    path.write_bytes(Fernet(generate_key("master")).encrypt(json.dumps({"a": "ka"}).encode()))
+    assert VaultStore("master", str(path)).items() == {"a": "ka"}
+    assert path.read_bytes().startswith(key_vault.VAULT_MAGIC)
+    assert VaultStore("master", str(path)).get("a") == "ka"
+
+
+def test_session_expires(vault):
+    VaultStore("master", vault).put("a", "ka")
+    session = VaultSession("master", ttl=0.2, path=vault)
+    assert session.get_key("a") == b"ka"
+    time.sleep(0.3)
+    with pytest.raises(VaultLocked):
+        session.get_key("a")
+    assert not session.unlocked
+
+
+def _first_record(path) -> int:
+    with open(path, "rb") as f:
+        _, _, meta_len = key_vault.VAULT_HEADER.unpack(f.read(key_vault.VAULT_HEADER.size))
+    return key_vault.VAULT_HEADER.size + meta_len
+
+
+def test_tampered_record_header_is_rejected(vault):
+    store = VaultStore("master", vault)
+    store.put("a", "ka")
+    store.put("b", "kb")
+    clean = open(vault, "rb").read()
+    start = _first_record(vault)
+    hidden = bytearray(clean)
+    hidden[start] = key_vault.OP_DEL  # hide "a" by flipping PUT to DEL
+    open(vault, "wb").write(hidden)
+    with pytest.raises(InvalidToken):
+        VaultStore("master", vault)
+    swapped = bytearray(clean)
+    _, length, tag, _ = key_vault.RECORD.unpack_from(clean, start)
+    second = start + key_vault.RECORD.size + length
+    swapped[second + 5:second + 37] = tag  # point "a"'s tag at "b"'s key
+    open(vault, "wb").write(swapped)
+    with pytest.raises(InvalidToken):
+        VaultStore("master", vault)
+
+
+def test_version_2_vault_is_upgraded(vault):
+    store = VaultStore("master", vault)
+    header = open(vault, "rb").read(_first_record(vault))
+    _, _, meta_len = key_vault.VAULT_HEADER.unpack_from(header)
+    records = b""
+    for op, alias, key in [(key_vault.OP_PUT, "a", "ka"), (key_vault.OP_PUT, "b", "kb"), (key_vault.OP_DEL, "a", None)]:
+        token = store._fernet.encrypt(json.dumps({"op": op, "alias": alias, "key": key}).encode())
+        # Version 2 records trusted the op in their header; this one lies.
+        records += key_vault.RECORD_V2.pack(key_vault.OP_PUT, len(token), store._tag(alias)) + token
+    with open(vault, "wb") as f:
+        f.write(key_vault.VAULT_HEADER.pack(key_vault.VAULT_MAGIC, 2, meta_len) + header[key_vault.VAULT_HEADER.size:])
+        f.write(records)
+    assert VaultStore("master", vault).items() == {"b": "kb"}
+    assert key_vault._read_meta(vault)[0] == key_vault.VAULT_VERSION
+    assert not [name for name in os.listdir(os.path.dirname(vault)) if name.endswith(".tmp")]
@@ -0,0 +1,42 @@
+import json
+import sys
+
+from cryptography.fernet import Fernet
+
+from cli import cli as cli_main, kdf, stats
+from cli.encryptor import decrypt_file, encrypt_file
+
+KEY = Fernet.generate_key()
+
+
+def test_stats_flag_writes_stage_timings(tmp_path, monkeypatch):
+    monkeypatch.setattr(kdf, "load_params", lambda: {"name": "pbkdf2", "cost": 1000, "r": 0, "p": 0})
+    monkeypatch.setattr(cli_main, "getpass", lambda prompt: "Str0ng!Passw0rd")
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"some text " * 10_000)
+    report = tmp_path / "stats.json"
+    monkeypatch.setattr(sys, "argv", ["cli.py", "encrypt-pass", "--file", str(src), "--stats", str(report)])
+    cli_main.main()
+    result = json.loads(report.read_text())
+    assert result["wall_seconds"] > 0
+    assert {"kdf.derive", "encrypt.compress", "encrypt.cipher"} <= set(result["stages"])
+    assert result["stages"]["encrypt.compress"]["bytes"] == src.stat().st_size
+    assert not stats.enabled()  # the collector is removed again
+
+
+def test_hooks_are_no_ops_when_disabled(tmp_path):
+    assert not stats.enabled() and stats.stopwatch() is None
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"x" * 1000)
+    calls = []
+    hook = lambda *timing: calls.append(timing)
+    stats.add_hook(hook)
+    try:
+        enc = encrypt_file(str(src), KEY)
+    finally:
+        stats.remove_hook(hook)
+    assert calls and all(stage.count(".") == 1 for stage, _, _ in calls)
+    seen = len(calls)
+    decrypt_file(enc, KEY, str(tmp_path / "b.txt"))
+    assert len(calls) == seen
+    assert stats.stopwatch() is None
@@ -0,0 +1,69 @@
+import asyncio
+import os
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+from cli.encryptor import decrypt_file, encrypt_file
+from cli.streams import decrypt_stream, encrypt_stream
+
+KEY = Fernet.generate_key()
+DATA = os.urandom(10000) + b"text " * 5000
+
+
+async def _pieces(data, size=777):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _collect(agen):
+    return b"".join([piece async for piece in agen])
+
+
+def _encrypt(data, **kwargs):
+    return asyncio.run(_collect(encrypt_stream(_pieces(data), KEY, chunk_size=4096, **kwargs)))
+
+
+def _decrypt(blob, key=KEY):
+    return asyncio.run(_collect(decrypt_stream(_pieces(blob), key, workers=2)))
+
+
+@pytest.mark.parametrize("data", [b"", b"x", DATA])
+def test_roundtrip(data):
+    assert _decrypt(_encrypt(data, workers=2)) == data
+
+
+def test_stream_and_file_formats_interoperate(tmp_path):
+    enc = tmp_path / "a.enc"
+    enc.write_bytes(_encrypt(DATA))
+    assert open(decrypt_file(str(enc), KEY, str(tmp_path / "a")), "rb").read() == DATA
+    src = tmp_path / "b"
+    src.write_bytes(DATA)
+    blob = open(encrypt_file(str(src), KEY, chunk_size=4096), "rb").read()
+    assert _decrypt(blob) == DATA
+
+
+def test_wrong_key_is_rejected():
+    with pytest.raises(InvalidToken):
+        _decrypt(_encrypt(DATA), Fernet.generate_key())
+
+
+@pytest.mark.parametrize("cut", [1, 100, 5000])
+def test_truncated_stream_is_rejected(cut):
+    blob = _encrypt(DATA)
+    with pytest.raises((InvalidToken, ValueError)):
+        _decrypt(blob[:-cut])
+
+
+def test_tampered_stream_is_rejected():
+    blob = bytearray(_encrypt(DATA))
+    blob[len(blob) // 2] ^= 1
+    with pytest.raises(InvalidToken):
+        _decrypt(bytes(blob))
+
+
+def test_forged_chunk_size_is_refused():
+    blob = bytearray(_encrypt(DATA))
+    blob[7:11] = (0xFFFFFFFF).to_bytes(4, "big")
+    with pytest.raises(ValueError, match="chunk size"):
+        _decrypt(bytes(blob))
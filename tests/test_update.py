@@ -0,0 +1,120 @@
+import os
+import threading
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+from cli.encryptor import (update_file, decrypt_file, decrypt_range, encrypt_file, Cancelled, INDEX_SUFFIX,
+                           _read_header, _read_seek_table, _split_key)
+
+KEY = Fernet.generate_key()
+CHUNK = 64 * 1024
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "data.log"
+    path.write_bytes(b"".join(b"line %d of the log\n" % i for i in range(40_000)))
+    return path
+
+def _decrypted(enc, tmp_path) -> bytes:
+    return open(decrypt_file(enc, KEY, str(tmp_path / "check")), "rb").read()
+
+def test_modes_roundtrip(source, tmp_path):
+    enc = str(source) + ".enc"
+    assert update_file(str(source), KEY, chunk_size=CHUNK)["mode"] == "full"
+    assert update_file(str(source), KEY)["mode"] == "unchanged"
+    with open(source, "ab") as f:
+        f.write(b"appended\n" * 1000)
+    summary = update_file(str(source), KEY)
+    assert summary["mode"] == "patched" and summary["rewritten"] < summary["chunks"]
+    assert _decrypted(enc, tmp_path) == source.read_bytes()
+    data = bytearray(source.read_bytes())
+    data[CHUNK + 10:CHUNK + 13] = b"XY"  # a middle edit, then the file shrinks
+    source.write_bytes(bytes(data[:CHUNK * 3]))
+    assert update_file(str(source), KEY, workers=2)["mode"] in ("patched", "rebuilt")
+    assert _decrypted(enc, tmp_path) == source.read_bytes()
+
+def test_random_data_patches_in_place(tmp_path):
+    path = tmp_path / "blob"
+    data = bytearray(os.urandom(CHUNK * 8))
+    path.write_bytes(data)
+    update_file(str(path), KEY, chunk_size=CHUNK, entropy_threshold=7.0)
+    data[CHUNK * 3] ^= 1
+    path.write_bytes(data)
+    assert update_file(str(path), KEY, entropy_threshold=7.0)["mode"] == "patched"
+    assert _decrypted(str(path) + ".enc", tmp_path) == bytes(data)
+
+def test_stale_index_means_full_rewrite(source, tmp_path):
+    update_file(str(source), KEY, chunk_size=CHUNK)
+    encrypt_file(str(source), KEY)  # new nonce behind update_file's back
+    assert update_file(str(source), KEY)["mode"] == "full"
+    assert _decrypted(str(source) + ".enc", tmp_path) == source.read_bytes()
+
+def test_source_changing_during_update_keeps_output(source, tmp_path):
+    enc = str(source) + ".enc"
+    update_file(str(source), KEY, chunk_size=CHUNK)
+    expected = source.read_bytes()
+    with open(source, "ab") as f:
+        f.write(b"more\n" * 5000)
+
+    def grow(done, total):
+        if done >= total:  # the log is written to again between the two passes
+            with open(source, "ab") as f:
+                f.write(b"x" * 100)
+
+    with pytest.raises(ValueError):
+        update_file(str(source), KEY, progress=grow)
+    assert _decrypted(enc, tmp_path) == expected
+
+def test_cancel_during_sealing_keeps_output(source, tmp_path):
+    enc = str(source) + ".enc"
+    update_file(str(source), KEY, chunk_size=CHUNK)
+    expected = source.read_bytes()
+    with open(source, "ab") as f:
+        f.write(os.urandom(CHUNK * 4))
+    cancel = threading.Event()
+    # Let the hashing pass finish, then cancel once sealing starts.
+    progress = lambda done, total: done >= total and cancel.set()
+    with pytest.raises(Cancelled):
+        update_file(str(source), KEY, progress=progress, cancel=cancel)
+    assert _decrypted(enc, tmp_path) == expected
+
+def test_tampered_index_is_ignored(source, tmp_path):
+    update_file(str(source), KEY, chunk_size=CHUNK)
+    index = str(source) + ".enc" + INDEX_SUFFIX
+    data = bytearray(open(index, "rb").read())
+    data[-1] ^= 1
+    open(index, "wb").write(data)
+    assert update_file(str(source), KEY)["mode"] == "full"
+
+def test_wrong_key_output_is_not_patched(source, tmp_path):
+    update_file(str(source), KEY, chunk_size=CHUNK)
+    other = Fernet.generate_key()
+    assert update_file(str(source), other)["mode"] == "full"
+    with pytest.raises(InvalidToken):
+        decrypt_file(str(source) + ".enc", KEY, str(tmp_path / "x"))
+
+def _frame(enc, index) -> tuple:
+    with open(enc, "rb") as f:
+        header = _read_header(f)[0]
+        offsets, _, _, table = _read_seek_table(f, _split_key(KEY), header)
+    offsets.append(table)
+    return offsets[index], offsets[index + 1]
+
+def test_frame_from_an_earlier_version_is_rejected(tmp_path):
+    path = tmp_path / "blob"
+    data = bytearray(os.urandom(CHUNK * 8))
+    path.write_bytes(data)
+    enc = str(path) + ".enc"
+    update_file(str(path), KEY, chunk_size=CHUNK, entropy_threshold=7.0)
+    start, end = _frame(enc, 3)
+    old = open(enc, "rb").read()[start:end]
+    data[CHUNK * 3] ^= 1
+    path.write_bytes(data)
+    assert update_file(str(path), KEY, entropy_threshold=7.0)["mode"] == "patched"
+    assert _frame(enc, 3) == (start, end)
+    with open(enc, "r+b") as f:
+        f.seek(start)
+        f.write(old)  # splice chunk 3 of the previous version back in
+    with pytest.raises(InvalidToken):
+        decrypt_file(enc, KEY, str(tmp_path / "out"))
+    with pytest.raises(InvalidToken):
+        decrypt_range(enc, KEY, CHUNK * 3, 10)
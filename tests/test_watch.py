@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+from cli import watch as watch_module
+from cli.watch import watch
+
+
+def _watch(root, action, until, **kwargs) -> dict:
+    """
+    Runs watch() in polling mode until until() holds (or 10 seconds pass).
+    """
+    stop = threading.Event()
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(watch(
+        str(root), action, workers=2, settle=0.1, interval=0.05, poll=True, report_every=60,
+        stop=stop, **kwargs)))
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not until() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    thread.join()
+    return result
+
+
+def test_new_files_are_picked_up_once_settled(tmp_path):
+    (tmp_path / "old.txt").write_bytes(b"already here")
+    seen = []
+    started = threading.Event()
+
+    def until():
+        if not started.is_set():
+            started.set()
+            time.sleep(0.2)
+            (tmp_path / "sub").mkdir()
+            (tmp_path / "sub" / "new.txt").write_bytes(b"arrived")
+            (tmp_path / "sub" / ".out.enc.a1b2.tmp").write_bytes(b"half written")
+            (tmp_path / "sub" / "new.txt.enc.lock").write_bytes(b"")
+        if not seen:
+            return False
+        time.sleep(0.3)  # give the scratch files time to settle too
+        return True
+
+    summary = _watch(tmp_path, seen.append, until)
+    assert seen == [str(tmp_path / "sub" / "new.txt")]
+    assert summary["files"] == 1 and summary["failed"] == 0
+
+
+def test_existing_files_with_exclude(tmp_path):
+    (tmp_path / "a.log").write_bytes(b"a")
+    (tmp_path / "b.enc").write_bytes(b"b")
+    seen = []
+    summary = _watch(tmp_path, seen.append, lambda: bool(seen), existing=True, exclude=["*.enc"])
+    assert seen == [str(tmp_path / "a.log")]
+    assert summary["files"] == 1
+
+
+def test_file_vanishing_at_startup_is_skipped(tmp_path, monkeypatch):
+    (tmp_path / "a.log").write_bytes(b"a")
+    real = watch_module.iter_files
+
+    def iter_files(root, include=None, exclude=None):
+        yield os.path.join(root, "gone.log")  # listed, then deleted before the stat
+        yield from real(root, include, exclude)
+
+    monkeypatch.setattr(watch_module, "iter_files", iter_files)
+    seen = []
+    summary = _watch(tmp_path, seen.append, lambda: True)
+    assert seen == [] and summary["failed"] == 0
+
+
+def test_failing_action_is_counted(tmp_path):
+    seen = []
+
+    def action(path):
+        seen.append(path)
+        raise ValueError("boom")
+
+    (tmp_path / "x.bin").write_bytes(b"x")
+    summary = _watch(tmp_path, action, lambda: bool(seen), existing=True)
+    assert summary["failed"] == 1 and summary["errors"][0][0] == str(tmp_path / "x.bin")
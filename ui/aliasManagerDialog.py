@@ -3,23 +3,31 @@ from PyQt6.QtWidgets import (
     QMessageBox, QInputDialog, QMenu
 )
 from PyQt6.QtCore import Qt
-from cli.key_vault import list_aliases, delete_key, rename_key, get_key
+from cli.key_vault import VaultSession
 from ui.passwordDialog import PasswordDialog
 from ui.button import Button
 
 class AliasManagerDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, session=None):
         super().__init__(parent)
         self.setWindowTitle("Alias Manager")
         self.resize(400, 300)
         layout = QVBoxLayout()
 
-        # Prompt master password first
-        pwd_dialog = PasswordDialog("Master password:", self)
-        self.master_pwd = pwd_dialog.get_password()
-        if not self.master_pwd:
-            self.reject()
-            return
+        # Reuse an unlocked vault session, or prompt master password first
+        self.session = session
+        if self.session is None:
+            pwd_dialog = PasswordDialog("Master password:", self)
+            master_pwd = pwd_dialog.get_password()
+            if not master_pwd:
+                self.reject()
+                return
+            try:
+                self.session = VaultSession(master_pwd)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", str(e))
+                self.reject()
+                return
 
         self.alias_list = QListWidget()
         # enable custom context menu
@@ -29,7 +37,6 @@ class AliasManagerDialog(QDialog):
 
         # Optional buttons (keep them if you like)
         btn_layout = QHBoxLayout()
-        print(self.master_pwd)
         self.rename_btn = Button("Rename", cursor=True).get_button()
         self.delete_btn = Button("Delete", cursor=True).get_button()
         self.backup_btn = Button("View Backup Key", cursor=True).get_button()
@@ -69,7 +76,7 @@ class AliasManagerDialog(QDialog):
     def load_aliases(self):
         try:
             self.alias_list.clear()
-            for a in list_aliases(self.master_pwd):
+            for a in self.session.list_aliases():
                 self.alias_list.addItem(a)
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
@@ -86,7 +93,7 @@ class AliasManagerDialog(QDialog):
         new_alias, ok = QInputDialog.getText(self, "Rename", f"New name for '{alias}':")
         if ok and new_alias:
             try:
-                rename_key(alias, new_alias, self.master_pwd)
+                self.session.rename_key(alias, new_alias)
                 self.load_aliases()
             except Exception as e:
                 QMessageBox.warning(self, "Error", str(e))
@@ -97,7 +104,7 @@ class AliasManagerDialog(QDialog):
         if QMessageBox.question(self, "Confirm", f"Delete key '{alias}'?") \
                 == QMessageBox.StandardButton.Yes:
             try:
-                delete_key(alias, self.master_pwd)
+                self.session.delete_key(alias)
                 self.load_aliases()
             except Exception as e:
                 QMessageBox.warning(self, "Error", str(e))
@@ -106,7 +113,7 @@ class AliasManagerDialog(QDialog):
         alias = alias or self.current_alias()
         if not alias: return
         try:
-            key = get_key(alias, self.master_pwd).decode()
+            key = self.session.get_key(alias).decode()
             QMessageBox.information(self, "Backup Key", f"{alias}:\n{key}")
         except Exception as e:
             QMessageBox.warning(self, "Error", str(e))
@@ -0,0 +1,104 @@
+import threading
+import time
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar
+from cli.encryptor import Cancelled
+from ui.button import Button
+
+class JobSignals(QObject):
+    progress = pyqtSignal(object, object)  # done, total bytes (Python ints: files can pass 2 GB)
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+class FileJob(QRunnable):
+    """
+    Runs func(progress=..., cancel=...) on a QThreadPool thread and reports back
+    to the UI thread through signals. Progress is throttled to a few updates per
+    second so a fast job cannot flood the event loop.
+    """
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, func):
+        super().__init__()
+        self.setAutoDelete(False)  # the owning JobRow keeps it alive
+        self.func = func
+        self.cancel_event = threading.Event()
+        self.signals = JobSignals()
+        self._last_report = 0.0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _progress(self, done, total):
+        now = time.monotonic()
+        if now - self._last_report >= self.PROGRESS_INTERVAL or done >= total:
+            self._last_report = now
+            self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            result = self.func(progress=self._progress, cancel=self.cancel_event)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+class JobRow(QWidget):
+    """One line in the job list: title, progress bar, MB/s and ETA, and a cancel button."""
+    def __init__(self, title, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+        self.running = True
+        self.started = None
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        top = QHBoxLayout()
+        top.addWidget(QLabel(title))
+        self.stats_label = QLabel("Queued")
+        top.addWidget(self.stats_label)
+        self.cancel_btn = Button("Cancel", cursor=True, clicked=self.on_button).get_button()
+        self.cancel_btn.setObjectName("cancel")
+        top.addWidget(self.cancel_btn)
+        layout.addLayout(top)
+        self.bar = QProgressBar()
+        self.bar.setRange(0, 1000)
+        layout.addWidget(self.bar)
+        self.setLayout(layout)
+
+        job.signals.progress.connect(self.on_progress)
+        job.signals.finished.connect(lambda path: self.done(f"Done: {path}"))
+        job.signals.failed.connect(lambda message: self.done(f"Failed: {message}"))
+        job.signals.cancelled.connect(lambda: self.done("Cancelled"))
+
+    def on_progress(self, done, total):
+        now = time.monotonic()
+        if self.started is None:
+            self.started = (now, done)
+            self.stats_label.setText("Starting")
+        self.bar.setValue(int(1000 * done / total) if total else 0)
+        elapsed = now - self.started[0]
+        if elapsed > 0 and done > self.started[1]:
+            rate = (done - self.started[1]) / elapsed
+            eta = int((total - done) / rate)
+            self.stats_label.setText(f"{rate / (1024 * 1024):.1f} MB/s, ETA {eta // 60}:{eta % 60:02d}")
+
+    def done(self, status):
+        self.running = False
+        self.stats_label.setText(status)
+        self.cancel_btn.setText("Dismiss")
+        self.cancel_btn.setEnabled(True)
+        if status.startswith("Done"):
+            self.bar.setValue(1000)
+
+    def on_button(self):
+        if self.running:
+            self.job.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.stats_label.setText("Cancelling")
+        else:
+            self.setParent(None)
+            self.deleteLater()
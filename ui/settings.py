@@ -1,5 +1,5 @@
 from PyQt6.QtCore import pyqtSignal
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QComboBox, QCheckBox
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QComboBox, QCheckBox, QSpinBox
 from ui.button import Button
 
 class SettingsTab(QWidget):
@@ -21,6 +21,18 @@ class SettingsTab(QWidget):
         layout.addWidget(QLabel("Vault Options"))
         self.show_key_backup_checkbox = QCheckBox("Show backup keys in dialog")
         layout.addWidget(self.show_key_backup_checkbox)
+        layout.addWidget(QLabel("Keep vault unlocked for (minutes)"))
+        self.vault_ttl_spin = QSpinBox()
+        self.vault_ttl_spin.setRange(1, 240)
+        self.vault_ttl_spin.setValue(5)
+        layout.addWidget(self.vault_ttl_spin)
+
+        # Background jobs
+        layout.addWidget(QLabel("Files encrypted/decrypted at the same time"))
+        self.max_jobs_spin = QSpinBox()
+        self.max_jobs_spin.setRange(1, 16)
+        self.max_jobs_spin.setValue(2)
+        layout.addWidget(self.max_jobs_spin)
 
         # Password policy
         layout.addWidget(QLabel("Password Policy"))
@@ -46,9 +58,17 @@ class SettingsTab(QWidget):
         selected_theme = self.theme_combo.currentText()
         print(f"Settings applied: Theme={selected_theme}, Show backup={self.show_key_backup_checkbox.isChecked()}, Require strong={self.require_strong_password_checkbox.isChecked()}")
 
+    def vault_ttl(self):
+        return self.vault_ttl_spin.value() * 60
+
+    def max_jobs(self):
+        return self.max_jobs_spin.value()
+
     def reset_settings(self):
         self.theme_combo.setCurrentIndex(0)
         self.show_key_backup_checkbox.setChecked(False)
+        self.vault_ttl_spin.setValue(5)
+        self.max_jobs_spin.setValue(2)
         self.require_strong_password_checkbox.setChecked(False)
         print("Settings reset to default")
         # Emit signal so app updates theme